@@ -1,10 +1,28 @@
+import sys
+
+
+def intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
 class Metadata:
+    __slots__ = ("job_id", "job_name", "step_name", "workflow_id", "workflow_name")
+
     def __init__(self, job_id, job_name, step_name, workflow_id, workflow_name):
-        self.job_id = job_id
-        self.job_name = job_name
-        self.step_name = step_name
-        self.workflow_id = workflow_id
-        self.workflow_name = workflow_name
+        # The same names recur in every step of a workflow and across repositories
+        self.job_id = intern(job_id)
+        self.job_name = intern(job_name)
+        self.step_name = intern(step_name)
+        self.workflow_id = intern(workflow_id)
+        self.workflow_name = intern(workflow_name)
+
+    def __reduce__(self):
+        return Metadata, tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        # Pickled before Metadata had slots
+        for name in self.__slots__:
+            setattr(self, name, intern(state.get(name)))
 
     def __str__(self):
         return (
@@ -23,52 +41,105 @@ def parse_action(action: str):
 
 
 class Action:
-    def __init__(self):
+    """
+    Actions are flyweights: creating one returns the canonical instance with
+    its fields, e.g. the normalized command of a Run, shared by every step that
+    runs it. Subclasses list their fields, the first one being the key the
+    instances are equal and hashed by, derive them in normalize and take
+    __hash__ back from Action, since defining __eq__ resets it.
+    """
+
+    __slots__ = ("hash_value",)
+    fields = ()
+
+    def __new__(cls, *args):
+        if not cls.fields:
+            return cls.canonical()
+        if not args:
+            # Unpickled from before the instances were shared, see __setstate__
+            return object.__new__(cls)
+        # Only the normalized key is kept, raw arguments are never stored
+        return cls.canonical(*cls.normalize(args[0]))
+
+    def __init__(self, *args):
+        # Set up once by canonical, the instances are shared
         pass
 
+    @classmethod
+    def canonical(cls, *values):
+        key = values[0] if values else cls.__name__
+        instance = cls.by_key.get(key)
+        if instance is None:
+            instance = object.__new__(cls)
+            for name, value in zip(cls.fields, values):
+                setattr(instance, name, intern(value))
+            instance.hash_value = hash(key)
+            cls.by_key[key] = instance
+        return instance
+
+    def __reduce__(self):
+        return self.canonical, tuple(getattr(self, name) for name in self.fields)
+
+    def __setstate__(self, state):
+        # Pickled before Action had slots, all fields were in its __dict__
+        for name in self.fields:
+            setattr(self, name, intern(state.get(name)))
+        self.hash_value = hash(
+            state[self.fields[0]] if self.fields else type(self).__name__
+        )
+
+    def __hash__(self):
+        return self.hash_value
+
     def str2(self):
         pass
 
 
 class Run(Action):
-    def __init__(self, run):
-        super().__init__()
-        self.prefixes = [
-            ("python3", 2),
-            ("python", 2),
-            ("git", 2),
-            ("mvn", 2),
-            (".", 2),
-            ("docker", 2),
-            ("make", 2),
-            ("./gradlew", 2),
-            ("poetry", 2),
-            ("bash", 2),
-            ("conda", 2),
-            ("gh", 2),
-            ("coverage", 2),
-            ("twine", 2),
-            ("brew", 2),
-            ("ruff", 2),
-            ("npm", 2),
-            ("pre-commit", 2),
-            ("/usr/bin/python3", 2),
-            ("npm run", 3),
-            ("./mvnw", 2),
-            ("python3", 2),
-        ]
-        self.run = flatten(run.split()[:4])
-        prefixed_run = None
-        self.prefix = None
-        for prefix, number in self.prefixes:
-            len_prefix = len(prefix.split())
-            if flatten(self.run.split()[:len_prefix]) == prefix:
-                prefixed_run = flatten(self.run.split()[:number])
-                self.prefix = prefix
-        if prefixed_run:
-            self.run = prefixed_run
-        else:
-            self.run = self.run.split()[0]
+    # Commands starting with a prefix keep a number of words, if several
+    # prefixes match the last one counts
+    prefixes = [
+        ("python3", 2),
+        ("python", 2),
+        ("git", 2),
+        ("mvn", 2),
+        (".", 2),
+        ("docker", 2),
+        ("make", 2),
+        ("./gradlew", 2),
+        ("poetry", 2),
+        ("bash", 2),
+        ("conda", 2),
+        ("gh", 2),
+        ("coverage", 2),
+        ("twine", 2),
+        ("brew", 2),
+        ("ruff", 2),
+        ("npm", 2),
+        ("pre-commit", 2),
+        ("/usr/bin/python3", 2),
+        ("npm run", 3),
+        ("./mvnw", 2),
+        ("python3", 2),
+    ]
+
+    __slots__ = ("run", "prefix")
+    fields = ("run", "prefix")
+    by_key = dict()
+    __hash__ = Action.__hash__
+
+    @staticmethod
+    def normalize(run):
+        words = run.split()[:4]
+        matched = None
+        for length in PREFIX_LENGTHS:
+            match = RUN_PREFIXES.get(" ".join(words[:length]))
+            if match is not None and (matched is None or match[0] > matched[0]):
+                matched = match
+        if matched is not None:
+            _, prefix, number = matched
+            return " ".join(words[:number]), prefix
+        return words[0], None
 
     def get_cmd(self):
         return self.run
@@ -76,14 +147,11 @@ class Run(Action):
     def __str__(self):
         return f'Runs "{self.run}"'
 
-    def __hash__(self):
-        return hash(self.run)
-
     def str2(self):
         return self.run
 
     def __eq__(self, other):
-        return isinstance(other, Run) and self.run == other.run
+        return self is other or (isinstance(other, Run) and self.run == other.run)
 
 
 def flatten(to_flatten):
@@ -93,20 +161,30 @@ def flatten(to_flatten):
     return output.strip()
 
 
+# The index of the last entry of every prefix of Run, with the prefix and its
+# number of words
+RUN_PREFIXES = {
+    prefix: (index, prefix, number)
+    for index, (prefix, number) in enumerate(Run.prefixes)
+}
+PREFIX_LENGTHS = sorted({len(prefix.split()) for prefix in RUN_PREFIXES})
+
+
 class Uses(Action):
-    def __init__(self, uses):
-        super().__init__()
+    __slots__ = ("uses",)
+    fields = ("uses",)
+    by_key = dict()
+    __hash__ = Action.__hash__
+
+    @staticmethod
+    def normalize(uses):
         if uses:
             index = uses.rfind("@")
-            self.uses = uses[:index] if index != -1 else uses
-        else:
-            self.uses = ""
-
-    def __hash__(self):
-        return hash(self.uses)
+            return (uses[:index] if index != -1 else uses,)
+        return ("",)
 
     def __eq__(self, other):
-        return isinstance(other, Uses) and self.uses == other.uses
+        return self is other or (isinstance(other, Uses) and self.uses == other.uses)
 
     def __str__(self):
         return f"Uses {self.uses}"
@@ -116,15 +194,13 @@ class Uses(Action):
 
 
 class Empty(Action):
-    def __init__(self):
-        super().__init__()
+    __slots__ = ()
+    by_key = dict()
+    __hash__ = Action.__hash__
 
     def __str__(self):
         return "Empty action"
 
-    def __hash__(self):
-        return hash("Empty")
-
     def __eq__(self, other):
         return isinstance(other, Empty)
 
@@ -133,15 +209,13 @@ class Empty(Action):
 
 
 class Invalid(Action):
-    def __init__(self):
-        super().__init__()
+    __slots__ = ()
+    by_key = dict()
+    __hash__ = Action.__hash__
 
     def __str__(self):
         return "Invalid file"
 
-    def __hash__(self):
-        return hash("Invalid")
-
     def __eq__(self, other):
         return isinstance(other, Empty)
 
@@ -150,18 +224,22 @@ class Invalid(Action):
 
 
 class Plugin(Action):
-    def __init__(self, plugin):
-        super().__init__()
-        self.plugin = plugin
+    __slots__ = ("plugin",)
+    fields = ("plugin",)
+    by_key = dict()
+    __hash__ = Action.__hash__
+
+    @staticmethod
+    def normalize(plugin):
+        return (plugin,)
 
     def __str__(self):
         return f"Plugin {self.plugin}"
 
-    def __hash__(self):
-        return hash(self.plugin)
-
     def __eq__(self, other):
-        return isinstance(other, Plugin) and self.plugin == other.plugin
+        return self is other or (
+            isinstance(other, Plugin) and self.plugin == other.plugin
+        )
 
     def str2(self):
         return self.plugin
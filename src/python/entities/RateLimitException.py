@@ -1,7 +1,47 @@
+import time
+from email.utils import parsedate_to_datetime
+
+
 class RateLimitException(Exception):
-    def __init__(self, message):
+    def __init__(self, message, reset=None):
         self.message = message
+        # Epoch seconds at which the rate limit resets, if GitHub told us
+        self.reset = reset
         super().__init__(self.message)
 
     def __str__(self):
         return f"Rate limit exception: {self.message}"
+
+
+def rate_limit_reset(headers):
+    """
+    Get the moment a rate limit resets from the headers of a 403 or 429 response
+    :param headers: the response headers
+    :return: the reset time in epoch seconds, or None if the headers do not say
+    """
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        # Either a number of seconds or an HTTP date
+        if retry_after.strip().isdigit():
+            return time.time() + int(retry_after)
+        try:
+            return parsedate_to_datetime(retry_after).timestamp()
+        except (TypeError, ValueError):
+            pass
+    if "x-ratelimit-reset" in headers:
+        return int(headers["x-ratelimit-reset"])
+    return None
+
+
+def is_rate_limited(response):
+    """
+    GitHub sends x-ratelimit-reset with every response, so a 403 is only a rate
+    limit when the budget is spent or it says when to retry. Otherwise access
+    is denied for good, e.g. to a blocked repository.
+    """
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and (
+        response.headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in response.headers
+    )
@@ -0,0 +1,125 @@
+import base64
+import json
+import os
+import tarfile
+
+from src.python.extractor.RepositoryDownloader import AutomationDownloader
+from src.python.extractor.ResponseCache import CachedResponse, url_key
+
+WORKFLOW_EXTENSIONS = [".yaml", ".yml", "pom.xml"]
+
+
+class ArchiveAutomationDownloader(AutomationDownloader):
+    """
+    Downloader that fetches the tarball of the default branch in one request
+    instead of a contents call per pom.xml and a download per file. The archive
+    is extracted while it streams in and only the workflow and pom.xml files
+    are kept, the rest is never written to disk. The files under save_path are
+    the same as with the REST path. The extracted files are cached by the
+    commit of the archive, so a warm run only looks up the head of the default
+    branch, like the REST path does.
+    """
+
+    def download_files(self, repo: str):
+        if self.verbose:
+            print("Downloading", repo, end="")
+        os.makedirs(os.path.join(self.save_path, repo), exist_ok=True)
+
+        whole_repo = self.send_request(f"{self.api_url}/repos/{repo}")
+        head = None
+        if whole_repo.status_code == 200:
+            head = self.head_sha(repo, whole_repo.json()["default_branch"])
+        if head is None:
+            # Removed, or empty without a default branch to archive
+            print(f"Remove {repo}")
+            return 0, 0
+
+        url = f"{self.api_url}/repos/{repo}/tarball/{head}"
+        files = self.cached_files(url)
+        if files is False:
+            response = self.fetch(url, stream=True)
+            try:
+                if response.status_code != 200:
+                    print(f"Remove {repo}")
+                    return 0, 0
+                files = self.extract_files(response)
+            finally:
+                response.close()
+            self.cache_files(url, files)
+        if self.on_discovered is not None:
+            self.on_discovered(repo)
+
+        # The repository uses gradle
+        if files is None:
+            return 0, 0
+
+        workflows, pom_files = files
+        if len(workflows) + len(pom_files) == 0:
+            if self.verbose:
+                print(" Error found")
+            return 0, 0
+
+        for file_name, content in workflows:
+            self.write_file(os.path.join(repo, file_name), content)
+        for file_path, content in pom_files:
+            self.write_file(os.path.join(repo, file_path), content)
+        return len(pom_files), len(workflows)
+
+    def cached_files(self, url):
+        """
+        :return: the files extracted from the archive at url as extract_files
+        returns them, or False if they are not cached
+        """
+        # The archive of a commit never changes, so the entry never expires
+        cached = self.cache.get(url)
+        if cached is None:
+            return False
+        files = json.loads(cached.content)
+        if files is None:
+            return None
+        return tuple(
+            [(path, base64.b64decode(content)) for path, content in entries]
+            for entries in files
+        )
+
+    def cache_files(self, url, files):
+        if files is not None:
+            files = [
+                [
+                    (path, base64.b64encode(content).decode())
+                    for path, content in entries
+                ]
+                for entries in files
+            ]
+        self.cache.put_cached(
+            url_key(url),
+            CachedResponse(url, 200, dict(), json.dumps(files).encode("utf-8")),
+        )
+
+    @staticmethod
+    def extract_files(response):
+        """
+        Read the workflow and pom.xml files from a streamed tarball
+        :return: lists of (name, content) workflows and (path, content) poms, or
+        None if the repository uses gradle
+        """
+        # The body is a gzip file, not a gzip content encoding, but a server
+        # may still compress it on top
+        response.raw.decode_content = True
+        workflows, pom_files = [], []
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+            for member in archive:
+                # Every path starts with a directory named after the commit
+                path = member.name.partition("/")[2]
+                if "gradle" in path:
+                    return None
+                if not member.isfile():
+                    continue
+                directory, _, file_name = path.rpartition("/")
+                if directory == ".github/workflows" and any(
+                    file_name.endswith(extension) for extension in WORKFLOW_EXTENSIONS
+                ):
+                    workflows.append((file_name, archive.extractfile(member).read()))
+                elif file_name == "pom.xml":
+                    pom_files.append((path, archive.extractfile(member).read()))
+        return workflows, pom_files
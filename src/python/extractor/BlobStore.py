@@ -0,0 +1,78 @@
+import hashlib
+import os
+import shutil
+import threading
+
+
+def git_blob_sha(content: bytes) -> str:
+    """
+    Compute the SHA git uses for a blob with the given content
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def write_file(path, content: bytes, blob_store=None):
+    """
+    Write a downloaded file, through the blob store if there is one
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    except FileNotFoundError as e:
+        print(e)
+        return
+
+    if blob_store is not None:
+        # Keyed by the SHA of the content itself, so the store stays correct
+        # even if a download does not match the SHA the API announced
+        sha = git_blob_sha(content)
+        blob_store.put(sha, content)
+        blob_store.link(sha, path)
+        return
+
+    # Replace the file instead of writing into it, it may be a hardlink into the
+    # blob store left by an earlier crawl
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class BlobStore:
+    """
+    Content-addressed store of downloaded files keyed by git blob SHA. Every
+    unique file is kept once under root and linked into the repositories that
+    contain it, so identical workflows and pom.xml files are downloaded once.
+    """
+
+    def __init__(self, root="../blobs"):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha[2:])
+
+    def __contains__(self, sha):
+        return sha is not None and os.path.exists(self.path(sha))
+
+    def put(self, sha: str, content: bytes):
+        path = self.path(sha)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def link(self, sha: str, target: str):
+        """
+        Make target refer to the stored blob, with a hardlink where the
+        filesystem supports it and a copy otherwise.
+        """
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.link(self.path(sha), target)
+        except OSError:
+            shutil.copyfile(self.path(sha), target)
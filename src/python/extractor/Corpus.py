@@ -0,0 +1,166 @@
+import argparse
+import gzip
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+CORPUS_EXTENSIONS = [".tar", ".tar.gz", ".tgz", ".zip", ".jsonl", ".jsonl.gz"]
+
+
+def split_member(name, strip=0):
+    """
+    Split an archive member in the layout of save_path into its repository and
+    its path within the repository
+    :param strip: leading directories to drop first, e.g. 1 for language/owner/repo
+    :return: the repository and path, the path is None for the repository itself
+    """
+    parts = [part for part in name.split("/") if part and part != "."][strip:]
+    if len(parts) < 2:
+        return None, None
+    return "/".join(parts[:2]), "/".join(parts[2:]) or None
+
+
+def read_tar(path, strip=0):
+    # "r|*" reads the archive as a stream, members are never seeked back to
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            repo, file_path = split_member(member.name, strip)
+            if repo is None:
+                continue
+            if member.isfile():
+                if file_path is not None:
+                    yield repo, file_path, archive.extractfile(member).read()
+            elif file_path is None:
+                yield repo, None, None
+
+
+def read_zip(path, strip=0):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            repo, file_path = split_member(info.filename, strip)
+            if repo is None:
+                continue
+            if info.is_dir():
+                if file_path is None:
+                    yield repo, None, None
+            elif file_path is not None:
+                yield repo, file_path, archive.read(info)
+
+
+def read_jsonl(path, strip=0):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            # The same layout as the members of an archive
+            name = record["repo"]
+            if record.get("path") is not None:
+                name = f"{name}/{record['path']}"
+            repo, file_path = split_member(name, strip)
+            if repo is None:
+                continue
+            content = record.get("content")
+            if file_path is None:
+                yield repo, None, None
+            elif content is not None:
+                yield repo, file_path, content.encode("utf-8")
+
+
+def read_corpus(path, strip=0):
+    """
+    Stream the files of a corpus packed into one tar, zip or JSONL file
+    :param path: the corpus, the format follows from the extension
+    :param strip: leading directories to drop from archive members
+    :return: a generator of (repository, path, content) records, with path
+    and content None for a repository without files
+    """
+    if path.endswith(".zip"):
+        return read_zip(path, strip)
+    if path.endswith((".jsonl", ".jsonl.gz")):
+        return read_jsonl(path, strip)
+    if path.endswith((".tar", ".tar.gz", ".tgz")):
+        return read_tar(path, strip)
+    raise ValueError(f"Unknown corpus format {path}, use one of {CORPUS_EXTENSIONS}")
+
+
+def pack_corpus(save_path, path):
+    """
+    Pack the repositories downloaded to save_path into one corpus file
+    :param path: the corpus to write, the format follows from the extension
+    :return: the number of files packed
+    """
+    records = []
+    for owner in sorted(os.listdir(save_path)):
+        if not os.path.isdir(os.path.join(save_path, owner)):
+            continue
+        for name in sorted(os.listdir(os.path.join(save_path, owner))):
+            repo_path = os.path.join(save_path, owner, name)
+            if not os.path.isdir(repo_path):
+                continue
+            records.append((f"{owner}/{name}", None, None))
+            for root, _, files in sorted(os.walk(repo_path)):
+                for file in sorted(files):
+                    file_path = os.path.join(root, file)
+                    records.append(
+                        (
+                            f"{owner}/{name}",
+                            os.path.relpath(file_path, repo_path).replace(os.sep, "/"),
+                            file_path,
+                        )
+                    )
+
+    if path.endswith((".jsonl", ".jsonl.gz")):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            for repo, file_path, source in records:
+                content = None
+                if source is not None:
+                    with open(source, "rb") as source_file:
+                        content = source_file.read().decode("utf-8", errors="replace")
+                record = {"repo": repo, "path": file_path, "content": content}
+                f.write(json.dumps(record) + "\n")
+    elif path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for repo, file_path, source in records:
+                if source is None:
+                    archive.writestr(f"{repo}/", b"")
+                else:
+                    archive.write(source, f"{repo}/{file_path}")
+    elif path.endswith((".tar", ".tar.gz", ".tgz")):
+        mode = "w" if path.endswith(".tar") else "w:gz"
+        with tarfile.open(path, mode) as archive:
+            for repo, file_path, source in records:
+                if source is None:
+                    info = tarfile.TarInfo(repo)
+                    info.type = tarfile.DIRTYPE
+                    archive.addfile(info)
+                else:
+                    with open(source, "rb") as source_file:
+                        content = source_file.read()
+                    info = tarfile.TarInfo(f"{repo}/{file_path}")
+                    info.size = len(content)
+                    archive.addfile(info, io.BytesIO(content))
+    else:
+        raise ValueError(
+            f"Unknown corpus format {path}, use one of {CORPUS_EXTENSIONS}"
+        )
+    return sum(source is not None for _, _, source in records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser(
+        "pack", help="Pack a download directory into one corpus file"
+    )
+    pack_parser.add_argument("save_path", help="e.g. ../output/java")
+    pack_parser.add_argument("corpus", help="e.g. ../output/java.tar.gz")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack_corpus(args.save_path, args.corpus)
+        print(f"Packed {count} files into {args.corpus}")
@@ -0,0 +1,222 @@
+import time
+
+from src.python.extractor.HttpClient import github_api_url
+from src.python.extractor.TreeScanner import filter_tree
+
+# Assumed for repositories of which nothing is cached yet, until the plan has
+# seen repositories to take an average of
+DEFAULT_POM_FILES = 1
+DEFAULT_WORKFLOWS = 2
+
+
+class RepoPlan:
+    def __init__(self, repo):
+        self.repo = repo
+        self.cached = 0
+        # Requests known to be missing from the cache
+        self.remaining = 0
+        # Estimated requests for the files that are not known yet
+        self.estimated = 0.0
+        self.pom_files = None
+        self.workflows = None
+
+    @property
+    def requests(self):
+        return self.remaining + self.estimated
+
+
+class CrawlPlanner:
+    """
+    Estimates the requests a crawl with AutomationDownloader will send, by
+    replaying its request pattern per repository against the response cache:
+    the workflows directory, the repository, the head of the default branch,
+    the recursive tree, a contents call per pom.xml and a download per file.
+    As long as the responses are cached the exact URLs are known, from the
+    first missing one on the number of files is estimated from the averages
+    of the repositories that are fully cached. The GraphQL and archive
+    downloaders need fewer requests than planned.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.api_url = github_api_url()
+
+    def plan(self, repos):
+        plans = [self.plan_repo(repo.strip()) for repo in repos if repo.strip()]
+
+        known = [plan for plan in plans if plan.pom_files is not None]
+        pom_files = (
+            sum(plan.pom_files for plan in known) / len(known)
+            if known
+            else DEFAULT_POM_FILES
+        )
+        known = [plan for plan in plans if plan.workflows is not None]
+        workflows = (
+            sum(plan.workflows for plan in known) / len(known)
+            if known
+            else DEFAULT_WORKFLOWS
+        )
+        for plan in plans:
+            # A contents call and a download per pom.xml, a download per workflow
+            if plan.pom_files is None:
+                plan.estimated += 2 * pom_files
+            if plan.workflows is None:
+                plan.estimated += workflows
+        return plans
+
+    def plan_repo(self, repo):
+        plan = RepoPlan(repo)
+
+        def lookup(url):
+            response = self.cache.peek(url)
+            if response is None:
+                plan.remaining += 1
+            else:
+                plan.cached += 1
+            return response
+
+        found_files = lookup(f"{self.api_url}/repos/{repo}/contents/.github/workflows")
+        workflow_files = None
+        if found_files is not None:
+            workflow_files = []
+            if found_files.status_code == 200:
+                files = found_files.json()
+                workflow_files = [
+                    file
+                    for file in (files if type(files) is list else [files])
+                    if file["name"].endswith((".yaml", ".yml"))
+                ]
+
+        pom_files = None
+        whole_repo = lookup(f"{self.api_url}/repos/{repo}")
+        if whole_repo is not None and whole_repo.status_code != 200:
+            # Removed, nothing is downloaded
+            plan.pom_files = plan.workflows = 0
+            return plan
+        if whole_repo is None:
+            # The head and the tree
+            plan.remaining += 2
+        else:
+            default_branch = whole_repo.json()["default_branch"]
+            sha = lookup(f"{self.api_url}/repos/{repo}/git/refs/heads/{default_branch}")
+            if sha is None:
+                plan.remaining += 1
+            elif sha.status_code != 200:
+                pom_files = []
+            else:
+                head = sha.json()["object"]["sha"]
+                tree = lookup(
+                    f"{self.api_url}/repos/{repo}/git/trees/{head}?recursive=1"
+                )
+                if tree is not None and tree.status_code == 200:
+                    entries = filter_tree([tree.content])["tree"]
+                    if any("gradle" in entry["path"] for entry in entries):
+                        # Skipped as a gradle repository
+                        plan.pom_files = plan.workflows = 0
+                        return plan
+                    pom_files = entries
+                elif tree is not None:
+                    pom_files = []
+
+        if pom_files is not None:
+            plan.pom_files = len(pom_files)
+            for pom_file in pom_files:
+                url = f"{self.api_url}/repos/{repo}/contents/{pom_file['path']}"
+                contents = self.cache.peek(url)
+                if contents is None:
+                    # The contents call and the download of the file it finds
+                    plan.remaining += 2
+                    continue
+                plan.cached += 1
+                if contents.status_code == 200:
+                    lookup(contents.json()["download_url"])
+        if workflow_files is not None:
+            plan.workflows = len(workflow_files)
+            for workflow_file in workflow_files:
+                lookup(workflow_file["download_url"])
+        return plan
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def print_plan(plans, rate_limit_remaining, rate_limit_total):
+    cached = sum(plan.cached for plan in plans)
+    remaining = sum(plan.remaining for plan in plans)
+    estimated = sum(plan.estimated for plan in plans)
+    requests = remaining + estimated
+    print(
+        f"Plan for {len(plans)} repositories: {cached} cached responses, "
+        f"{requests:.0f} requests to send ({estimated:.0f} of them estimated)"
+    )
+    uncached = sum(plan.cached == 0 for plan in plans)
+    print(f"Repositories without any cached response: {uncached}")
+    if type(rate_limit_remaining) is not int:
+        rate_limit_remaining = rate_limit_total
+    if requests <= rate_limit_remaining:
+        print(f"Fits in the remaining rate limit of {rate_limit_remaining}")
+    else:
+        # GitHub resets the rate limit every hour
+        windows = (requests - rate_limit_remaining) / rate_limit_total
+        print(
+            f"Needs the remaining rate limit of {rate_limit_remaining} and "
+            f"{windows:.1f} more hourly windows of {rate_limit_total} requests"
+        )
+
+
+class CrawlProgress:
+    """
+    Prints the throughput, the remaining rate limit and an ETA while crawling,
+    at most every `interval` seconds and once all repositories are done.
+    """
+
+    def __init__(self, total, interval=30.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.start = time.time()
+        self.last_report = self.start
+
+    def update(self, downloaders):
+        """
+        Called by the download drivers once a repository is done
+        """
+        self.done += 1
+        now = time.time()
+        if now - self.last_report >= self.interval or self.done == self.total:
+            self.last_report = now
+            print(self.report(downloaders, now))
+
+    def report(self, downloaders, now=None):
+        elapsed = max((now or time.time()) - self.start, 1e-9)
+        num_requests = sum(downloader.num_requests for downloader in downloaders)
+        remaining_repos = self.total - self.done
+        repos_per_second = self.done / elapsed
+        budget = downloaders[-1].rate_limit_remaining
+
+        message = (
+            f"Progress: {self.done}/{self.total} repositories "
+            f"({self.done / max(self.total, 1):.0%}), "
+            f"{repos_per_second:.2f} repositories/s, "
+            f"{num_requests / elapsed:.1f} requests/s, "
+            f"remaining rate limit {budget}/{downloaders[-1].rate_limit_total}"
+        )
+        if remaining_repos > 0 and repos_per_second > 0:
+            message += f", ETA {format_duration(remaining_repos / repos_per_second)}"
+        requests_per_repo = num_requests / self.done if self.done else 0
+        if (
+            type(budget) is int
+            and requests_per_repo > 0
+            and requests_per_repo * remaining_repos > budget
+        ):
+            message += (
+                f", the rate limit runs out in about "
+                f"{budget / requests_per_repo:.0f} repositories"
+            )
+        return message
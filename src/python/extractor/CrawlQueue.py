@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import threading
+import time
+from enum import Enum
+
+
+class JobState(Enum):
+    PENDING = "pending"
+    DISCOVERED = "discovered"
+    DOWNLOADED = "downloaded"
+    FAILED = "failed"
+    NO_POM = "no-pom"
+
+
+class CrawlQueue:
+    """
+    Persistent queue of repositories to crawl, stored in SQLite so a killed
+    crawl resumes where it stopped. Pending and discovered repositories are
+    (re)crawled, every other state is final.
+    """
+
+    def __init__(self, path="../output/crawl_queue.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "repo TEXT PRIMARY KEY, position INTEGER, state TEXT, "
+            "pom_files INTEGER DEFAULT 0, workflows INTEGER DEFAULT 0, "
+            "error TEXT, updated_at REAL)"
+        )
+        self.connection.commit()
+
+    def add(self, repos):
+        """
+        Add repositories as pending, keeping the state of ones already queued
+        """
+        with self.lock:
+            position = self.connection.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM jobs"
+            ).fetchone()[0]
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (repo, position, state, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (repo.strip(), position + i, JobState.PENDING.value, time.time())
+                    for i, repo in enumerate(repos)
+                    if repo.strip()
+                ],
+            )
+            self.connection.commit()
+
+    def pending(self):
+        with self.lock:
+            return [
+                row[0]
+                for row in self.connection.execute(
+                    "SELECT repo FROM jobs WHERE state IN (?, ?) ORDER BY position",
+                    (JobState.PENDING.value, JobState.DISCOVERED.value),
+                )
+            ]
+
+    def mark(self, repo, state: JobState, pom_files=0, workflows=0, error=None):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, pom_files = ?, workflows = ?, error = ?, "
+                "updated_at = ? WHERE repo = ?",
+                (state.value, pom_files, workflows, error, time.time(), repo),
+            )
+            self.connection.commit()
+
+    def state(self, repo):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT state FROM jobs WHERE repo = ?", (repo,)
+            ).fetchone()
+        return JobState(row[0]) if row else None
+
+    def repos_in_state(self, state: JobState):
+        with self.lock:
+            return {
+                row[0]
+                for row in self.connection.execute(
+                    "SELECT repo FROM jobs WHERE state = ?", (state.value,)
+                )
+            }
+
+    def counts(self):
+        with self.lock:
+            return {
+                JobState(state): count
+                for state, count in self.connection.execute(
+                    "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+                )
+            }
+
+    def totals(self):
+        """
+        :return: the number of repositories, pom files and workflows over all runs
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(pom_files), 0), "
+                "COALESCE(SUM(workflows), 0) FROM jobs"
+            ).fetchone()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.python.extractor.RepositoryDownloader import AutomationDownloader
+
+
+class CrawlState:
+    """
+    Head commit and downloaded files of every repository as of the last crawl,
+    stored in SQLite per save_path, since every downloader writes its own copy.
+    """
+
+    def __init__(self, path="../output/crawl_state.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS heads ("
+            "save_path TEXT, repo TEXT, sha TEXT, pom_files INTEGER, "
+            "workflows INTEGER, updated_at REAL, PRIMARY KEY (save_path, repo))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "save_path TEXT, repo TEXT, filename TEXT, sha TEXT, "
+            "PRIMARY KEY (save_path, filename))"
+        )
+        self.connection.commit()
+
+    def head(self, save_path, repo):
+        """
+        :return: the head SHA, pom files and workflows of the last crawl, or None
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT sha, pom_files, workflows FROM heads "
+                "WHERE save_path = ? AND repo = ?",
+                (save_path, repo),
+            ).fetchone()
+
+    def files(self, save_path, repo):
+        """
+        :return: the blob SHA of every downloaded file by its filename
+        """
+        with self.lock:
+            return dict(
+                self.connection.execute(
+                    "SELECT filename, sha FROM files WHERE save_path = ? AND repo = ?",
+                    (save_path, repo),
+                )
+            )
+
+    def update(self, save_path, repo, sha, pom_files, workflows, files):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO heads VALUES (?, ?, ?, ?, ?, ?)",
+                (save_path, repo, sha, pom_files, workflows, time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM files WHERE save_path = ? AND repo = ?", (save_path, repo)
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                [
+                    (save_path, repo, filename, file_sha)
+                    for filename, file_sha in files.items()
+                ],
+            )
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class DeltaAutomationDownloader(AutomationDownloader):
+    """
+    Downloader for refreshing an earlier crawl. Repositories whose default
+    branch head did not move are skipped after two conditional requests; for
+    the others only files whose blob SHA changed are downloaded and files that
+    disappeared are removed. What changed is collected in a manifest, so the
+    analysis can be rerun for the affected repositories only.
+    """
+
+    def __init__(self, save_path=None, state=None, **kwargs):
+        # The head has to be revalidated, a cached one would never change
+        kwargs["refresh"] = True
+        super().__init__(save_path, **kwargs)
+        self.state = state if state is not None else CrawlState()
+        self.changes = dict()
+        self.num_unchanged = 0
+        # The repository being downloaded by the current thread
+        self.current = threading.local()
+
+    def download_files(self, repo: str):
+        head = None
+        whole_repo = self.send_request(f"{self.api_url}/repos/{repo}")
+        if whole_repo.status_code == 200:
+            head = self.head_sha(repo, whole_repo.json()["default_branch"])
+
+        previous = self.state.head(self.save_path, repo)
+        if head is None:
+            # The lookup failed, e.g. on a 5xx, so nothing is known to have
+            # changed: the files and the state are kept for the next crawl
+            if self.verbose:
+                print("Could not get the head of", repo, end="")
+            return (previous[1], previous[2]) if previous is not None else (0, 0)
+        if previous is not None and previous[0] == head:
+            if self.on_discovered is not None:
+                self.on_discovered(repo)
+            with self.lock:
+                self.num_unchanged += 1
+            if self.verbose:
+                print("Unchanged", repo, end="")
+            return previous[1], previous[2]
+
+        previous_files = self.state.files(self.save_path, repo)
+        self.current.repo = repo
+        self.current.previous_files = previous_files
+        self.current.previous_shas = set(previous_files.values())
+        self.current.files = dict()
+        self.current.added = []
+        self.current.modified = []
+        try:
+            pom_files, workflows = super().download_files(repo)
+        finally:
+            self.current.repo = None
+
+        removed = []
+        for filename in previous_files:
+            if filename not in self.current.files:
+                path = os.path.join(self.save_path, filename)
+                if os.path.exists(path):
+                    os.remove(path)
+                removed.append(filename)
+
+        self.state.update(
+            self.save_path, repo, head, pom_files, workflows, self.current.files
+        )
+        new = previous is None
+        if new or self.current.added or self.current.modified or removed:
+            with self.lock:
+                self.changes[repo] = {
+                    "status": "new" if new else "changed",
+                    "head": head,
+                    "added": self.current.added,
+                    "modified": self.current.modified,
+                    "removed": removed,
+                }
+        return pom_files, workflows
+
+    def has_blob(self, sha):
+        # Unchanged pom files need no contents call either
+        if getattr(self.current, "repo", None) and sha in self.current.previous_shas:
+            return True
+        return super().has_blob(sha)
+
+    def download_file(self, url, filename, params=None, sha=None):
+        previous_sha = self.current.previous_files.get(filename)
+        if (
+            sha is not None
+            and previous_sha == sha
+            and os.path.exists(os.path.join(self.save_path, filename))
+        ):
+            self.current.files[filename] = sha
+            return
+
+        if url is None and not super().has_blob(sha):
+            # Skipped as unchanged, but it was stored under another path
+            path = os.path.relpath(filename, self.current.repo).replace(os.sep, "/")
+            contents = self.send_request(
+                f"{self.api_url}/repos/{self.current.repo}/contents/{path}"
+            )
+            if contents.status_code != 200:
+                return
+            url = contents.json()["download_url"]
+        super().download_file(url, filename, params, sha)
+
+        self.current.files[filename] = sha
+        if previous_sha is None:
+            self.current.added.append(filename)
+        else:
+            self.current.modified.append(filename)
+
+    def write_manifest(self, path=None):
+        """
+        Write the new and changed repositories of this crawl as JSON
+        :param path: defaults to changes.json in save_path
+        """
+        path = path or os.path.join(self.save_path, "changes.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "crawled_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "unchanged": self.num_unchanged,
+                    "repos": self.changes,
+                },
+                f,
+                indent=2,
+            )
+        return path
+
+
+def changed_repos(manifest_paths):
+    """
+    :return: the repositories listed in any of the change manifests
+    """
+    repos = set()
+    for path in manifest_paths:
+        if os.path.exists(path):
+            with open(path) as f:
+                repos.update(json.load(f)["repos"])
+    return repos
@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+
+def read_repo_languages(repo_lists):
+    """
+    :param repo_lists: path of the repository list of every language
+    :return: the languages of every repository listed
+    """
+    languages = defaultdict(list)
+    for language, path in repo_lists.items():
+        with open(path) as file:
+            for line in file:
+                if line.strip() and language not in languages[line.strip()]:
+                    languages[line.strip()].append(language)
+    return languages
+
+
+class LanguageRouter:
+    """
+    Passes every repository only to the downloader of its language, so it is
+    discovered once and written to a single output root instead of once per
+    downloader. It stands in for the list of downloaders in the download_files
+    drivers.
+    """
+
+    def __init__(self, downloaders, languages):
+        """
+        :param downloaders: the downloader of every language
+        :param languages: the languages of every repository
+        """
+        self.downloaders = downloaders
+        self.languages = languages
+        self.num_unknown = 0
+
+    @classmethod
+    def from_files(cls, downloaders, repo_lists):
+        return cls(downloaders, read_repo_languages(repo_lists))
+
+    def prepare(self, repos):
+        for language, downloader in self.downloaders.items():
+            downloader.prepare(
+                [
+                    repo
+                    for repo in repos
+                    if language in self.languages.get(repo.strip(), [])
+                ]
+            )
+
+    def download_files(self, repo: str):
+        languages = self.languages.get(repo.strip(), [])
+        if not languages:
+            print(f"No language known for {repo}")
+            self.num_unknown += 1
+            return 0, 0
+
+        pom_files = workflows = 0
+        for language in languages:
+            pom_files, workflows = self.downloaders[language].download_files(repo)
+        return pom_files, workflows
+
+    @property
+    def on_discovered(self):
+        return next(iter(self.downloaders.values())).on_discovered
+
+    @on_discovered.setter
+    def on_discovered(self, callback):
+        for downloader in self.downloaders.values():
+            downloader.on_discovered = callback
+
+    @property
+    def num_requests(self):
+        return sum(downloader.num_requests for downloader in self.downloaders.values())
+
+    @property
+    def num_not_modified(self):
+        return sum(
+            downloader.num_not_modified for downloader in self.downloaders.values()
+        )
+
+    # The downloaders share one token pool
+    @property
+    def rate_limit_remaining(self):
+        return next(iter(self.downloaders.values())).rate_limit_remaining
+
+    @property
+    def rate_limit_total(self):
+        return next(iter(self.downloaders.values())).rate_limit_total
@@ -0,0 +1,215 @@
+import os
+import subprocess
+
+from src.python.extractor.BlobStore import write_file
+
+WORKFLOW_EXTENSIONS = [".yaml", ".yml", "pom.xml"]
+
+
+class CatFile:
+    """
+    A `git cat-file --batch` process reading objects from one repository, kept
+    running for all files of the repository instead of a git call per file.
+    """
+
+    def __init__(self, git_dir):
+        self.git_dir = git_dir
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            ["git", f"--git-dir={self.git_dir}", "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def header(self, sha):
+        """
+        :return: the header line of the object, empty if the process exited
+        """
+        try:
+            self.process.stdin.write(sha.encode() + b"\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            return b""
+        return self.process.stdout.readline()
+
+    def read(self, sha):
+        """
+        :return: the content of the object, or None if it does not exist
+        :raises RuntimeError: if git cat-file exits, also after a restart
+        """
+        header = self.header(sha)
+        if not header:
+            # The process exited, e.g. it was killed, start it once more
+            self.close()
+            self.start()
+            header = self.header(sha)
+            if not header:
+                raise RuntimeError(
+                    f"git cat-file exited reading {sha} from {self.git_dir}"
+                )
+        if header.endswith(b" missing\n"):
+            return None
+        size = int(header.split()[2])
+        content = self.process.stdout.read(size)
+        # Every object is followed by a newline
+        self.process.stdout.read(1)
+        return content
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GitMirrorDownloader:
+    """
+    Reads the workflow and pom.xml files from local git clones, bare or not,
+    at mirrors_path/owner/repository(.git) instead of the GitHub API, and
+    writes them to the same layout under save_path. Without network access or
+    rate limits it can stand in for the downloaders in the download drivers.
+    """
+
+    def __init__(
+        self,
+        save_path=None,
+        mirrors_path="../mirrors",
+        verbose=True,
+        blob_store=None,
+        clone_missing=False,
+    ):
+        """
+        :param clone_missing: make a bare clone of repositories not mirrored yet
+        """
+        self.save_path = save_path
+        self.mirrors_path = mirrors_path
+        self.verbose = verbose
+        self.blob_store = blob_store
+        self.clone_missing = clone_missing
+        self.on_discovered = None
+        self.num_requests = 0
+        self.num_not_modified = 0
+        self.rate_limit_remaining = "n/a"
+        self.rate_limit_total = "n/a"
+
+    def prepare(self, repos):
+        pass
+
+    def git_dir(self, repo):
+        """
+        :return: the git directory of the mirror of a repository, or None
+        """
+        bare = os.path.join(self.mirrors_path, f"{repo}.git")
+        for git_dir in [bare, os.path.join(self.mirrors_path, repo, ".git")]:
+            if os.path.isdir(git_dir):
+                return git_dir
+        if not self.clone_missing:
+            return None
+        result = subprocess.run(
+            [
+                "git",
+                "clone",
+                "--bare",
+                "--quiet",
+                f"https://github.com/{repo}.git",
+                bare,
+            ],
+            capture_output=True,
+        )
+        if result.returncode != 0:
+            print(f"Could not clone {repo}: {result.stderr.decode().strip()}")
+            return None
+        return bare
+
+    def download_files(self, repo: str):
+        if self.verbose:
+            print("Downloading", repo, end="")
+        os.makedirs(os.path.join(self.save_path, repo), exist_ok=True)
+
+        files = self.read_files(repo)
+        if self.on_discovered is not None:
+            self.on_discovered(repo)
+        # Not mirrored or the repository uses gradle
+        if files is None:
+            return 0, 0
+
+        workflows, pom_files = files
+        if len(workflows) + len(pom_files) == 0:
+            if self.verbose:
+                print(" Error found")
+            return 0, 0
+
+        for file_name, content in workflows:
+            self.write_file(os.path.join(repo, file_name), content)
+        for file_path, content in pom_files:
+            self.write_file(os.path.join(repo, file_path), content)
+        return len(pom_files), len(workflows)
+
+    def read_files(self, repo):
+        """
+        Read the workflow and pom.xml files of the head of the default branch
+        :return: lists of (name, content) workflows and (path, content) poms, or
+        None if the repository is not mirrored or uses gradle
+        """
+        git_dir = self.git_dir(repo)
+        if git_dir is None:
+            print(f"Remove {repo}")
+            return None
+        tree = subprocess.run(
+            ["git", f"--git-dir={git_dir}", "ls-tree", "-r", "-t", "-z", "HEAD"],
+            capture_output=True,
+        )
+        if tree.returncode != 0:
+            # An empty repository has no HEAD
+            return [], []
+
+        workflow_shas, pom_shas = [], []
+        for entry in tree.stdout.split(b"\0"):
+            if not entry:
+                continue
+            info, path = entry.decode("utf-8", errors="replace").split("\t", 1)
+            if "gradle" in path:
+                return None
+            _, object_type, sha = info.split()
+            if object_type != "blob":
+                continue
+            directory, _, file_name = path.rpartition("/")
+            if directory == ".github/workflows" and any(
+                file_name.endswith(extension) for extension in WORKFLOW_EXTENSIONS
+            ):
+                workflow_shas.append((file_name, sha))
+            elif file_name == "pom.xml":
+                pom_shas.append((path, sha))
+
+        with CatFile(git_dir) as cat_file:
+            workflows = self.read_blobs(repo, cat_file, workflow_shas)
+            pom_files = self.read_blobs(repo, cat_file, pom_shas)
+        return workflows, pom_files
+
+    def read_blobs(self, repo, cat_file, shas):
+        """
+        :param shas: the (path, sha) of the files to read
+        :return: the (path, content) of the files, without the ones whose blob
+        is missing from the mirror, e.g. of a partial clone
+        """
+        blobs = []
+        for path, sha in shas:
+            content = cat_file.read(sha)
+            if content is None:
+                print(f"Missing blob {sha} of {path} in the mirror of {repo}")
+                continue
+            blobs.append((path, content))
+        return blobs
+
+    def write_file(self, filename, content: bytes):
+        write_file(os.path.join(self.save_path, filename), content, self.blob_store)
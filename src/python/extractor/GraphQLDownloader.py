@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+
+from src.python.entities.RateLimitException import (RateLimitException,
+                                                    rate_limit_reset)
+from src.python.extractor.HttpClient import http_client
+from src.python.extractor.RepositoryDownloader import AutomationDownloader
+from src.python.extractor.ResponseCache import url_key
+
+WORKFLOWS_FRAGMENT = """
+    defaultBranchRef { name target { oid } }
+    workflows: object(expression: "HEAD:.github/workflows") {
+      ... on Tree {
+        entries { name path type object { ... on Blob { text isBinary isTruncated } } }
+      }
+    }
+"""
+
+BLOB_FRAGMENT = "... on Blob { text isBinary isTruncated }"
+
+
+class GraphQLAutomationDownloader(AutomationDownloader):
+    """
+    Downloader that discovers repositories in batches through the GitHub GraphQL
+    API. One query returns the default branch, the head commit and the workflow
+    files of `batch_size` repositories, a second one the pom.xml files found in
+    their trees. The recursive tree itself still comes from the REST API, since
+    GraphQL cannot search a tree. Repositories or files GraphQL cannot answer
+    fall back to the REST path, so the files under save_path are identical.
+    """
+
+    def __init__(self, save_path=None, batch_size=25, **kwargs):
+        super().__init__(save_path, **kwargs)
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_index = dict()
+        self.discovered = dict()
+        # The future of the batch every repository being discovered belongs to
+        self.in_discovery = dict()
+        self.discovery_lock = threading.Lock()
+
+    def prepare(self, repos):
+        self.pending = [repo.strip() for repo in repos]
+        self.pending_index = {repo: i for i, repo in enumerate(self.pending)}
+
+    def send_graphql(self, query, variables):
+        graphql_url = f"{self.api_url}/graphql"
+        body = json.dumps({"query": query, "variables": variables}, sort_keys=True)
+        cache_url = f"{graphql_url}#{url_key(body)}"
+        cached = self.cache.get(cache_url)
+        if cached is not None and not cached.expired and not self.refresh:
+            return cached.json()
+
+        # GraphQL has its own rate limit bucket, so the REST budgets are not updated
+        token = self.token_pool.acquire()
+        response = http_client.post(
+            graphql_url,
+            idempotent=True,
+            data=body,
+            headers=self.token_pool.headers(token),
+        )
+        if response.status_code == 403 or response.status_code == 429:
+            raise RateLimitException(
+                f"Rate limit exceeded on {graphql_url}",
+                rate_limit_reset(response.headers),
+            )
+        result = response.json()
+        if any(
+            error.get("type") == "RATE_LIMITED" for error in result.get("errors", [])
+        ):
+            raise RateLimitException(
+                f"Rate limit exceeded on {graphql_url}",
+                rate_limit_reset(response.headers),
+            )
+
+        with self.lock:
+            self.num_requests += 1
+
+        if response.status_code == 200:
+            self.cache.put(cache_url, response)
+        return result
+
+    def discover(self, repo):
+        """
+        Return the discovery result of a repository, querying the batch of
+        pending repositories it belongs to if it was not discovered yet.
+        :return: the discovery dict, or None if the REST path should be used
+        """
+        with self.discovery_lock:
+            if repo in self.discovered:
+                return self.discovered.pop(repo)
+            future = self.in_discovery.get(repo)
+            owner = future is None
+            if owner:
+                start = self.pending_index.get(repo)
+                if start is None:
+                    batch = [repo]
+                else:
+                    batch = [
+                        pending
+                        for pending in self.pending[start : start + self.batch_size]
+                        if pending not in self.discovered
+                        and pending not in self.in_discovery
+                    ]
+                future = Future()
+                for pending in batch:
+                    self.in_discovery[pending] = future
+
+        if not owner:
+            # Another thread queries the batch of this repository
+            future.result()
+        else:
+            # The queries run outside the lock, so other batches are not held up
+            try:
+                discovered = self.discover_batch(batch)
+            except BaseException as e:
+                with self.discovery_lock:
+                    for pending in batch:
+                        del self.in_discovery[pending]
+                future.set_exception(e)
+                raise
+            with self.discovery_lock:
+                self.discovered.update(discovered)
+                for pending in batch:
+                    del self.in_discovery[pending]
+            future.set_result(None)
+
+        with self.discovery_lock:
+            return self.discovered.pop(repo)
+
+    def discover_batch(self, batch):
+        """
+        :return: the discovery result of every repository of the batch
+        """
+        variables = dict()
+        fields = []
+        for i, repo in enumerate(batch):
+            owner, name = repo.split("/", 1)
+            variables[f"o{i}"] = owner
+            variables[f"n{i}"] = name
+            fields.append(
+                f"r{i}: repository(owner: $o{i}, name: $n{i}) {{{WORKFLOWS_FRAGMENT}}}"
+            )
+        declarations = ", ".join(
+            f"$o{i}: String!, $n{i}: String!" for i in range(len(batch))
+        )
+        query = f"query({declarations}) {{\n{chr(10).join(fields)}\n}}"
+        data = self.send_graphql(query, variables).get("data") or dict()
+
+        discovered = dict()
+        pom_queries = dict()
+        for i, repo in enumerate(batch):
+            result = data.get(f"r{i}")
+            workflows = (result or dict()).get("workflows")
+            if result is None or (workflows is not None and "entries" not in workflows):
+                # Not found, renamed or not a directory: let REST handle it
+                discovered[repo] = None
+                continue
+
+            discovery = {"workflows": None, "pom_files": []}
+            if workflows is not None:
+                discovery["workflows"] = workflows["entries"]
+            if result["defaultBranchRef"] is not None:
+                oid = result["defaultBranchRef"]["target"]["oid"]
+                discovery["pom_files"] = self.search_tree_for_pom_files(repo, oid)
+                if type(discovery["pom_files"]) is list and discovery["pom_files"]:
+                    pom_queries[repo] = oid
+            discovered[repo] = discovery
+
+        if pom_queries:
+            self.discover_pom_contents(pom_queries, discovered)
+        return discovered
+
+    def discover_pom_contents(self, pom_queries, discovered):
+        variables = dict()
+        declarations = []
+        fields = []
+        for i, (repo, oid) in enumerate(pom_queries.items()):
+            owner, name = repo.split("/", 1)
+            variables[f"o{i}"] = owner
+            variables[f"n{i}"] = name
+            declarations.append(f"$o{i}: String!, $n{i}: String!")
+            blobs = []
+            for j, pom_file in enumerate(discovered[repo]["pom_files"]):
+                variables[f"e{i}_{j}"] = f"{oid}:{pom_file['path']}"
+                declarations.append(f"$e{i}_{j}: String!")
+                blobs.append(
+                    f"p{j}: object(expression: $e{i}_{j}) {{ {BLOB_FRAGMENT} }}"
+                )
+            fields.append(
+                f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ {' '.join(blobs)} }}"
+            )
+        query = f"query({', '.join(declarations)}) {{\n{chr(10).join(fields)}\n}}"
+        data = self.send_graphql(query, variables).get("data") or dict()
+
+        for i, repo in enumerate(pom_queries):
+            result = data.get(f"r{i}") or dict()
+            discovered[repo]["pom_blobs"] = [
+                result.get(f"p{j}") for j in range(len(discovered[repo]["pom_files"]))
+            ]
+
+    def download_files(self, repo: str):
+        discovery = self.discover(repo)
+        if discovery is None:
+            return super().download_files(repo)
+
+        pom_files = discovery["pom_files"]
+        eligible_files = 0
+        if self.on_discovered is not None:
+            self.on_discovered(repo)
+
+        if self.verbose:
+            print("Downloading", repo, end="")
+
+        os.makedirs(os.path.join(self.save_path, repo), exist_ok=True)
+
+        # No files
+        if type(pom_files) is int or (
+            discovery["workflows"] is None and len(pom_files) == 0
+        ):
+            return 0, 0
+
+        # (name, path, blob) in the same order the REST path downloads them
+        files = [
+            (entry["name"], entry["path"], entry["object"])
+            for entry in discovery["workflows"] or []
+        ]
+        for pom_file, blob in zip(pom_files, discovery.get("pom_blobs", [])):
+            if blob is not None:
+                files.append((pom_file["path"].split("/")[-1], pom_file["path"], blob))
+
+        found = False
+        for file_name, file_path, blob in files:
+            if any(
+                file_name.endswith(extension)
+                for extension in [".yaml", ".yml", "pom.xml"]
+            ):
+                found = True
+                eligible_files += 1
+                if file_name.endswith("pom.xml"):
+                    filename = os.path.join(repo, file_path)
+                else:
+                    filename = os.path.join(repo, file_name)
+                self.write_blob(repo, file_path, filename, blob)
+        if not found:
+            if self.verbose:
+                print(" Error found")
+            return 0, 0
+
+        return len(pom_files), eligible_files - len(pom_files)
+
+    def write_blob(self, repo, file_path, filename, blob):
+        if blob and not blob["isBinary"] and not blob["isTruncated"]:
+            self.write_file(filename, blob["text"].encode("utf-8"))
+            return
+
+        # Binary or too large for GraphQL, download it the REST way
+        contents = self.send_request(
+            f"{self.api_url}/repos/{repo}/contents/{file_path}"
+        )
+        if contents.status_code == 200:
+            self.download_file(contents.json()["download_url"], filename)
@@ -0,0 +1,155 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to wait for a connection and for the server to send data
+DEFAULT_TIMEOUT = (10, 60)
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+def github_api_url():
+    """
+    Base URL of the GitHub API, GITHUB_API_URL points it to a stand-in server
+    """
+    return os.getenv("GITHUB_API_URL", "https://api.github.com")
+
+
+class HttpClient:
+    """
+    HTTP client shared by the crawlers and the result scripts. It keeps
+    connections alive in a pool per thread, sets connect/read timeouts, retries
+    transient failures with exponential backoff honoring Retry-After, and
+    coalesces concurrent GET requests for the same URL into one.
+    """
+
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT,
+        max_retries=4,
+        backoff=1.0,
+        max_retry_after=120,
+        pool_size=32,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.pool_size = pool_size
+        self.local = threading.local()
+        self.in_flight = dict()
+        self.in_flight_lock = threading.Lock()
+        self.num_coalesced = 0
+        self.num_retries = 0
+
+    def session(self):
+        # requests.Session is not guaranteed to be thread-safe, so every thread
+        # gets its own session with its own connection pool
+        if not hasattr(self.local, "session"):
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_size, pool_maxsize=self.pool_size
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+        return self.local.session
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        if kwargs.get("stream"):
+            return self.request("GET", url, headers=headers, params=params, **kwargs)
+
+        # Every header is part of the key: conditional headers change the
+        # response, and a token may see what another token may not
+        key = (
+            url,
+            tuple(sorted((params or dict()).items())),
+            tuple(
+                sorted(
+                    (name.lower(), value) for name, value in (headers or dict()).items()
+                )
+            ),
+        )
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.num_coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            response = self.request(
+                "GET", url, headers=headers, params=params, **kwargs
+            )
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+
+    def post(self, url, idempotent=False, **kwargs):
+        """
+        :param idempotent: whether the request may be retried after it possibly
+        reached the server, e.g. a GraphQL query but not creating an issue
+        """
+        return self.request("POST", url, idempotent=idempotent, **kwargs)
+
+    def request(self, method, url, idempotent=True, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session().request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                if attempt >= self.max_retries:
+                    raise
+                wait = None
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                wait = None
+            else:
+                wait = self.retry_after(response, idempotent)
+                if wait is False or attempt >= self.max_retries:
+                    return response
+                response.close()
+
+            if wait is None:
+                wait = self.backoff * 2**attempt + random.uniform(0, self.backoff)
+            attempt += 1
+            self.num_retries += 1
+            time.sleep(wait)
+
+    def retry_after(self, response, idempotent):
+        """
+        :return: False if the response should not be retried, otherwise the
+        seconds to wait or None to use exponential backoff
+        """
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None and retry_after.isdigit():
+            # Longer waits are left to the caller, e.g. the crawl queue
+            if int(retry_after) > self.max_retry_after:
+                return False
+            # Secondary rate limits answer 403 or 429 with a Retry-After, a
+            # rejected request was not processed so it can always be resent
+            if response.status_code in {403, 429}:
+                return int(retry_after)
+            if response.status_code in RETRY_STATUSES and idempotent:
+                return int(retry_after)
+        if response.status_code in RETRY_STATUSES and idempotent:
+            return None
+        return False
+
+
+http_client = HttpClient()
@@ -1,67 +1,140 @@
-import hashlib
+import argparse
+import json
 import os
-import pickle
+import threading
 
-import requests
 from dotenv import load_dotenv
 
-from src.python.entities.RateLimitException import RateLimitException
-from src.python.extractor.Utilities import download_files
+from src.python.entities.RateLimitException import (RateLimitException,
+                                                    is_rate_limited,
+                                                    rate_limit_reset)
+from src.python.extractor.BlobStore import BlobStore, write_file
+from src.python.extractor.CrawlPlanner import (CrawlPlanner, CrawlProgress,
+                                               print_plan)
+from src.python.extractor.CrawlQueue import CrawlQueue
+from src.python.extractor.DownloadRouter import LanguageRouter
+from src.python.extractor.HttpClient import github_api_url, http_client
+from src.python.extractor.ResponseCache import ResponseCache, parse_size
+from src.python.extractor.TokenPool import TokenPool
+from src.python.extractor.TreeScanner import TREE_CHUNK_SIZE, filter_tree
+from src.python.extractor.Utilities import (download_files,
+                                            download_files_concurrently,
+                                            download_files_queued)
 
 
 class AutomationDownloader:
-    def __init__(self, save_path=None):
+    def __init__(
+        self,
+        save_path=None,
+        verbose=True,
+        cache=None,
+        refresh=False,
+        blob_store=None,
+        token_pool=None,
+    ):
         load_dotenv()
         self.save_path = save_path
+        self.blob_store = blob_store
+        # Called with the repository once its files are known, before download
+        self.on_discovered = None
+        self.verbose = verbose
+        # Revalidate cached responses once per run instead of serving them forever
+        self.refresh = refresh
+        self.revalidated = set()
+        self.num_not_modified = 0
         self.requests_path = "../requests"
-        os.makedirs(self.requests_path, exist_ok=True)
+        self.cache = cache if cache is not None else ResponseCache(self.requests_path)
+        self.lock = threading.Lock()
         self.num_requests = 0
-        self.rate_limit_remaining = "unknown"
-        self.rate_limit_total = 5000
-        self.github_token = os.getenv("GITHUB_TOKEN")
-        self.base_headers = (
-            {"Authorization": f"token {self.github_token}"} if self.github_token else {}
+        self.token_pool = token_pool if token_pool is not None else TokenPool.from_env()
+        self.api_url = github_api_url()
+
+    @property
+    def rate_limit_remaining(self):
+        return self.token_pool.remaining()
+
+    @property
+    def rate_limit_total(self):
+        return self.token_pool.limit()
+
+    def send_request(self, url: str, params=None, reduce=None):
+        """
+        :param reduce: called with the streamed response of a 200 OK to return
+        the part of the body to cache, so large bodies are never held in memory
+        """
+        cached = self.cache.get(url)
+        # Expired responses are revalidated like in refresh mode
+        if cached is not None and (
+            url in self.revalidated or not (self.refresh or cached.expired)
+        ):
+            return cached
+
+        headers = dict()
+        if cached is not None:
+            # GitHub does not count 304 Not Modified against the rate limit
+            if "etag" in cached.headers:
+                headers["If-None-Match"] = cached.headers["etag"]
+            if "last-modified" in cached.headers:
+                headers["If-Modified-Since"] = cached.headers["last-modified"]
+
+        response = self.fetch(
+            url, headers=headers, params=params, stream=reduce is not None
         )
+        with self.lock:
+            self.revalidated.add(url)
+            if response.status_code == 304 and cached is not None:
+                self.num_not_modified += 1
 
-    def send_request(self, url: str, params=None):
-        filename_url = hashlib.sha256(url.encode()).hexdigest() + ".pkl"
-        file_path = os.path.join(self.requests_path, filename_url)
-        old_filename_url = url.replace("/", "*") + ".pkl"
-        old_file_path = os.path.join(self.requests_path, old_filename_url)
-        # Check if the file exists at the specified path
-        if os.path.exists(file_path):
-            with open(file_path, "rb") as f:
-                return pickle.load(f)
-        elif os.path.exists(old_file_path):
-            with open(old_file_path, "rb") as f:
-                return pickle.load(f)
-        else:
-            response = requests.get(url, headers=self.base_headers, params=params)
-            if response.status_code == 403 or response.status_code == 429:
-                raise RateLimitException(f"Rate limit exceeded on {filename_url}")
+        if response.status_code == 304 and cached is not None:
+            self.cache.touch(url)
+            return cached
+        if reduce is not None and response.status_code == 200:
+            with response:
+                return self.cache.put(url, response, reduce(response))
+        return self.cache.put(url, response)
 
-            self.num_requests += 1
-            if "x-ratelimit-remaining" in response.headers:
-                self.rate_limit_remaining = response.headers["x-ratelimit-remaining"]
-            if "x-ratelimit-limit" in response.headers:
-                self.rate_limit_total = response.headers["x-ratelimit-limit"]
+    def fetch(self, url: str, headers=None, params=None, stream=False):
+        """
+        Send a GET request with a token from the pool, bypassing the cache
+        :param stream: return before the body is read, e.g. for archives
+        :return: the requests.Response
+        """
+        while True:
+            token = self.token_pool.acquire()
+            request_headers = {**self.token_pool.headers(token), **(headers or {})}
+            response = http_client.get(
+                url, headers=request_headers, params=params, stream=stream
+            )
+            if not is_rate_limited(response):
+                break
+            response.close()
+            reset = rate_limit_reset(response.headers)
+            if response.headers.get("x-ratelimit-remaining") != "0":
+                raise RateLimitException(f"Rate limit exceeded on {url}", reset)
+            # This token is spent, acquire() moves on to the next one or raises
+            # once every token is exhausted
+            self.token_pool.exhaust(token, reset)
 
-            with open(file_path, "wb") as f:
-                pickle.dump(response, f)
-            return response
+        self.token_pool.update(token, response.headers)
+        with self.lock:
+            self.num_requests += 1
+        return response
 
     def download_files(self, repo: str):
         # Grab GitHub token, create headers and URL
-        url = f"https://api.github.com/repos/{repo}/contents/.github/workflows"
+        url = f"{self.api_url}/repos/{repo}/contents/.github/workflows"
 
         # Send request
         found_files = self.send_request(url)
         pom_files = self.search_for_pom_files(repo)
+        if self.on_discovered is not None:
+            self.on_discovered(repo)
         files = list()
         eligible_files = 0
 
         path = os.path.join(repo)
-        print("Downloading", path, end="")
+        if self.verbose:
+            print("Downloading", path, end="")
 
         os.makedirs(os.path.join(self.save_path, repo), exist_ok=True)
 
@@ -78,7 +151,18 @@ class AutomationDownloader:
                 files = found_files.json()
 
         for pom_file in pom_files:
-            pom_url = f"https://api.github.com/repos/{repo}/contents/{pom_file['path']}"
+            if self.has_blob(pom_file.get("sha")):
+                # Already downloaded for another repository, no contents call needed
+                files.append(
+                    {
+                        "name": pom_file["path"].split("/")[-1],
+                        "path": pom_file["path"],
+                        "sha": pom_file["sha"],
+                        "download_url": None,
+                    }
+                )
+                continue
+            pom_url = f"{self.api_url}/repos/{repo}/contents/{pom_file['path']}"
             pom_file = self.send_request(pom_url)
             if pom_file.status_code == 200:
                 files.append(pom_file.json())
@@ -95,14 +179,19 @@ class AutomationDownloader:
                 eligible_files += 1
                 if file_name.endswith("pom.xml"):
                     self.download_file(
-                        each_file["download_url"], os.path.join(repo, each_file["path"])
+                        each_file["download_url"],
+                        os.path.join(repo, each_file["path"]),
+                        sha=each_file.get("sha"),
                     )
                 else:
                     self.download_file(
-                        each_file["download_url"], os.path.join(repo, file_name)
+                        each_file["download_url"],
+                        os.path.join(repo, file_name),
+                        sha=each_file.get("sha"),
                     )
         if not found:
-            print(" Error found")
+            if self.verbose:
+                print(" Error found")
             return 0, 0
 
         return len(pom_files), eligible_files - len(pom_files)
@@ -113,58 +202,249 @@ class AutomationDownloader:
         :param repo:
         :return:
         """
-        repo_url = f"https://api.github.com/repos/{repo}"
+        repo_url = f"{self.api_url}/repos/{repo}"
         whole_repo = self.send_request(repo_url)
         if whole_repo.status_code != 200:
             print(f"Remove {repo}")
             return 0
-        default_branch = whole_repo.json()["default_branch"]
-        sha_url = f"https://api.github.com/repos/{repo}/git/refs/heads/{default_branch}"
+        head = self.head_sha(repo, whole_repo.json()["default_branch"])
+        if head is None:
+            return []
+        return self.search_tree_for_pom_files(repo, head)
+
+    def head_sha(self, repo, default_branch):
+        """
+        :return: the SHA of the head commit of the default branch, or None
+        """
+        sha_url = f"{self.api_url}/repos/{repo}/git/refs/heads/{default_branch}"
         sha = self.send_request(sha_url)
+        if sha.status_code != 200:
+            return None
+        return sha.json()["object"]["sha"]
 
+    def search_tree_for_pom_files(self, repo, sha, prefix=""):
+        """
+        Find the pom.xml files in the tree of a given commit. The tree is
+        scanned while it streams in and only the matching entries are kept.
+        :param repo: the repository in the format 'owner/repository'
+        :param sha: the commit or tree SHA
+        :param prefix: the path of the tree within the repository
+        :return: the pom.xml tree entries, or 0 if the repository uses gradle
+        """
+        tree = self.send_tree_request(repo, sha, recursive=True)
+        if tree is None:
+            return []
         pom_files = []
+        for item in tree["tree"]:
+            if "gradle" in item["path"]:
+                return 0
+            pom_files.append({**item, "path": prefix + item["path"]})
+        if not tree["truncated"]:
+            return pom_files
 
-        if sha.status_code == 200:
-            sha = sha.json()["object"]["sha"]
-
-            # Step 2: Get the tree using the SHA
-            tree_url = (
-                f"https://api.github.com/repos/{repo}/git/trees/{sha}?recursive=1"
+        # GitHub cut the recursive listing short, list this tree on its own and
+        # search each sub-tree separately, recursively where it fits
+        tree = self.send_tree_request(repo, sha, recursive=False)
+        if tree is None:
+            return []
+        pom_files = []
+        for item in tree["tree"]:
+            if "gradle" in item["path"]:
+                return 0
+            if item["type"] != "tree":
+                pom_files.append({**item, "path": prefix + item["path"]})
+                continue
+            sub_tree_files = self.search_tree_for_pom_files(
+                repo, item["sha"], f"{prefix}{item['path']}/"
             )
-            tree_response = self.send_request(tree_url)
-            if tree_response.status_code == 200:
-                tree = tree_response.json()["tree"]
-                for item in tree:
-                    if item["path"].endswith("/pom.xml") or item["path"] == "pom.xml":
-                        pom_files.append(item)
-                    if "gradle" in item["path"]:
-                        return 0
-
+            if type(sub_tree_files) is int:
+                return 0
+            pom_files.extend(sub_tree_files)
         return pom_files
 
-    def download_file(self, url, filename, params=None):
-        path = os.path.join(self.save_path, filename)
-        downloaded_file = self.send_request(url, params=params)
-        try:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-        except FileNotFoundError as e:
-            print(e)
+    def send_tree_request(self, repo, sha, recursive):
+        """
+        :return: the tree filtered down to its pom.xml and gradle entries, and
+        its sub-trees if not recursive, or None if it could not be retrieved
+        """
+        tree_url = f"{self.api_url}/repos/{repo}/git/trees/{sha}"
+        if recursive:
+            tree_url += "?recursive=1"
+        tree_response = self.send_request(
+            tree_url,
+            reduce=lambda response: json.dumps(
+                filter_tree(
+                    response.iter_content(TREE_CHUNK_SIZE), keep_trees=not recursive
+                )
+            ).encode(),
+        )
+        if tree_response.status_code != 200:
+            return None
+        # Responses cached before the scanner existed hold the whole tree
+        return filter_tree([tree_response.content], keep_trees=not recursive)
+
+    def prepare(self, repos):
+        """
+        Called once with all repositories of a crawl before any of them is
+        downloaded, for downloaders that discover repositories in batches.
+        """
+        pass
+
+    def has_blob(self, sha):
+        return self.blob_store is not None and sha in self.blob_store
+
+    def download_file(self, url, filename, params=None, sha=None):
+        if self.has_blob(sha):
+            self.blob_store.link(sha, os.path.join(self.save_path, filename))
             return
+        downloaded_file = self.send_request(url, params=params)
+        self.write_file(filename, downloaded_file.content)
 
-        with open(path, "wb") as f:
-            f.write(downloaded_file.content)
+    def write_file(self, filename, content: bytes):
+        write_file(os.path.join(self.save_path, filename), content, self.blob_store)
 
 
 if __name__ == "__main__":
-    downloaders = [
-        AutomationDownloader("../output/java"),
-        AutomationDownloader("../output/python"),
-    ]
-    with open("../data/rq1_python_repos.txt") as file:
-        repos = [line.strip() for line in file if line.strip()]
-    with open("../data/rq1_java_repos.txt") as file:
-        repos.extend([line.strip() for line in file if line.strip()])
-
-    no_poms = download_files(repos, downloaders)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of repositories crawled at the same time (1 crawls serially)",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Revalidate cached responses with conditional requests",
+    )
+    parser.add_argument(
+        "--discovery",
+        choices=["rest", "graphql", "archive"],
+        default="rest",
+        help="Discover repositories one by one (rest), in batches (graphql) or "
+        "from one tarball per repository (archive)",
+    )
+    parser.add_argument(
+        "--blob-store",
+        default=None,
+        help="Directory of a blob store that deduplicates identical files",
+    )
+    parser.add_argument(
+        "--queue",
+        default=None,
+        help="Persistent crawl queue to resume from; waits out rate limits",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Only download what changed since the last delta crawl and write "
+        "a changes.json manifest per output directory",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=parse_size,
+        default=None,
+        help="Evict the least recently used responses beyond this size, e.g. 2G",
+    )
+    parser.add_argument(
+        "--mirrors",
+        default=None,
+        help="Read the files from local git clones in this directory, as "
+        "owner/repository(.git), instead of the GitHub API",
+    )
+    parser.add_argument(
+        "--clone-missing",
+        action="store_true",
+        help="Make a bare clone in --mirrors of repositories not mirrored yet",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Only estimate the requests the crawl needs from the response cache",
+    )
+    args = parser.parse_args()
+
+    downloader_class = AutomationDownloader
+    downloader_options = dict()
+    if args.delta:
+        from src.python.extractor.DeltaDownloader import (
+            CrawlState, DeltaAutomationDownloader)
+
+        downloader_class = DeltaAutomationDownloader
+        downloader_options["state"] = CrawlState()
+    elif args.discovery == "graphql":
+        from src.python.extractor.GraphQLDownloader import \
+            GraphQLAutomationDownloader
+
+        downloader_class = GraphQLAutomationDownloader
+    elif args.discovery == "archive":
+        from src.python.extractor.ArchiveDownloader import \
+            ArchiveAutomationDownloader
+
+        downloader_class = ArchiveAutomationDownloader
+
+    response_cache = ResponseCache(max_size=args.cache_max_size)
+    token_pool = TokenPool.from_env()
+    blob_store = BlobStore(args.blob_store) if args.blob_store else None
+    downloaders = {
+        language: downloader_class(
+            f"../output/{language}",
+            verbose=args.concurrency == 1,
+            cache=response_cache,
+            refresh=args.refresh,
+            blob_store=blob_store,
+            token_pool=token_pool,
+            **downloader_options,
+        )
+        for language in ["python", "java"]
+    }
+    if args.mirrors:
+        from src.python.extractor.GitMirrorDownloader import \
+            GitMirrorDownloader
+
+        downloaders = {
+            language: GitMirrorDownloader(
+                f"../output/{language}",
+                args.mirrors,
+                verbose=args.concurrency == 1,
+                blob_store=blob_store,
+                clone_missing=args.clone_missing,
+            )
+            for language in ["python", "java"]
+        }
+    # Every repository is only discovered and downloaded for its own language
+    router = LanguageRouter.from_files(
+        downloaders,
+        {
+            "python": "../data/rq1_python_repos.txt",
+            "java": "../data/rq1_java_repos.txt",
+        },
+    )
+    repos = list(router.languages)
+
+    if args.plan:
+        print_plan(
+            CrawlPlanner(response_cache).plan(repos),
+            router.rate_limit_remaining,
+            router.rate_limit_total,
+        )
+        exit(0)
+
+    if args.queue:
+        crawl_queue = CrawlQueue(args.queue)
+        crawl_queue.add(repos)
+        progress = CrawlProgress(len(crawl_queue.pending()))
+        no_poms = download_files_queued(
+            crawl_queue, [router], args.concurrency, progress
+        )
+    elif args.concurrency > 1:
+        no_poms = download_files_concurrently(
+            repos, [router], args.concurrency, CrawlProgress(len(repos))
+        )
+    else:
+        no_poms = download_files(repos, [router], CrawlProgress(len(repos)))
     for repo in set(repos).difference(no_poms):
         print(repo)
+    if args.delta:
+        for downloader in downloaders.values():
+            print(f"Changes written to {downloader.write_manifest()}")
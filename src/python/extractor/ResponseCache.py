@@ -0,0 +1,477 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from requests.structures import CaseInsensitiveDict
+
+# Only the headers the crawlers look at are kept, everything else is dropped
+KEPT_HEADERS = [
+    "content-type",
+    "etag",
+    "last-modified",
+    "link",
+    "retry-after",
+    "x-ratelimit-limit",
+    "x-ratelimit-remaining",
+    "x-ratelimit-reset",
+]
+
+
+DAY = 24 * 60 * 60
+
+# Endpoint of a cached URL and how long its responses stay fresh, None for
+# responses that never change. The first matching pattern wins.
+ENDPOINTS = [
+    ("trees", re.compile(r"/git/trees/[0-9a-f]{40}"), None),
+    # The files extracted from the archive of a commit
+    ("archives", re.compile(r"/tarball/[0-9a-f]{40}"), None),
+    ("refs", re.compile(r"/git/refs/"), DAY),
+    ("commits", re.compile(r"/commits|/stats/"), DAY),
+    ("contents", re.compile(r"/contents/"), 7 * DAY),
+    ("graphql", re.compile(r"/graphql#"), DAY),
+    ("repo", re.compile(r"/repos/[^/]+/[^/?#]+$"), DAY),
+    ("raw", re.compile(r"raw\.githubusercontent\.com/|/raw/"), 7 * DAY),
+]
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def endpoint(url: str):
+    """
+    :return: the endpoint name and TTL in seconds of a URL
+    """
+    for name, pattern, ttl in ENDPOINTS:
+        if pattern.search(url):
+            return name, ttl
+    return "other", None
+
+
+class CachedResponse:
+    """
+    Lightweight stand-in for requests.Response holding only what the crawlers use:
+    the status code, the kept headers and the body.
+    """
+
+    def __init__(self, url, status_code, headers, content, expired=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        # Older than the TTL of its endpoint, it should be revalidated
+        self.expired = expired
+
+    @classmethod
+    def from_response(cls, response, url=None, content=None):
+        headers = {
+            name: response.headers[name]
+            for name in KEPT_HEADERS
+            if name in response.headers
+        }
+        if content is None:
+            content = response.content
+        return cls(url or response.url, response.status_code, headers, content)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    Single-file response cache backed by SQLite. Entries are keyed by the SHA-256
+    of the requested URL, the same key the old per-URL pickle files used, and
+    bodies are stored zlib-compressed. With a max_size the least recently used
+    entries are evicted once the bodies exceed it. Entries older than the TTL
+    of their endpoint are still returned, but marked as expired.
+    """
+
+    def __init__(
+        self,
+        requests_path="../requests",
+        filename="responses.sqlite",
+        max_size=None,
+        ttls=True,
+    ):
+        """
+        :param max_size: maximum size of the compressed bodies in bytes
+        :param ttls: whether entries expire by the TTLs of ENDPOINTS
+        """
+        os.makedirs(requests_path, exist_ok=True)
+        self.path = os.path.join(requests_path, filename)
+        is_new = not os.path.exists(self.path)
+        self.max_size = max_size
+        self.ttls = ttls
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Part of the hits and misses already added to the stats table
+        self.flushed = {"hits": 0, "misses": 0}
+        # Last access of the entries looked up since the last write, kept here
+        # so a lookup never holds a write lock on the cache
+        self.accessed = dict()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, "
+            "body BLOB, stored_at REAL, size INTEGER, last_access REAL)"
+        )
+        columns = [
+            row[1] for row in self.connection.execute("PRAGMA table_info(responses)")
+        ]
+        if "size" not in columns:
+            # Caches from before the size budget
+            self.connection.execute("ALTER TABLE responses ADD COLUMN size INTEGER")
+            self.connection.execute("ALTER TABLE responses ADD COLUMN last_access REAL")
+            self.connection.execute(
+                "UPDATE responses SET size = LENGTH(body), last_access = stored_at"
+            )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access "
+            "ON responses (last_access)"
+        )
+        # Hits and misses over all runs
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)"
+        )
+        self.connection.commit()
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+        if is_new and any(
+            entry.name.endswith(".pkl") for entry in os.scandir(requests_path)
+        ):
+            print(
+                f"Found pickled responses in {requests_path}, import them with: "
+                f"python -m src.python.extractor.ResponseCache migrate {requests_path}"
+            )
+
+    def get(self, url: str):
+        return self.peek(url, count=True)
+
+    def peek(self, url: str, count=False):
+        """
+        :param count: count the lookup as a hit or miss and mark the entry as
+        used, peeking like the crawl planner does is not a real lookup
+        """
+        key = url_key(url)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status, headers, body, stored_at FROM responses "
+                "WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if count and row is None:
+                self.misses += 1
+            elif count:
+                self.hits += 1
+                self.accessed[key] = time.time()
+        if row is None:
+            return None
+        status, headers, body, stored_at = row
+        return CachedResponse(
+            url,
+            status,
+            json.loads(headers),
+            zlib.decompress(body),
+            self.is_expired(url, stored_at),
+        )
+
+    def is_expired(self, url, stored_at, now=None):
+        ttl = endpoint(url)[1] if self.ttls and url else None
+        return ttl is not None and stored_at + ttl < (now or time.time())
+
+    def put(self, url: str, response, content=None) -> CachedResponse:
+        """
+        :param content: body to store instead of the response body, e.g. only
+        the part of a large response that is used
+        """
+        cached = CachedResponse.from_response(response, url, content)
+        self.put_cached(url_key(url), cached)
+        return cached
+
+    def put_cached(self, key: str, cached: CachedResponse, stored_at=None):
+        body = zlib.compress(cached.content)
+        now = time.time()
+        with self.lock:
+            self.write_accessed()
+            previous = self.connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    cached.url,
+                    cached.status_code,
+                    json.dumps(dict(cached.headers)),
+                    body,
+                    stored_at or now,
+                    len(body),
+                    now,
+                ),
+            )
+            self.size += len(body) - ((previous[0] or 0) if previous else 0)
+            if self.max_size is not None and self.size > self.max_size:
+                self.evict(self.max_size)
+            self.connection.commit()
+
+    def touch(self, url: str):
+        """
+        Mark an entry as fresh again, after GitHub answered 304 Not Modified
+        """
+        with self.lock:
+            self.connection.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?",
+                (time.time(), url_key(url)),
+            )
+            self.connection.commit()
+
+    def write_accessed(self):
+        """
+        Write the last access of the entries looked up since the last write,
+        the caller holds the lock and commits
+        """
+        self.connection.executemany(
+            "UPDATE responses SET last_access = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self.accessed.items()],
+        )
+        self.accessed.clear()
+
+    def evict(self, max_size):
+        """
+        Delete the least recently used entries until the bodies fit in max_size,
+        the caller holds the lock
+        :return: the number of deleted entries
+        """
+        # Evict a bit more, so not every put has to evict again
+        target = max_size * 0.9
+        keys = []
+        size = self.size
+        for key, entry_size in self.connection.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ):
+            if size <= target:
+                break
+            keys.append((key,))
+            size -= entry_size or 0
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.size = size
+        return len(keys)
+
+    def expired_entries(self):
+        """
+        :return: the key and size of every expired entry
+        """
+        now = time.time()
+        with self.lock:
+            return [
+                (key, size or 0)
+                for key, url, stored_at, size in self.connection.execute(
+                    "SELECT key, url, stored_at, size FROM responses"
+                )
+                if self.is_expired(url, stored_at, now)
+            ]
+
+    def stats(self):
+        """
+        :return: the entries and compressed size per endpoint, and the hits and
+        misses over all runs
+        """
+        self.flush_stats()
+        endpoints = dict()
+        with self.lock:
+            for url, size in self.connection.execute("SELECT url, size FROM responses"):
+                name = endpoint(url)[0] if url else "unknown"
+                entries, total = endpoints.get(name, (0, 0))
+                endpoints[name] = (entries + 1, total + (size or 0))
+            totals = dict(self.connection.execute("SELECT name, value FROM stats"))
+        return endpoints, totals.get("hits", 0), totals.get("misses", 0)
+
+    def gc(self, max_size=None):
+        """
+        Delete the expired entries, then the least recently used ones until the
+        bodies fit in max_size, and give the space back to the file system
+        :return: the number of deleted entries
+        """
+        expired = self.expired_entries()
+        with self.lock:
+            self.write_accessed()
+            self.connection.executemany(
+                "DELETE FROM responses WHERE key = ?", [(key,) for key, _ in expired]
+            )
+            self.size -= sum(size for _, size in expired)
+            deleted = len(expired)
+            max_size = max_size if max_size is not None else self.max_size
+            if max_size is not None and self.size > max_size:
+                deleted += self.evict(max_size)
+            self.connection.commit()
+            self.connection.execute("VACUUM")
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def flush_stats(self):
+        with self.lock:
+            self.write_accessed()
+            for name, value in [("hits", self.hits), ("misses", self.misses)]:
+                # The counters may have been reset in between, e.g. by a benchmark
+                delta = max(value - self.flushed[name], 0)
+                self.connection.execute(
+                    "INSERT INTO stats VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, delta),
+                )
+                self.flushed[name] = value
+            self.connection.commit()
+
+    def __contains__(self, url):
+        with self.lock:
+            return (
+                self.connection.execute(
+                    "SELECT 1 FROM responses WHERE key = ?", (url_key(url),)
+                ).fetchone()
+                is not None
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[
+                0
+            ]
+
+    def close(self):
+        self.flush_stats()
+        with self.lock:
+            self.connection.close()
+
+
+def parse_size(size: str) -> int:
+    """
+    :param size: a number of bytes, optionally with a K, M or G suffix
+    """
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    size = size.strip().upper().rstrip("B")
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def format_size(size) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def migrate_pickle_cache(requests_path, cache, delete=False):
+    """
+    Import the pickled requests.Response files from requests_path into the cache.
+    Both the SHA-256 filenames and the legacy filenames, where every '/' of the
+    URL was replaced by '*', are supported.
+    :param requests_path: directory with the .pkl files
+    :param cache: the ResponseCache to import into
+    :param delete: remove every .pkl file after it was imported
+    :return: the number of imported responses
+    """
+    imported = 0
+    for entry in os.scandir(requests_path):
+        if not entry.name.endswith(".pkl"):
+            continue
+        name = entry.name[: -len(".pkl")]
+        if len(name) == 64 and all(c in "0123456789abcdef" for c in name):
+            key = name
+            url = None
+        else:
+            url = name.replace("*", "/")
+            key = url_key(url)
+
+        try:
+            with open(entry.path, "rb") as f:
+                response = pickle.load(f)
+        except Exception as e:
+            print(f"Skipping {entry.name}: {e}")
+            continue
+
+        cache.put_cached(key, CachedResponse.from_response(response, url))
+        imported += 1
+        if delete:
+            os.remove(entry.path)
+    return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Import pickled responses into the response cache"
+    )
+    migrate_parser.add_argument("requests_path", nargs="?", default="../requests")
+    migrate_parser.add_argument(
+        "--delete", action="store_true", help="Remove the .pkl files afterwards"
+    )
+    stats_parser = subparsers.add_parser(
+        "stats", help="Report the size, hit rate and reclaimable space"
+    )
+    stats_parser.add_argument("requests_path", nargs="?", default="../requests")
+    stats_parser.add_argument(
+        "--max-size", type=parse_size, default=None, help="Size budget, e.g. 2G"
+    )
+    gc_parser = subparsers.add_parser(
+        "gc", help="Delete expired entries and evict down to the size budget"
+    )
+    gc_parser.add_argument("requests_path", nargs="?", default="../requests")
+    gc_parser.add_argument(
+        "--max-size", type=parse_size, default=None, help="Size budget, e.g. 2G"
+    )
+    args = parser.parse_args()
+
+    response_cache = ResponseCache(args.requests_path)
+    if args.command == "migrate":
+        count = migrate_pickle_cache(args.requests_path, response_cache, args.delete)
+        print(f"Imported {count} responses into {response_cache.path}")
+    elif args.command == "stats":
+        endpoint_stats, hits, misses = response_cache.stats()
+        for name, (entries, size) in sorted(endpoint_stats.items()):
+            print(f"{name:>10}: {entries:8d} entries, {format_size(size):>9}")
+        print(
+            f"Total: {len(response_cache)} entries, "
+            f"{format_size(response_cache.size)} compressed, "
+            f"file {format_size(os.path.getsize(response_cache.path))}"
+        )
+        lookups = hits + misses
+        print(
+            f"Hit rate: {hits / lookups if lookups else 0:.1%} "
+            f"({hits} hits, {misses} misses)"
+        )
+        reclaimable = sum(size for _, size in response_cache.expired_entries())
+        print(f"Reclaimable: {format_size(reclaimable)} expired", end="")
+        if (
+            args.max_size is not None
+            and response_cache.size - reclaimable > args.max_size
+        ):
+            over_budget = response_cache.size - reclaimable - args.max_size * 0.9
+            print(f", {format_size(over_budget)} over the size budget")
+        else:
+            print()
+    elif args.command == "gc":
+        size_before = os.path.getsize(response_cache.path)
+        deleted = response_cache.gc(args.max_size)
+        print(
+            f"Deleted {deleted} entries, reclaimed "
+            f"{format_size(size_before - os.path.getsize(response_cache.path))}"
+        )
+    response_cache.close()
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+from src.python.entities.RateLimitException import RateLimitException
+
+DEFAULT_RATE_LIMIT = 5000
+
+
+class TokenState:
+    def __init__(self, token):
+        self.token = token
+        self.limit = DEFAULT_RATE_LIMIT if token else 60
+        # Unknown until GitHub reports it, assume the full budget until then
+        self.remaining = self.limit
+        self.reset = 0
+        self.known = False
+
+
+class TokenPool:
+    """
+    Pool of GitHub tokens with per-token rate-limit budgeting. Every request is
+    routed to the token with the most remaining budget; a token is only paused
+    once it is exhausted, until its x-ratelimit-reset.
+    """
+
+    def __init__(self, tokens):
+        tokens = [token.strip() for token in tokens if token and token.strip()]
+        # Without tokens requests are sent anonymously
+        self.states = [TokenState(token) for token in tokens] or [TokenState(None)]
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Read tokens from GITHUB_TOKENS (comma-separated), GITHUB_TOKEN_FILE (one
+        token per line) and GITHUB_TOKEN
+        """
+        tokens = os.getenv("GITHUB_TOKENS", "").split(",")
+        token_file = os.getenv("GITHUB_TOKEN_FILE")
+        if token_file:
+            with open(token_file) as file:
+                tokens.extend(line.strip() for line in file)
+        tokens.append(os.getenv("GITHUB_TOKEN"))
+        # Keep the order but drop duplicates
+        return cls(list(dict.fromkeys(token for token in tokens if token)))
+
+    def acquire(self):
+        """
+        Reserve one request on the token with the most remaining budget
+        :return: the token, None for anonymous requests
+        :raises RateLimitException: if every token is exhausted
+        """
+        with self.lock:
+            now = time.time()
+            for state in self.states:
+                if state.remaining <= 0 and state.reset <= now:
+                    state.remaining = state.limit
+            state = max(self.states, key=lambda s: s.remaining)
+            if state.remaining <= 0:
+                raise RateLimitException(
+                    "All tokens are exhausted", min(s.reset for s in self.states)
+                )
+            state.remaining -= 1
+            return state.token
+
+    def update(self, token, headers):
+        with self.lock:
+            state = self.state(token)
+            if "x-ratelimit-limit" in headers:
+                state.limit = int(headers["x-ratelimit-limit"])
+            if "x-ratelimit-remaining" in headers:
+                state.remaining = int(headers["x-ratelimit-remaining"])
+                state.known = True
+            if "x-ratelimit-reset" in headers:
+                state.reset = int(headers["x-ratelimit-reset"])
+
+    def exhaust(self, token, reset=None):
+        with self.lock:
+            state = self.state(token)
+            state.remaining = 0
+            state.known = True
+            state.reset = reset or time.time() + 60
+
+    def state(self, token):
+        return next(state for state in self.states if state.token == token)
+
+    def has_budget(self):
+        with self.lock:
+            now = time.time()
+            return any(s.remaining > 0 or s.reset <= now for s in self.states)
+
+    def remaining(self):
+        with self.lock:
+            if not any(state.known for state in self.states):
+                return "unknown"
+            return sum(max(state.remaining, 0) for state in self.states)
+
+    def limit(self):
+        with self.lock:
+            return sum(state.limit for state in self.states)
+
+    @staticmethod
+    def headers(token):
+        return {"Authorization": f"token {token}"} if token else {}
+
+    def __len__(self):
+        return len(self.states)
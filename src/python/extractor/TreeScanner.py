@@ -0,0 +1,125 @@
+import codecs
+import json
+
+# Bytes read from the network at a time while scanning a tree
+TREE_CHUNK_SIZE = 64 * 1024
+
+
+class StreamingTree:
+    """
+    Incremental parser for a git/trees response. The entries of the "tree"
+    array are decoded one at a time while the body streams in, so only the
+    entry at hand and the unread part of the current chunk are in memory.
+    The other keys are available once entries() is exhausted.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.sha = None
+        self.truncated = False
+
+    def entries(self):
+        self.expect("{")
+        while True:
+            char = self.peek()
+            if char == "}":
+                self.position += 1
+                return
+            if char == ",":
+                self.position += 1
+                continue
+            key = self.decode()
+            self.expect(":")
+            if key != "tree":
+                value = self.decode()
+                if key == "sha":
+                    self.sha = value
+                elif key == "truncated":
+                    self.truncated = value
+                continue
+
+            self.expect("[")
+            while True:
+                char = self.peek()
+                if char == "]":
+                    self.position += 1
+                    break
+                if char == ",":
+                    self.position += 1
+                    continue
+                yield self.decode()
+
+    def fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buffer = self.buffer[self.position :] + self.utf8.decode(b"", True)
+        else:
+            if isinstance(chunk, bytes):
+                chunk = self.utf8.decode(chunk)
+            self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+
+    def peek(self):
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in " \t\r\n"
+            ):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError("Unexpected end of the tree")
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(
+                f"Expected {char!r} at {self.buffer[self.position:][:20]!r}"
+            )
+        self.position += 1
+
+    def decode(self):
+        while True:
+            # raw_decode does not skip leading whitespace
+            self.peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number or literal at the end of the buffer may continue in
+                # the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def is_pom_file(path):
+    return path.endswith("/pom.xml") or path == "pom.xml"
+
+
+def filter_tree(chunks, keep_trees=False):
+    """
+    Scan a tree and keep only the entries the downloaders look at
+    :param chunks: the body of a git/trees response, in pieces
+    :param keep_trees: also keep the sub-tree entries, for non-recursive trees
+    :return: the tree with only the pom.xml entries, or only the first entry
+    with gradle in its path
+    """
+    tree = StreamingTree(chunks)
+    entries = []
+    for entry in tree.entries():
+        if "gradle" in entry["path"]:
+            # Nothing else matters once a repository uses gradle
+            return {"sha": tree.sha, "tree": [entry], "truncated": False}
+        if is_pom_file(entry["path"]) or (keep_trees and entry["type"] == "tree"):
+            entries.append(entry)
+    return {"sha": tree.sha, "tree": entries, "truncated": tree.truncated}
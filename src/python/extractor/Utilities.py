@@ -1,15 +1,25 @@
+import asyncio
+import hashlib
+import json
 import os
 import re
-from collections import Counter, defaultdict
+import signal
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 
 import bashlex
-import yaml
 from bashlex.errors import ParsingError
 
-from src.python.entities.Action import Run, flatten
+from src.python.entities.Action import Run
 from src.python.entities.Automation import Level
 from src.python.entities.RateLimitException import RateLimitException
+from src.python.extractor.CrawlQueue import JobState
+from src.python.extractor.WorkflowLoader import (COMMIT_EVERY, InvalidWorkflow,
+                                                 workflow_loader)
 
 mvn_dict = dict()
 mvn_dict["mvn test"] = {"mvn compile"}
@@ -19,6 +29,114 @@ mvn_dict["mvn verify"] = {"mvn compile", "mvn test"}
 mvn_dict["mvn install"] = {"mvn compile", "mvn test"}
 mvn_dict["mvn deploy"] = {"mvn compile", "mvn test"}
 
+# Prefixes clean_command drops from a command
+CLEANED_PREFIXES = ["sudo ", "xargs ", "call ", "until "]
+# Commands split into a prefix and the command it runs, up to a number of tokens
+SPECIAL_CASES = [("poetry run", None)]
+MAVEN_COMMANDS = ["mvn", "./mvnw", "./build/mvn"]
+# Commands whose first word is one of these are not automations
+DENIED_COMMANDS = [
+    "cd",
+    "echo",
+    "ls",
+    "mkdir",
+    "rm",
+    "chmod",
+    "grep",
+    "rm",
+    "touch",
+    "[",
+    "[[",
+    "elif",
+    "sleep",
+    "printf",
+    "(echo",
+    ">&2 echo",
+    "${{",
+    "if",
+    "mv",
+    "cat",
+    "tr",
+    "for",
+    "true",
+    '"${{',
+    "exit",
+    "head",
+    "cut",
+    "tail",
+    "wc",
+    "which",
+    "-",
+    "unset",
+    "pwd",
+    "then",
+    "EOF",
+    "while",
+    "case",
+    "for",
+    "import",
+    ")",
+    "sed",
+    "cp",
+    "tee",
+    "find",
+]
+FORBIDDEN_COMMANDS = ["", "fi", "else", "done", "do", "}", "{"]
+# Compiled once for the lookups per command
+SPECIAL_CASE_TOKENS = [
+    (prefix, prefix.split(), number) for prefix, number in SPECIAL_CASES
+]
+MAVEN_PREFIXES = tuple(MAVEN_COMMANDS)
+DENIED_HEADS = frozenset(DENIED_COMMANDS)
+FORBIDDEN_SET = frozenset(FORBIDDEN_COMMANDS)
+# How often split_run takes every way to split a run block
+split_paths = Counter()
+# Run blocks longer than this are split with the regular expression, bashlex can
+# take very long on large scripts
+MAX_BASHLEX_SIZE = 20000
+# Seconds bashlex may take for one run block
+BASHLEX_TIMEOUT = 2.0
+# Lines of plain words, which bashlex splits into one command as they are
+SIMPLE_LINE = re.compile(r"[A-Za-z0-9_\-./:@%+,= \t]*")
+RESERVED_WORDS = frozenset(
+    [
+        "if",
+        "then",
+        "else",
+        "elif",
+        "fi",
+        "for",
+        "while",
+        "until",
+        "do",
+        "done",
+        "case",
+        "esac",
+        "in",
+        "function",
+        "select",
+        "time",
+        "coproc",
+    ]
+)
+# Bumped when process_commands itself changes, the rules above are hashed
+NORMALIZATION_VERSION = 2
+RULES_VERSION = hashlib.sha1(
+    repr(
+        (
+            NORMALIZATION_VERSION,
+            sorted((command, sorted(implied)) for command, implied in mvn_dict.items()),
+            CLEANED_PREFIXES,
+            SPECIAL_CASES,
+            MAVEN_COMMANDS,
+            DENIED_COMMANDS,
+            FORBIDDEN_COMMANDS,
+            MAX_BASHLEX_SIZE,
+            BASHLEX_TIMEOUT,
+        )
+    ).encode()
+).hexdigest()[:16]
+
 
 def print_debug_file(jobs_dict, save_path):
     with open(os.path.join(save_path, "debug.txt"), "w", encoding="utf-8") as f:
@@ -59,11 +177,13 @@ def print_dep_plugs_analysis(dep_dict, number_of_poms):
         print(f"{dep} [{len(repos)}/{number_of_poms}]")
 
 
-def download_files(repos, downloaders):
+def download_files(repos, downloaders, progress=None):
     pom_files = workflows = 0
     total_pom_files = total_workflows = 0
     no_automation_repos = set()
     no_poms = set()
+    for downloader in downloaders:
+        downloader.prepare(repos)
     # Run the download function
     for repo in repos:
         try:
@@ -82,8 +202,10 @@ def download_files(repos, downloaders):
 
         total_workflows += workflows
         total_pom_files += pom_files
+        if progress is not None:
+            progress.update(downloaders)
     print(
-        f"\nNumber of requests: {downloader.num_requests}, remaining rate limit: {downloader.rate_limit_remaining}/{downloader.rate_limit_total}."
+        f"\nNumber of requests: {downloader.num_requests} ({downloader.num_not_modified} not modified), remaining rate limit: {downloader.rate_limit_remaining}/{downloader.rate_limit_total}."
     )
     print(
         f"\nTotal repositories: {len(repos)}, total pom files {total_pom_files}, total workflows {total_workflows}"
@@ -91,6 +213,173 @@ def download_files(repos, downloaders):
     return no_poms
 
 
+def download_files_concurrently(repos, downloaders, concurrency=16, progress=None):
+    """
+    Asynchronous variant of download_files that keeps up to `concurrency`
+    repositories in flight at once. Every repository is still handled by the
+    blocking downloaders, so the per-URL cache and the layout under save_path
+    are exactly the same as with download_files.
+    :param repos: repositories in the format 'owner/repository'
+    :param downloaders: the downloaders every repository is passed to
+    :param concurrency: maximum number of repositories crawled at the same time
+    :param progress: a CrawlProgress updated after every repository
+    :return: the repositories without pom files
+    """
+    return asyncio.run(_crawl_concurrently(repos, downloaders, concurrency, progress))
+
+
+async def _crawl_concurrently(repos, downloaders, concurrency, progress):
+    totals = {"pom_files": 0, "workflows": 0}
+    no_poms = set()
+    queue = asyncio.Queue()
+    rate_limited = asyncio.Event()
+    for repo in repos:
+        queue.put_nowait(repo.strip())
+    for downloader in downloaders:
+        downloader.prepare(repos)
+
+    def download_repo(repo):
+        pom_files = workflows = 0
+        for downloader in downloaders:
+            pom_files, workflows = downloader.download_files(repo)
+            if pom_files == 0:
+                no_poms.add(repo)
+        return pom_files, workflows
+
+    async def worker():
+        while not queue.empty() and not rate_limited.is_set():
+            repo = queue.get_nowait()
+            try:
+                pom_files, workflows = await loop.run_in_executor(
+                    executor, download_repo, repo
+                )
+            except RateLimitException as e:
+                # Stop handing out new repositories, the ones in flight finish
+                print(e)
+                rate_limited.set()
+                return
+
+            print(f"Downloaded {repo}, poms: {pom_files}, workflows: {workflows}")
+            totals["pom_files"] += pom_files
+            totals["workflows"] += workflows
+            if progress is not None:
+                progress.update(downloaders)
+
+    # The default executor of asyncio.to_thread has at most 32 threads, and
+    # fewer on small machines, so the workers get their own
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    finally:
+        executor.shutdown(wait=True)
+
+    num_requests = sum(downloader.num_requests for downloader in downloaders)
+    num_not_modified = sum(downloader.num_not_modified for downloader in downloaders)
+    print(
+        f"\nNumber of requests: {num_requests} ({num_not_modified} not modified), remaining rate limit: {downloaders[-1].rate_limit_remaining}/{downloaders[-1].rate_limit_total}."
+    )
+    print(
+        f"\nTotal repositories: {len(repos)}, total pom files {totals['pom_files']}, total workflows {totals['workflows']}"
+    )
+    return no_poms
+
+
+def download_files_queued(crawl_queue, downloaders, concurrency=1, progress=None):
+    """
+    Crawl every pending repository of a persistent CrawlQueue. Unlike
+    download_files, hitting the rate limit does not end the crawl: the crawler
+    sleeps until the limit resets and continues, and a killed crawl resumes
+    with the repositories that were not finished yet.
+    :param crawl_queue: the CrawlQueue holding the repositories and their state
+    :param downloaders: the downloaders every repository is passed to
+    :param concurrency: maximum number of repositories crawled at the same time
+    :param progress: a CrawlProgress updated after every repository
+    :return: the repositories without pom files, over all runs
+    """
+    return asyncio.run(_crawl_queue(crawl_queue, downloaders, concurrency, progress))
+
+
+async def _crawl_queue(crawl_queue, downloaders, concurrency, progress):
+    repos = crawl_queue.pending()
+    queue = asyncio.Queue()
+    for repo in repos:
+        queue.put_nowait(repo)
+    for downloader in downloaders:
+        downloader.prepare(repos)
+        downloader.on_discovered = lambda repo: crawl_queue.mark(
+            repo, JobState.DISCOVERED
+        )
+
+    def download_repo(repo):
+        pom_files = workflows = 0
+        no_pom = False
+        for downloader in downloaders:
+            pom_files, workflows = downloader.download_files(repo)
+            no_pom = no_pom or pom_files == 0
+        return pom_files, workflows, no_pom
+
+    async def worker():
+        while not queue.empty():
+            repo = queue.get_nowait()
+            attempts = 0
+            while True:
+                try:
+                    pom_files, workflows, no_pom = await loop.run_in_executor(
+                        executor, download_repo, repo
+                    )
+                except RateLimitException as e:
+                    attempts += 1
+                    if attempts >= 5:
+                        # A rate limit that keeps coming back for one repository
+                        # is most likely access denied to it, not a rate limit
+                        print(f"Failed {repo}: {e}")
+                        crawl_queue.mark(repo, JobState.FAILED, error=str(e))
+                        break
+                    wait = 60 if e.reset is None else max(e.reset - time.time(), 0) + 1
+                    print(f"{e}, waiting {wait:.0f}s for the rate limit to reset")
+                    await asyncio.sleep(wait)
+                    continue
+                except Exception as e:
+                    print(f"Failed {repo}: {e!r}")
+                    crawl_queue.mark(repo, JobState.FAILED, error=repr(e))
+                    break
+
+                print(f"Downloaded {repo}, poms: {pom_files}, workflows: {workflows}")
+                crawl_queue.mark(
+                    repo,
+                    JobState.NO_POM if no_pom else JobState.DOWNLOADED,
+                    pom_files,
+                    workflows,
+                )
+                break
+            if progress is not None:
+                progress.update(downloaders)
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    finally:
+        executor.shutdown(wait=True)
+
+    num_requests = sum(downloader.num_requests for downloader in downloaders)
+    num_not_modified = sum(downloader.num_not_modified for downloader in downloaders)
+    total_repos, total_pom_files, total_workflows = crawl_queue.totals()
+    print(
+        f"\nNumber of requests: {num_requests} ({num_not_modified} not modified), remaining rate limit: {downloaders[-1].rate_limit_remaining}/{downloaders[-1].rate_limit_total}."
+    )
+    print(
+        f"\nTotal repositories: {total_repos}, total pom files {total_pom_files}, total workflows {total_workflows}"
+    )
+    print(
+        ", ".join(
+            f"{state.value}: {count}" for state, count in crawl_queue.counts().items()
+        )
+    )
+    return crawl_queue.repos_in_state(JobState.NO_POM)
+
+
 class AutomationClustering:
     def __init__(self):
         self.automations_clustered = defaultdict(list)
@@ -143,44 +432,45 @@ def extract_logical_commands(node, result=None):
     return result
 
 
-def clean_command(command: str) -> str:
-    for prefix in ["sudo ", "xargs ", "call ", "until "]:
+def clean_tokens(command: str):
+    for prefix in CLEANED_PREFIXES:
         if command.startswith(prefix):
             command = command[len(prefix) :]
 
     if command.endswith(";"):
         command = command[:-1]
 
-    cleaned_tokens = []
+    return [
+        token
+        for token in command.split()
+        if "-DskipTests" in token or not (token[0] in "-$" or "=" in token)
+    ]
 
-    for token in command.split():
-        if "-DskipTests" in token or not (
-            token.startswith("-") or token.startswith("$") or "=" in token
-        ):
-            cleaned_tokens.append(token)
 
-    return " ".join(cleaned_tokens)
+def clean_command(command: str) -> str:
+    return " ".join(clean_tokens(command))
 
 
-def split_special_cases(cmd):
-    special_cases = [("poetry run", None)]
-    for prefix, number in special_cases:
-        len_tokens = len(prefix.split())
-        if cmd.split()[:len_tokens] == prefix.split():
+def split_tokens(tokens, cmd=None):
+    """
+    split_special_cases of a command that is already tokenized
+    :param cmd: the command, if it is not the tokens joined by spaces
+    """
+    for prefix, prefix_tokens, number in SPECIAL_CASE_TOKENS:
+        if tokens[: len(prefix_tokens)] == prefix_tokens:
             if number:
-                return [prefix, clean_command(cmd.split()[len_tokens:number])]
+                return [prefix, clean_command(tokens[len(prefix_tokens) : number])]
             else:
-                return [prefix, clean_command(flatten(cmd.split()[len_tokens:]))]
-    if (
-        cmd.startswith("mvn")
-        or cmd.startswith("./mvnw")
-        or cmd.startswith("./build/mvn")
-    ):
+                return [prefix, clean_command(" ".join(tokens[len(prefix_tokens) :]))]
+    if cmd is None:
+        cmd = " ".join(tokens)
+    if cmd.startswith(MAVEN_PREFIXES):
         no_tests = False
         if "-DskipTests" in cmd:
             no_tests = True
             cmd = cmd.replace("-DskipTests", "")
-        mvn_cmds = ["mvn " + x for x in cmd.split()[1:]]
+            tokens = cmd.split()
+        mvn_cmds = ["mvn " + x for x in tokens[1:]]
         aggregated_cmds = set()
         for mvn_cmd in mvn_cmds:
             aggregated_cmds.add(mvn_cmd)
@@ -192,96 +482,273 @@ def split_special_cases(cmd):
     return [cmd]
 
 
-def process_commands(run):
-    try:
-        no_comments = "\n".join(
-            line for line in run.splitlines() if not line.strip().startswith("#")
-        )
-        if no_comments == "":
-            return []
-        cmds = [
+def split_special_cases(cmd):
+    return split_tokens(cmd.split(), cmd)
+
+
+def normalize_command(command):
+    """
+    Clean a command and split it into the commands it stands for, without the
+    ones that are not automations
+    """
+    normalized = []
+    for split_command in split_tokens(clean_tokens(command)):
+        if not (
+            len(split_command) == 0
+            or split_command.startswith("#")
+            or split_command.split(maxsplit=1)[0] in DENIED_HEADS
+            or split_command in FORBIDDEN_SET
+        ):
+            normalized.append(split_command)
+    return normalized
+
+
+class BashlexTimeout(Exception):
+    pass
+
+
+def simple_commands(script):
+    """
+    Split a script of simple commands, one per line of plain words, without
+    bashlex, which gives the same commands for them
+    :return: the commands, or None if the script needs bashlex
+    """
+    commands = []
+    for line in script.splitlines():
+        if not SIMPLE_LINE.fullmatch(line):
+            return None
+        words = line.split()
+        if words:
+            if words[0] in RESERVED_WORDS:
+                return None
+            commands.append(" ".join(words))
+    return commands
+
+
+def bashlex_commands(script):
+    """
+    Split a script with bashlex, within BASHLEX_TIMEOUT seconds if it runs on
+    the main thread where a timer signal can interrupt it
+    :raises BashlexTimeout: if bashlex takes longer
+    """
+    if not (
+        BASHLEX_TIMEOUT
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    ):
+        return [
             cmd
-            for parsed in bashlex.parse(no_comments)
+            for parsed in bashlex.parse(script)
             for cmd in extract_logical_commands(parsed)
         ]
-    except (NotImplementedError, ParsingError, AssertionError, TypeError):
-        cmds = re.split(r"(?<!\\)(?:\s*&&\s*|\s*\|\s*|\n)", run.strip())
-        cmds = [
-            re.sub(r"\\\s*", "", cmd.strip()) for cmd in cmds if len(cmd.strip()) > 0
+
+    def on_alarm(signum, frame):
+        raise BashlexTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, BASHLEX_TIMEOUT)
+    try:
+        return [
+            cmd
+            for parsed in bashlex.parse(script)
+            for cmd in extract_logical_commands(parsed)
         ]
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
-    filtered_run = []
-
-    for command in cmds:
-        for split_command in split_special_cases(clean_command(command)):
-            if not (
-                len(split_command) == 0
-                or split_command.startswith("#")
-                or any(
-                    split_command.strip().split()[0] == prefix
-                    for prefix in [
-                        "cd",
-                        "echo",
-                        "ls",
-                        "mkdir",
-                        "rm",
-                        "chmod",
-                        "grep",
-                        "rm",
-                        "touch",
-                        "[",
-                        "[[",
-                        "elif",
-                        "sleep",
-                        "printf",
-                        "(echo",
-                        ">&2 echo",
-                        "${{",
-                        "if",
-                        "mv",
-                        "cat",
-                        "tr",
-                        "for",
-                        "true",
-                        '"${{',
-                        "exit",
-                        "head",
-                        "cut",
-                        "tail",
-                        "wc",
-                        "which",
-                        "-",
-                        "unset",
-                        "pwd",
-                        "then",
-                        "EOF",
-                        "while",
-                        "case",
-                        "for",
-                        "import",
-                        ")",
-                        "sed",
-                        "cp",
-                        "tee",
-                        "find",
-                    ]
+
+def split_run(run):
+    """
+    Split a run block into its logical commands: simple commands directly,
+    other scripts with bashlex, and scripts bashlex cannot parse, is too slow on
+    or that are too large with a regular expression. split_paths counts how
+    often every way is taken.
+    """
+    no_comments = "\n".join(
+        line for line in run.splitlines() if not line.strip().startswith("#")
+    )
+    if no_comments == "":
+        split_paths["empty"] += 1
+        return []
+    commands = simple_commands(no_comments)
+    if commands is not None:
+        split_paths["simple"] += 1
+        return commands
+
+    if len(no_comments) > MAX_BASHLEX_SIZE:
+        split_paths["oversized"] += 1
+    else:
+        try:
+            commands = bashlex_commands(no_comments)
+            split_paths["bashlex"] += 1
+            return commands
+        except BashlexTimeout:
+            split_paths["timeout"] += 1
+        except (NotImplementedError, ParsingError, AssertionError, TypeError):
+            split_paths["fallback"] += 1
+
+    cmds = re.split(r"(?<!\\)(?:\s*&&\s*|\s*\|\s*|\n)", run.strip())
+    return [re.sub(r"\\\s*", "", cmd.strip()) for cmd in cmds if len(cmd.strip()) > 0]
+
+
+def format_split_paths(paths=None):
+    paths = split_paths if paths is None else paths
+    total = max(sum(paths.values()), 1)
+    return "Run blocks split: " + ", ".join(
+        f"{path} {paths[path]} ({paths[path] / total:.0%})"
+        for path in ["simple", "bashlex", "fallback", "oversized", "timeout", "empty"]
+    )
+
+
+def parse_commands(run):
+    """
+    Split a run block into its commands and normalize them, uncached
+    """
+    return [
+        normalized
+        for command in split_run(run)
+        for normalized in normalize_command(command)
+    ]
+
+
+class CommandCache:
+    """
+    Memoizes parse_commands by the content of the run block, since the same
+    blocks recur in thousands of repositories. Recently used results are kept
+    in memory, with a cache_path also in SQLite, shared between runs and the
+    worker processes of the analysis. Entries of other rules versions are
+    dropped when the cache is opened.
+    """
+
+    def __init__(
+        self, cache_path=None, max_size=65536, version=RULES_VERSION, read_only=False
+    ):
+        """
+        :param read_only: keep new results in new_entries instead of writing
+        them, for worker processes whose parent writes them with save
+        """
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.version = version
+        self.read_only = read_only
+        self.new_entries = dict()
+        self.commands = OrderedDict()
+        self.lock = threading.Lock()
+        self.connection = None
+        self.uncommitted = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(
+                cache_path, timeout=60, check_same_thread=False
+            )
+            if not read_only:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS commands (version TEXT, key TEXT, "
+                    "commands TEXT, PRIMARY KEY (version, key))"
                 )
-                or any(
-                    forbidden_cmd == split_command
-                    for forbidden_cmd in ["", "fi", "else", "done", "do", "}", "{"]
+                self.connection.execute(
+                    "DELETE FROM commands WHERE version != ?", (version,)
                 )
-            ):
-                filtered_run.append(split_command)
-    return filtered_run
+                self.connection.commit()
+
+    def process(self, run):
+        """
+        :return: a copy of the commands parse_commands returns for the run block
+        """
+        key = hashlib.sha1(run.encode("utf-8", errors="surrogatepass")).hexdigest()
+        with self.lock:
+            if key in self.commands:
+                self.hits += 1
+                self.commands.move_to_end(key)
+                return list(self.commands[key])
+            row = None
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT commands FROM commands WHERE version = ? AND key = ?",
+                    (self.version, key),
+                ).fetchone()
+
+        if row is not None:
+            commands = json.loads(row[0])
+            with self.lock:
+                self.disk_hits += 1
+        else:
+            commands = parse_commands(run)
+            with self.lock:
+                self.misses += 1
+                if self.connection is not None and self.read_only:
+                    self.new_entries[key] = json.dumps(commands)
+            if self.connection is not None and not self.read_only:
+                self.save({key: json.dumps(commands)})
+
+        with self.lock:
+            self.commands[key] = commands
+            if len(self.commands) > self.max_size:
+                self.commands.popitem(last=False)
+        return list(commands)
+
+    def save(self, entries):
+        """
+        Write results to the cache, e.g. the new_entries of the read-only
+        caches of worker processes
+        :param entries: the JSON encoded commands by run block hash
+        """
+        with self.lock:
+            if self.connection is None:
+                return
+            for key, commands in entries.items():
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO commands VALUES (?, ?, ?)",
+                    (self.version, key, commands),
+                )
+                self.uncommitted += 1
+                if self.uncommitted >= COMMIT_EVERY:
+                    self.connection.commit()
+                    self.uncommitted = 0
+
+    def stats(self):
+        total = max(self.hits + self.disk_hits + self.misses, 1)
+        return (
+            f"Command cache: {self.hits} hits, {self.disk_hits} disk hits, "
+            f"{self.misses} misses, "
+            f"hit rate {(self.hits + self.disk_hits) / total:.0%}"
+        )
+
+    def commit(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+# Shared by the analyses that do not pass a cache of their own
+command_cache = CommandCache()
+
+
+def process_commands(run):
+    return command_cache.process(run)
 
 
 def create_jobs_dict(file_path):
-    with open(file_path, "r", encoding="utf-8") as workflow_file:
-        workflow = yaml.safe_load(workflow_file)
+    workflow = workflow_loader.load_file(file_path)
+    if workflow is InvalidWorkflow:
+        raise ValueError(f"Invalid workflow {file_path}")
 
     jobs = {}
 
-    for job_name, job in workflow.get("jobs", {}).items():
+    for job_name in workflow.jobs if workflow is not None else []:
         jobs[job_name] = defaultdict(int)
     return jobs
 
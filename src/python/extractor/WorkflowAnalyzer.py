@@ -1,23 +1,49 @@
+import argparse
 import os
 import pickle
-from collections import defaultdict
-
-import yaml
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 from src.python.entities.Action import Empty, Invalid, Metadata, Run, Uses
-from src.python.extractor.Utilities import (AutomationClustering,
-                                            print_analysis, process_commands)
+from src.python.extractor.Corpus import read_corpus
+from src.python.extractor.DeltaDownloader import changed_repos
+from src.python.extractor.Utilities import (AutomationClustering, CommandCache,
+                                            format_split_paths, print_analysis,
+                                            split_paths)
+from src.python.extractor.WorkflowLoader import InvalidWorkflow, WorkflowLoader
+
+# Shards per worker process in analyze_all_files
+SHARDS_PER_PROCESS = 4
+
+
+def workflow_id(file_path):
+    """
+    :param file_path: the path of a workflow file on disk or in a corpus, with
+    / or \\ separators
+    :return: the id of the workflow in its metadata, the name of the file
+    """
+    return file_path.replace("\\", "/").rsplit("/", 1)[-1]
 
 
 class AutomationExtractor:
 
-    def __init__(self, save_path):
+    def __init__(self, save_path, workflow_loader=None, command_cache=None):
+        """
+        :param workflow_loader: a WorkflowLoader, e.g. with a persistent cache
+        :param command_cache: a CommandCache, e.g. with a persistent cache
+        """
         self.save_path = save_path
         self.automations_dict = defaultdict(dict)
         self.maven_dependencies_dict = defaultdict(list)
         self.maven_plugins_dict = defaultdict(list)
         self.exceptions = 0
         self.repos_dict = defaultdict(list)
+        self.workflow_loader = (
+            workflow_loader if workflow_loader is not None else WorkflowLoader()
+        )
+        self.command_cache = (
+            command_cache if command_cache is not None else CommandCache()
+        )
 
     def add_automation(self, automation, repo, metadata):
         if repo not in self.automations_dict[automation]:
@@ -28,11 +54,28 @@ class AutomationExtractor:
         self.automations_dict[automation][repo].append(metadata)
 
     def analyze_workflow(self, repo, file_path):
-        file_name = file_path.split("\\")[-1]
+        file_name = workflow_id(file_path)
+
+        try:
+            with open(file_path, "rb") as workflow_file:
+                content = workflow_file.read()
+        except Exception:
+            self.automations_dict[Invalid][repo] = list()
+            self.automations_dict[Invalid][repo].append(None)
+            self.exceptions += 1
+            return
+        self.analyze_workflow_content(repo, file_name, content)
 
+    def analyze_workflow_content(self, repo, file_name, content):
+        """
+        Analyze a workflow that is already read, e.g. from a corpus archive
+        :param file_name: the name of the workflow file, kept in the metadata
+        :param content: the file as bytes or text
+        """
         try:
-            with open(file_path, "r", encoding="utf-8") as workflow_file:
-                workflow = yaml.safe_load(workflow_file)
+            workflow = self.workflow_loader.load(content)
+            if workflow is InvalidWorkflow:
+                raise ValueError(f"Invalid workflow {file_name}")
         except Exception:
             self.automations_dict[Invalid][repo] = list()
             self.automations_dict[Invalid][repo].append(None)
@@ -41,40 +84,39 @@ class AutomationExtractor:
 
         if workflow is None:
             return
-        for job_id, job in workflow.get("jobs", {}).items():
-            steps = job.get("steps", [])
-            if len(steps) > 0:
-                job_name = job.get("name", None)
-                for step in steps:
-                    metadata = Metadata(
-                        job_id,
-                        job_name,
-                        step.get("name", None),
-                        file_name,
-                        workflow.get("name", None),
-                    )
+        for job_id, job_name, step_name, run, uses, shell in workflow.steps:
+            metadata = Metadata(job_id, job_name, step_name, file_name, workflow.name)
 
-                    if step.get("run") and step.get("shell", None) != "python":
-                        if type(step["run"]) is bool:
-                            continue
-                        cmds = process_commands(step["run"])
-                        automations = [Run(cmd) for cmd in cmds]
-                        if len(automations) == 0:
-                            automations = [Empty()]
-                        for automation in automations:
-                            self.add_automation(automation, repo, metadata)
-                    elif step.get("uses"):
-                        automation = Uses(step["uses"])
-                        self.add_automation(automation, repo, metadata)
-                    else:
-                        self.add_automation(Empty(), repo, metadata)
+            if run and shell != "python":
+                if type(run) is bool:
+                    continue
+                cmds = self.command_cache.process(run)
+                automations = [Run(cmd) for cmd in cmds]
+                if len(automations) == 0:
+                    automations = [Empty()]
+                for automation in automations:
+                    self.add_automation(automation, repo, metadata)
+            elif uses:
+                automation = Uses(uses)
+                self.add_automation(automation, repo, metadata)
+            else:
+                self.add_automation(Empty(), repo, metadata)
 
     def analyze_all_files(
         self,
         python_dir="../data/rq1_python_repos.txt",
         java_dir="../data/rq1_java_repos.txt",
         specify_language=False,
+        only_repos=None,
+        processes=1,
     ):
+        """
+        :param only_repos: analyze only these repositories, e.g. the changed ones
+        of a delta crawl
+        :param processes: analyze shards of the repositories in this many worker
+        processes, the results are the same as of a serial run
+        :return: the number of repositories listed
+        """
         repos = []
         if python_dir:
             repos.extend(
@@ -95,31 +137,202 @@ class AutomationExtractor:
                 )
             )
 
+        repo_paths = []
         for repo, language in repos:
+            if only_repos is not None and repo.strip() not in only_repos:
+                continue
             if specify_language:
                 path = os.path.join(self.save_path, language, repo.strip())
             else:
                 path = os.path.join(self.save_path, repo.strip())
+            repo_paths.append((repo.strip(), path))
 
-            for file in os.listdir(path):
-                file_path = os.path.normpath(os.path.join(path, file))
-                if os.path.isdir(file_path) or file_path.endswith("pom.xml"):
-                    continue
+        if processes > 1 and len(repo_paths) > 1:
+            # Contiguous shards merged in order give the order of a serial run,
+            # several per process so a slow shard does not hold up the rest
+            num_shards = min(processes * SHARDS_PER_PROCESS, len(repo_paths))
+            bounds = [i * len(repo_paths) // num_shards for i in range(num_shards + 1)]
+            shards = [repo_paths[start:end] for start, end in zip(bounds, bounds[1:])]
+            # The workers read the persistent caches, if any, and only this
+            # process writes what they add to them
+            self.workflow_loader.commit()
+            self.command_cache.commit()
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                for *partial, new_workflows, new_commands in executor.map(
+                    analyze_shard,
+                    [self.save_path] * num_shards,
+                    shards,
+                    [self.workflow_loader.cache_path] * num_shards,
+                    [self.command_cache.cache_path] * num_shards,
+                ):
+                    self.merge(*partial)
+                    self.workflow_loader.save(new_workflows)
+                    self.command_cache.save(new_commands)
+        else:
+            for repo, path in repo_paths:
+                self.analyze_repo(repo, path)
+
+        print(self.automations_dict[Invalid])
+        return len(repos)
+
+    def analyze_repo(self, repo, path):
+        for file in os.listdir(path):
+            file_path = os.path.normpath(os.path.join(path, file))
+            if os.path.isdir(file_path) or file_path.endswith("pom.xml"):
+                continue
+            else:
+                self.analyze_workflow(repo, file_path)
+
+    def merge(
+        self, automations_dict, repos_dict, exceptions, paths=None, cache_counts=None
+    ):
+        """
+        Add the results of another extractor, e.g. of a shard analyzed in a
+        worker process
+        :param paths: the split_paths counts of the worker
+        :param cache_counts: the hits, disk hits and misses of its command cache
+        """
+        for automation, repos in automations_dict.items():
+            for repo, metadata in repos.items():
+                if automation is Invalid:
+                    # Like analyze_workflow, an invalid file replaces the entry
+                    self.automations_dict[Invalid][repo] = list(metadata)
                 else:
-                    self.analyze_workflow(repo.strip(), file_path)
+                    self.automations_dict[automation].setdefault(repo, list()).extend(
+                        metadata
+                    )
+        for repo, automations in repos_dict.items():
+            self.repos_dict[repo].extend(automations)
+        self.exceptions += exceptions
+        if paths is not None:
+            split_paths.update(paths)
+        if cache_counts is not None:
+            hits, disk_hits, misses = cache_counts
+            self.command_cache.hits += hits
+            self.command_cache.disk_hits += disk_hits
+            self.command_cache.misses += misses
+
+    def analyze_corpus(self, corpus_path, strip=0, only_repos=None):
+        """
+        Analyze the workflows of a corpus packed into one tar, zip or JSONL file
+        while it is read, without extracting it
+        :param strip: leading directories to drop from archive members, e.g. 1
+        for an archive of ../output with a directory per language
+        :param only_repos: analyze only these repositories
+        :return: the number of repositories in the corpus
+        """
+        repos = set()
+        for repo, file_path, content in read_corpus(corpus_path, strip):
+            if only_repos is not None and repo not in only_repos:
+                continue
+            repos.add(repo)
+            # Like analyze_all_files, only the files directly in the repository
+            if file_path is None or "/" in file_path or file_path.endswith("pom.xml"):
+                continue
+            self.analyze_workflow_content(repo, workflow_id(file_path), content)
 
         print(self.automations_dict[Invalid])
         return len(repos)
 
 
+def analyze_shard(save_path, repo_paths, cache_path=None, command_cache_path=None):
+    """
+    Analyze a shard of repositories in a worker process
+    :return: the partial results to merge, followed by the new entries of the
+    workflow and command caches
+    """
+    extractor = AutomationExtractor(
+        save_path,
+        WorkflowLoader(cache_path, read_only=True),
+        CommandCache(command_cache_path, read_only=True),
+    )
+    # A worker process analyzes several shards
+    paths = Counter(split_paths)
+    for repo, path in repo_paths:
+        extractor.analyze_repo(repo, path)
+    extractor.workflow_loader.close()
+    cache = extractor.command_cache
+    cache.close()
+    return (
+        extractor.automations_dict,
+        extractor.repos_dict,
+        extractor.exceptions,
+        split_paths - paths,
+        (cache.hits, cache.disk_hits, cache.misses),
+        extractor.workflow_loader.new_entries,
+        cache.new_entries,
+    )
+
+
 if __name__ == "__main__":
-    automationsExtractor = AutomationExtractor("../output")
-    total_repos = automationsExtractor.analyze_all_files(specify_language=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--changes",
+        action="store_true",
+        help="Only reanalyze the repositories in the changes.json manifests of "
+        "a delta crawl and update automations_dict.pkl",
+    )
+    parser.add_argument(
+        "--corpus",
+        action="append",
+        default=None,
+        help="Analyze a corpus packed into a tar, zip or JSONL file instead of "
+        "../output, can be given once per language",
+    )
+    parser.add_argument(
+        "--strip",
+        type=int,
+        default=0,
+        help="Leading directories to drop from the corpus archive members",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Worker processes analyzing the repositories in ../output, "
+        "1 analyzes them in this process",
+    )
+    args = parser.parse_args()
+
+    changed = None
+    repos_dict = dict()
+    if args.changes:
+        changed = changed_repos(
+            [
+                "../output/java/changes.json",
+                "../output/python/changes.json",
+            ]
+        )
+        with open("../output/automations_dict.pkl", "rb") as dict_file:
+            repos_dict = pickle.load(dict_file)
+        for repo in changed:
+            repos_dict.pop(repo, None)
+        print(f"Reanalyzing {len(changed)} changed repositories")
+
+    automationsExtractor = AutomationExtractor(
+        "../output",
+        WorkflowLoader("../output/workflow_cache.sqlite"),
+        CommandCache("../output/command_cache.sqlite"),
+    )
+    if args.corpus:
+        total_repos = sum(
+            automationsExtractor.analyze_corpus(corpus, args.strip, changed)
+            for corpus in args.corpus
+        )
+    else:
+        total_repos = automationsExtractor.analyze_all_files(
+            specify_language=True, only_repos=changed, processes=args.processes
+        )
+    automationsExtractor.workflow_loader.close()
+    automationsExtractor.command_cache.close()
+    print(automationsExtractor.command_cache.stats())
+    print(format_split_paths())
     print_analysis(automationsExtractor.automations_dict, total_repos)
 
     automation_clustering = AutomationClustering()
     automation_clustering.cluster_automations(automationsExtractor.automations_dict)
     automation_clustering.print_clusters()
 
+    repos_dict.update(automationsExtractor.repos_dict)
     with open("../output/automations_dict.pkl", "wb") as dict_file:
-        pickle.dump(automationsExtractor.repos_dict, dict_file)
+        pickle.dump(repos_dict, dict_file)
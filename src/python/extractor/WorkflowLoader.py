@@ -0,0 +1,243 @@
+import argparse
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import yaml
+
+from src.python.extractor.BlobStore import git_blob_sha
+
+# The libyaml bindings parse many times faster, PyYAML can be built without them
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# Bumped when NormalizedWorkflow changes, so stale cached workflows are not used
+NORMALIZED_VERSION = 2
+# Inserts per transaction, short so other processes reading the cache are not
+# held up by a long write
+COMMIT_EVERY = 100
+
+
+class InvalidWorkflow:
+    """
+    Loaded instead of a file that is not a valid workflow, compared with `is`.
+    The class itself is the sentinel, so it stays identical when unpickled from
+    the cache.
+    """
+
+
+def load_yaml(content, loader=SafeLoader):
+    return yaml.load(content, Loader=loader)
+
+
+class NormalizedWorkflow:
+    """
+    The parts of a workflow the analysis uses: its name, the ids of its jobs
+    and a (job id, job name, step name, run, uses, shell) tuple per step of the
+    jobs that have steps.
+    """
+
+    def __init__(self, name, jobs, steps):
+        self.name = name
+        self.jobs = jobs
+        self.steps = steps
+
+
+def normalize(workflow):
+    """
+    :param workflow: a parsed workflow file
+    :return: the normalized workflow, or None for an empty file
+    :raises ValueError: if the file is not a workflow
+    """
+    if workflow is None:
+        return None
+    if not isinstance(workflow, dict):
+        raise ValueError("Workflow is not a mapping")
+
+    jobs = workflow.get("jobs", {})
+    if not isinstance(jobs, dict):
+        raise ValueError("Jobs are not a mapping")
+    steps = []
+    for job_id, job in jobs.items():
+        if not isinstance(job, dict):
+            raise ValueError(f"Job {job_id} is not a mapping")
+        job_steps = job.get("steps", [])
+        if len(job_steps) > 0:
+            job_name = job.get("name", None)
+            for step in job_steps:
+                if not isinstance(step, dict):
+                    raise ValueError(f"Step of job {job_id} is not a mapping")
+                steps.append(
+                    (
+                        job_id,
+                        job_name,
+                        step.get("name", None),
+                        step.get("run", None),
+                        step.get("uses", None),
+                        step.get("shell", None),
+                    )
+                )
+    return NormalizedWorkflow(workflow.get("name", None), list(jobs), steps)
+
+
+class WorkflowLoader:
+    """
+    Parses workflow files into normalized workflows, keyed by git blob SHA so
+    identical files shared by many repositories are parsed once. With a
+    cache_path the normalized workflows are also stored in SQLite, so a
+    reanalysis of unchanged files does not parse YAML at all.
+    """
+
+    def __init__(self, cache_path=None, loader=SafeLoader, read_only=False):
+        """
+        :param read_only: keep newly parsed workflows in new_entries instead of
+        writing them, for worker processes whose parent writes them with save
+        """
+        self.cache_path = cache_path
+        self.loader = loader
+        self.read_only = read_only
+        self.new_entries = dict()
+        self.workflows = dict()
+        self.lock = threading.Lock()
+        self.connection = None
+        self.uncommitted = 0
+        self.num_parsed = 0
+        self.num_cached = 0
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            # Worker processes of the analysis read the cache while it is written
+            self.connection = sqlite3.connect(
+                cache_path, timeout=60, check_same_thread=False
+            )
+            if not read_only:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS workflows_v{NORMALIZED_VERSION} "
+                    "(sha TEXT PRIMARY KEY, workflow BLOB)"
+                )
+                self.connection.commit()
+
+    def load(self, content):
+        """
+        :param content: the workflow file as bytes or text
+        :return: the normalized workflow, None for an empty file or InvalidWorkflow if
+        the file is not a valid workflow
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        sha = git_blob_sha(content)
+        with self.lock:
+            if sha in self.workflows:
+                return self.workflows[sha]
+            if self.connection is not None:
+                row = self.connection.execute(
+                    f"SELECT workflow FROM workflows_v{NORMALIZED_VERSION} "
+                    "WHERE sha = ?",
+                    (sha,),
+                ).fetchone()
+                if row is not None:
+                    self.num_cached += 1
+                    self.workflows[sha] = pickle.loads(row[0])
+                    return self.workflows[sha]
+
+        try:
+            workflow = normalize(load_yaml(content.decode("utf-8"), self.loader))
+        except Exception:
+            workflow = InvalidWorkflow
+
+        with self.lock:
+            self.num_parsed += 1
+            self.workflows[sha] = workflow
+            if self.connection is not None and self.read_only:
+                self.new_entries[sha] = pickle.dumps(workflow)
+        if self.connection is not None and not self.read_only:
+            self.save({sha: pickle.dumps(workflow)})
+        return workflow
+
+    def save(self, entries):
+        """
+        Write pickled workflows to the cache, e.g. the new_entries of the
+        read-only loaders of worker processes
+        :param entries: the pickled workflows by blob SHA
+        """
+        with self.lock:
+            if self.connection is None:
+                return
+            for sha, workflow in entries.items():
+                self.connection.execute(
+                    f"INSERT OR REPLACE INTO workflows_v{NORMALIZED_VERSION} "
+                    "VALUES (?, ?)",
+                    (sha, workflow),
+                )
+                self.uncommitted += 1
+                if self.uncommitted >= COMMIT_EVERY:
+                    self.connection.commit()
+                    self.uncommitted = 0
+
+    def load_file(self, file_path):
+        with open(file_path, "rb") as workflow_file:
+            return self.load(workflow_file.read())
+
+    def commit(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+# Shared by the scripts that only read a few workflows
+workflow_loader = WorkflowLoader()
+
+
+def benchmark(file_paths, cache_path):
+    """
+    Measure the files per second of every way to load the workflows
+    """
+    contents = []
+    for file_path in file_paths:
+        with open(file_path, "rb") as workflow_file:
+            contents.append(workflow_file.read())
+
+    def run(name, loader):
+        start = time.perf_counter()
+        for content in contents:
+            loader.load(content)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"{name:>24}: {len(contents) / elapsed:10.1f} files/s")
+        loader.close()
+
+    run("SafeLoader", WorkflowLoader(loader=yaml.SafeLoader))
+    if hasattr(yaml, "CSafeLoader"):
+        run("CSafeLoader", WorkflowLoader(loader=yaml.CSafeLoader))
+    else:
+        print("CSafeLoader: not available, PyYAML is built without libyaml")
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    run("cache, cold", WorkflowLoader(cache_path))
+    run("cache, warm", WorkflowLoader(cache_path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the workflow loaders on the downloaded workflows"
+    )
+    parser.add_argument("--save-path", default="../output")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--cache", default="../output/workflow_benchmark.sqlite")
+    args = parser.parse_args()
+
+    workflow_paths = []
+    for root, _, files in os.walk(args.save_path):
+        for file in sorted(files):
+            if file.endswith((".yml", ".yaml")):
+                workflow_paths.append(os.path.join(root, file))
+    workflow_paths = workflow_paths[: args.limit]
+    print(f"Loading {len(workflow_paths)} workflows")
+    benchmark(workflow_paths, args.cache)
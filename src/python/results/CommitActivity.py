@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from requests.utils import parse_header_links
+
+from src.python.extractor.HttpClient import github_api_url
+
+
+class CommitActivity:
+    """
+    Average number of commits per month since a date, counted over all commits
+    in the window instead of the first page of 30. The commits are listed 100
+    per page following the Link headers, up to max_pages per repository; past
+    that the average is taken over the period the pages cover. Every page goes
+    through send_request, so with a caching one a rerun sends no requests.
+    """
+
+    def __init__(
+        self,
+        send_request,
+        since=datetime(2023, 1, 1),
+        max_pages=10,
+        concurrency=8,
+    ):
+        """
+        :param send_request: called with a URL, returns the response
+        """
+        self.send_request = send_request
+        self.since = since
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.api_url = github_api_url()
+
+    def commit_dates(self, repo):
+        """
+        :return: the dates of the commits in the window, newest first, or None
+        if the commits could not be listed
+        """
+        url = (
+            f"{self.api_url}/repos/{repo}/commits?"
+            f"since={self.since.strftime('%Y-%m-%dT%H:%M:%SZ')}&per_page=100"
+        )
+        dates = []
+        for _ in range(self.max_pages):
+            response = self.send_request(url)
+            if response.status_code != 200:
+                print(f"Error fetching commits for {repo}: {response.status_code}")
+                return None if not dates else dates
+            dates.extend(
+                datetime.strptime(c["commit"]["author"]["date"], "%Y-%m-%dT%H:%M:%SZ")
+                for c in response.json()
+                if c.get("commit")
+            )
+            next_links = [
+                link["url"]
+                for link in parse_header_links(response.headers.get("link", ""))
+                if link.get("rel") == "next"
+            ]
+            if not next_links:
+                break
+            url = next_links[0]
+        return dates
+
+    def commits_per_month(self, repo):
+        dates = self.commit_dates(repo)
+        if dates is None:
+            return None
+        if not dates:
+            return 0  # No commits
+
+        days_elapsed = (datetime.utcnow() - min(dates)).days
+        months_elapsed = max(days_elapsed / 30, 1)  # Avoid division by zero
+        return len(dates) / months_elapsed
+
+    def collect(self, repos):
+        """
+        :return: the commits per month of every repository, fetched concurrently
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return dict(zip(repos, executor.map(self.commits_per_month, repos)))
@@ -1,4 +1,3 @@
-import hashlib
 import os
 import pickle
 from collections import defaultdict
@@ -6,30 +5,42 @@ from datetime import datetime
 
 import matplotlib.pyplot as plt
 import pandas as pd
-import requests
 import seaborn as sns
 from dotenv import load_dotenv
 
 from src.python.entities.RateLimitException import RateLimitException
+from src.python.extractor.HttpClient import github_api_url, http_client
+from src.python.extractor.ResponseCache import ResponseCache
 from src.python.extractor.Utilities import (add_joker, get_lowest_level,
                                             get_maturity_levels,
                                             get_report_per_level)
 from src.python.results.AutomationReporter import (
     check_and_report_automations, parse_markdown_to_domain)
+from src.python.results.CommitActivity import CommitActivity
 
 load_dotenv()
 github_token = os.getenv("GITHUB_ISSUE_TOKEN")
 headers = {
     "Authorization": f"token {github_token}",
 }
-
-with open("../data/rq1_java_repos.txt") as file:
-    repos = [line.strip() for line in file if line.strip()]
-with open("../data/rq1_python_repos.txt") as file:
-    repos.extend([line.strip() for line in file if line.strip()])
-with open("../output/automations_dict.pkl", "rb") as file:
-    domains = parse_markdown_to_domain("../data/automations.md")
-    report = check_and_report_automations(repos, domains, pickle.load(file))
+response_cache = None
+repos = []
+domains = []
+report = dict()
+
+
+def load_report():
+    """
+    Load the repositories and their automation report the plots are based on
+    """
+    global repos, domains, report
+    with open("../data/rq1_java_repos.txt") as file:
+        repos = [line.strip() for line in file if line.strip()]
+    with open("../data/rq1_python_repos.txt") as file:
+        repos.extend([line.strip() for line in file if line.strip()])
+    with open("../output/automations_dict.pkl", "rb") as file:
+        domains = parse_markdown_to_domain("../data/automations.md")
+        report = check_and_report_automations(repos, domains, pickle.load(file))
 
 
 def generate_subdomains_plot():
@@ -162,61 +173,41 @@ def generate_tasks_plot():
 
 
 def send_request(url: str, headers):
-    filename_url = hashlib.sha256(url.encode()).hexdigest() + ".pkl"
-    file_path = os.path.join("../requests", filename_url)
-    old_filename_url = url.replace("/", "*") + ".pkl"
-    old_file_path = os.path.join("../requests", old_filename_url)
-
-    # Check if the file exists at the specified path
-    if os.path.exists(file_path):
-        with open(file_path, "rb") as f:
-            return pickle.load(f)
-    elif os.path.exists(old_file_path):
-        with open(old_file_path, "rb") as f:
-            return pickle.load(f)
-    else:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 403 or response.status_code == 429:
-            raise RateLimitException(f"Rate limit exceeded on {url}")
+    global response_cache
+    if response_cache is None:
+        response_cache = ResponseCache("../requests")
+    cached = response_cache.get(url)
+    if cached is not None and not cached.expired:
+        return cached
 
-        with open(file_path, "wb") as f:
-            pickle.dump(response, f)
-        return response
+    response = http_client.get(url, headers=headers)
+    if response.status_code == 403 or response.status_code == 429:
+        raise RateLimitException(f"Rate limit exceeded on {url}")
 
+    return response_cache.put(url, response)
 
-def fetch_commit_frequency(repo_full_name):
-    # Fetch commits from the last year (adjust timeframe as needed)
-    url = f"https://api.github.com/repos/{repo_full_name}/commits?since=2023-01-01T00:00:00Z"
-    response = send_request(url, headers)
-
-    if response.status_code != 200:
-        print(f"Error fetching commits for {repo_full_name}: {response.status_code}")
-        return None
 
-    commits = response.json()
-    commit_dates = [
-        datetime.strptime(c["commit"]["author"]["date"], "%Y-%m-%dT%H:%M:%SZ")
-        for c in commits
-        if c.get("commit")
-    ]
+def commit_activity():
+    global response_cache
+    # Created up front, the collector sends requests from several threads
+    if response_cache is None:
+        response_cache = ResponseCache("../requests")
+    return CommitActivity(lambda url: send_request(url, headers))
 
-    if not commit_dates:
-        return 0  # No commits
 
-    # Calculate commits per month (adjust to "weeks" if preferred)
-    days_elapsed = (datetime.utcnow() - min(commit_dates)).days
-    months_elapsed = max(days_elapsed / 30, 1)  # Avoid division by zero
-    return len(commit_dates) / months_elapsed
+def fetch_commit_frequency(repo_full_name):
+    return commit_activity().commits_per_month(repo_full_name)
 
 
-def fetch_repo_info(repo_full_name):
-    url = f"https://api.github.com/repos/{repo_full_name}"
+def fetch_repo_info(repo_full_name, commit_freq=None):
+    url = f"{github_api_url()}/repos/{repo_full_name}"
     response = send_request(url, headers)
 
     if response.status_code != 200:
         print(f"Error fetching {repo_full_name}: {response.status_code}")
         return None
-    commit_freq = fetch_commit_frequency(repo_full_name)
+    if commit_freq is None:
+        commit_freq = fetch_commit_frequency(repo_full_name)
     data = response.json()
 
     created_at = data.get("created_at")
@@ -250,9 +241,10 @@ def get_maturity_df():
         elif lowest == 3:
             repo_scores[repo] = "Advanced"
 
+    commit_freqs = commit_activity().collect(list(repo_scores))
     records = []
     for repo, score in repo_scores.items():
-        info = fetch_repo_info(repo)
+        info = fetch_repo_info(repo, commit_freqs[repo])
         if info:
             records.append({"Repo": repo, "Maturity": score, **info})
 
@@ -492,6 +484,7 @@ def generate_top_bottom_plot():
 
 
 if __name__ == "__main__":
+    load_report()
     generate_tasks_plot()
     generate_subdomains_plot()
     generate_violin_plots()
@@ -4,11 +4,8 @@ import os
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import requests
-from dotenv import load_dotenv
 
 from src.python.entities.Automation import Level, Todo
-from src.python.entities.RateLimitException import RateLimitException
 from src.python.extractor.RepositoryDownloader import AutomationDownloader
 from src.python.extractor.Utilities import (add_joker, download_files,
                                             get_average_level,
@@ -121,43 +118,6 @@ def get_todos(yes_no_table, maturity_levels, max_todos):
     return md
 
 
-def publish_github_issue(repository, title, body):
-    """
-    Publishes an issue to the specified GitHub repository.
-
-    :param repository: The repository in the format 'owner/repository'.
-    :param token: The GitHub personal access token for authentication.
-    :param title: The title of the issue.
-    :param body: The body/description of the issue.
-    :raises RateLimitException: If a rate limit error is encountered.
-    :raises Exception: For generic failures when creating an issue.
-    """
-    load_dotenv()
-    github_token = os.getenv("GITHUB_ISSUE_TOKEN")
-
-    url = f"https://api.github.com/repos/{repository}/issues"
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github+json",
-    }
-    payload = {"title": title, "body": body}
-
-    response = requests.post(url, json=payload, headers=headers)
-
-    if response.status_code == 201:
-        return response.json()
-    elif (
-        response.status_code == 403
-        and "X-RateLimit-Remaining" in response.headers
-        and response.headers["X-RateLimit-Remaining"] == "0"
-    ):
-        raise RateLimitException("GitHub API rate limit exceeded.")
-    else:
-        print(
-            f"Failed to create issue on {repository}: {response.status_code}, {response.text}"
-        )
-
-
 def generate_yes_no_table(repo_report):
     table = dict()
     for domain in repo_report.keys():
@@ -268,7 +228,8 @@ if __name__ == "__main__":
         with open(f"{output_path}.md", "w+", encoding="utf-8") as file:
             file.write(content)
 
-        # publish_github_issue(repo, "Automation analysis", content)
+        # Published afterwards with IssuePublisher, which paces the creates and
+        # skips repositories that already received an issue
 
     print("Without joker:")
     statistics(average_scores, least_scores)
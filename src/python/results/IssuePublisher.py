@@ -0,0 +1,285 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+
+import requests
+from dotenv import load_dotenv
+
+from src.python.entities.RateLimitException import rate_limit_reset
+from src.python.extractor.CrawlPlanner import format_duration
+from src.python.extractor.HttpClient import HttpClient, github_api_url
+from src.python.results.IssueServer import IssueServer
+
+# GitHub's guidance for creating content: one request at a time, at least a
+# second apart, and at most 80 per minute and 500 per hour
+MIN_INTERVAL = 1.0
+CREATE_LIMITS = [(80, 60), (500, 3600)]
+# Wait after a secondary rate limit without a Retry-After, doubled every attempt
+SECONDARY_LIMIT_WAIT = 60
+# Every this many creates the stand-in of a dry run rejects one
+DRY_RUN_ISSUE_LIMIT = 100
+
+
+class IssueLedger:
+    """
+    The issue created in every repository, stored in SQLite so a rerun of a
+    campaign skips them. A repository is marked pending while its issue is
+    posted: if the run stops before the response it is unknown whether the
+    issue exists, so it is skipped until checked by hand.
+    """
+
+    def __init__(self, path="../output/issue_ledger.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS issues (repo TEXT PRIMARY KEY, "
+            "status TEXT, number INTEGER, url TEXT, updated_at REAL)"
+        )
+        self.connection.commit()
+
+    def status(self, repo):
+        """
+        :return: "pending" or "published", or None if no issue was posted
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status FROM issues WHERE repo = ?", (repo,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def update(self, repo, status, number=None, url=None):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?)",
+                (repo, status, number, url, time.time()),
+            )
+            self.connection.commit()
+
+    def remove(self, repo):
+        with self.lock:
+            self.connection.execute("DELETE FROM issues WHERE repo = ?", (repo,))
+            self.connection.commit()
+
+    def repos(self, status):
+        with self.lock:
+            return [
+                repo
+                for repo, in self.connection.execute(
+                    "SELECT repo FROM issues WHERE status = ? ORDER BY repo", (status,)
+                )
+            ]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class IssuePublisher:
+    """
+    Creates issues one at a time, paced to stay within GitHub's secondary rate
+    limits for creating content. A rejected create is retried after the
+    Retry-After, the primary rate limit reset or an exponential backoff, and
+    repositories that already received an issue according to the ledger are
+    skipped.
+    """
+
+    def __init__(
+        self,
+        ledger,
+        token=None,
+        min_interval=MIN_INTERVAL,
+        limits=CREATE_LIMITS,
+        max_attempts=5,
+        retry_pending=False,
+    ):
+        """
+        :param retry_pending: post again to repositories left pending
+        """
+        self.ledger = ledger
+        self.headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            self.headers["Authorization"] = f"token {token}"
+        self.min_interval = min_interval
+        self.limits = limits
+        self.max_attempts = max_attempts
+        self.retry_pending = retry_pending
+        # Backing off is left to the publisher, a create must not be resent
+        self.client = HttpClient(max_retries=0)
+        self.sent = deque()
+        self.num_published = 0
+        self.num_skipped = 0
+        self.num_backoffs = 0
+        self.waited = 0.0
+        self.failed = dict()
+
+    def wait(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+            self.waited += seconds
+
+    def wait_for_slot(self):
+        now = time.time()
+        wait = self.sent[-1] + self.min_interval - now if self.sent else 0
+        for count, period in self.limits:
+            recent = [sent for sent in self.sent if sent > now - period]
+            if len(recent) >= count:
+                wait = max(wait, recent[-count] + period - now)
+        self.wait(wait)
+
+        self.sent.append(time.time())
+        longest = max((period for _, period in self.limits), default=0)
+        while self.sent and self.sent[0] <= self.sent[-1] - longest:
+            self.sent.popleft()
+
+    def backoff(self, response, attempt):
+        """
+        :return: the seconds to wait before retrying, or None if the create
+        failed for another reason than a rate limit
+        """
+        if response.status_code not in (403, 429):
+            return None
+        if (
+            "retry-after" in response.headers
+            or response.headers.get("x-ratelimit-remaining") == "0"
+        ):
+            reset = rate_limit_reset(response.headers)
+            if reset is not None:
+                return max(reset - time.time(), 1)
+        if response.status_code == 429 or "secondary rate limit" in response.text:
+            return SECONDARY_LIMIT_WAIT * 2**attempt
+        return None
+
+    def publish(self, repo, title, body):
+        """
+        :return: the created issue, or None if it was skipped or failed
+        """
+        status = self.ledger.status(repo)
+        if status == "published" or (status == "pending" and not self.retry_pending):
+            self.num_skipped += 1
+            return None
+
+        url = f"{github_api_url()}/repos/{repo}/issues"
+        for attempt in range(self.max_attempts):
+            self.wait_for_slot()
+            self.ledger.update(repo, "pending")
+            try:
+                response = self.client.post(
+                    url, json={"title": title, "body": body}, headers=self.headers
+                )
+            except requests.exceptions.RequestException as e:
+                # The issue may have been created, the repository stays pending
+                self.failed[repo] = str(e)
+                return None
+
+            if response.status_code == 201:
+                issue = response.json()
+                self.ledger.update(
+                    repo, "published", issue["number"], issue["html_url"]
+                )
+                self.num_published += 1
+                return issue
+
+            # Rejected, so no issue was created
+            self.ledger.remove(repo)
+            wait = self.backoff(response, attempt)
+            if wait is None:
+                self.failed[repo] = f"{response.status_code}: {response.text[:200]}"
+                return None
+            print(f"Rate limited on {repo}, waiting {format_duration(wait)}")
+            self.num_backoffs += 1
+            self.wait(wait)
+
+        self.failed[repo] = f"still rate limited after {self.max_attempts} attempts"
+        return None
+
+    def publish_all(self, issues):
+        """
+        :param issues: (repository, title, body) of every issue
+        """
+        start = time.time()
+        for repo, title, body in issues:
+            self.publish(repo, title, body)
+        print(self.report(time.time() - start))
+
+    def report(self, elapsed):
+        lines = [
+            f"Published {self.num_published} issues in {format_duration(elapsed)} "
+            f"({self.num_published / max(elapsed / 60, 1e-9):.1f}/min), "
+            f"skipped {self.num_skipped} already posted, "
+            f"{len(self.failed)} failed, {self.num_backoffs} backoffs, "
+            f"waited {format_duration(self.waited)}"
+        ]
+        for repo, reason in self.failed.items():
+            lines.append(f"Failed {repo}: {reason}")
+        pending = self.ledger.repos("pending")
+        if pending:
+            lines.append(
+                f"Check by hand whether these got an issue: {', '.join(pending)}"
+            )
+        return "\n".join(lines)
+
+
+def read_issues(repos_path, reports_path, title):
+    """
+    Read the issue of every repository generated by IssueGenerator
+    """
+    with open(repos_path) as file:
+        repos = [line.strip() for line in file if line.strip()]
+    issues = []
+    for repo in repos:
+        report_path = os.path.join(reports_path, f"{repo}.md")
+        if not os.path.isfile(report_path):
+            print(f"No report for {repo}")
+            continue
+        with open(report_path, encoding="utf-8") as report:
+            issues.append((repo, title, report.read()))
+    return issues
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Publish the generated reports as GitHub issues"
+    )
+    parser.add_argument("--repos", default="../data/rq3_repos.txt")
+    parser.add_argument("--reports", default="../reports/output")
+    parser.add_argument("--title", default="Automation analysis")
+    parser.add_argument("--ledger", default="../output/issue_ledger.sqlite")
+    parser.add_argument("--interval", type=float, default=MIN_INTERVAL)
+    parser.add_argument(
+        "--retry-pending",
+        action="store_true",
+        help="post again to repositories of which the last post got no response",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="publish to a local GitHub stand-in with a fresh ledger",
+    )
+    args = parser.parse_args()
+
+    issues = read_issues(args.repos, args.reports, args.title)
+    if args.dry_run:
+        # Rejects some creates, so the dry run also goes through the backoff
+        issue_server = IssueServer(issue_limit=DRY_RUN_ISSUE_LIMIT).start()
+        os.environ["GITHUB_API_URL"] = issue_server.url
+        tmp_dir = tempfile.TemporaryDirectory()
+        args.ledger = os.path.join(tmp_dir.name, "issue_ledger.sqlite")
+
+    load_dotenv()
+    issue_ledger = IssueLedger(args.ledger)
+    publisher = IssuePublisher(
+        issue_ledger,
+        token=os.getenv("GITHUB_ISSUE_TOKEN"),
+        min_interval=args.interval,
+        retry_pending=args.retry_pending,
+    )
+    publisher.publish_all(issues)
+    issue_ledger.close()
+    if args.dry_run:
+        issue_server.stop()
+        tmp_dir.cleanup()
@@ -0,0 +1,102 @@
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class IssueTracker:
+    """
+    The issues created per repository, like GitHub every issue_limit-th create
+    is rejected by a secondary rate limit with a Retry-After.
+    """
+
+    def __init__(self, issue_limit=None):
+        self.issue_limit = issue_limit
+        self.attempts = 0
+        self.issues = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def create(self, repo, body):
+        """
+        :return: the status code, payload and extra headers of the response
+        """
+        with self.lock:
+            self.attempts += 1
+            if self.issue_limit and self.attempts % self.issue_limit == 0:
+                message = {"message": "You have exceeded a secondary rate limit."}
+                return 403, message, {"Retry-After": "1"}
+            self.issues[repo].append(body)
+            number = len(self.issues[repo])
+        issue = {
+            "number": number,
+            "title": body["title"],
+            "html_url": f"https://github.com/{repo}/issues/{number}",
+        }
+        return 201, issue, dict()
+
+
+class IssueServer:
+    """
+    Local stand-in for the issues endpoint of the GitHub API, for publishing
+    issues in a dry run. Creates are paced and rejected like on GitHub, so a
+    dry run goes through the same waits and backoffs as a real one.
+    """
+
+    def __init__(self, issue_limit=None):
+        self.tracker = IssueTracker(issue_limit)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def issues(self):
+        return self.tracker.issues
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handler_class(self):
+        tracker = self.tracker
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                match = re.fullmatch(r"/repos/([^/]+/[^/]+)/issues", self.path)
+                if match is None:
+                    status, payload, headers = 404, {"message": "Not Found"}, dict()
+                else:
+                    status, payload, headers = tracker.create(match.group(1), body)
+                content = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("x-ratelimit-remaining", "5000")
+                self.send_header("x-ratelimit-reset", str(int(time.time()) + 3600))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,113 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from src.python.extractor.ArchiveDownloader import ArchiveAutomationDownloader
+from src.python.extractor.GraphQLDownloader import GraphQLAutomationDownloader
+from src.python.extractor.RepositoryDownloader import AutomationDownloader
+from src.python.extractor.ResponseCache import ResponseCache
+from src.python.extractor.TokenPool import TokenPool
+from src.python.extractor.Utilities import (download_files,
+                                            download_files_concurrently)
+from src.python.tests.MockGitHubServer import MockGitHubServer, synthetic_repos
+
+MODES = ["serial", "concurrent", "graphql", "archive", "repo-info"]
+
+
+def crawl(mode, repos, cache, save_path, concurrency):
+    if mode == "repo-info":
+        # Imported here, Graphs pulls in the plotting libraries
+        from src.python.results import Graphs
+
+        Graphs.response_cache = cache
+        for repo in repos:
+            Graphs.fetch_repo_info(repo)
+        return
+
+    downloader_class = {
+        "graphql": GraphQLAutomationDownloader,
+        "archive": ArchiveAutomationDownloader,
+    }.get(mode, AutomationDownloader)
+    downloader = downloader_class(
+        save_path,
+        verbose=False,
+        cache=cache,
+        token_pool=TokenPool(["benchmark"]),
+    )
+    if mode == "concurrent":
+        download_files_concurrently(repos, [downloader], concurrency)
+    else:
+        download_files(repos, [downloader])
+
+
+def benchmark(mode, server, repos, work_dir, concurrency=16):
+    """
+    Crawl all repositories twice with an empty cache in work_dir, cold and warm
+    :return: a dict of measurements for both runs
+    """
+    cache = ResponseCache(os.path.join(work_dir, mode, "requests"))
+    save_path = os.path.join(work_dir, mode, "output")
+    results = dict()
+    try:
+        for run in ["cold", "warm"]:
+            served_before = sum(server.requests.values())
+            cache.hits = cache.misses = 0
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                crawl(mode, repos, cache, save_path, concurrency)
+            wall_time = time.perf_counter() - start
+            served = sum(server.requests.values()) - served_before
+            lookups = cache.hits + cache.misses
+            results[run] = {
+                "wall_time": wall_time,
+                "requests": served,
+                "requests_per_second": served / wall_time if wall_time else 0,
+                "repos_per_second": len(repos) / wall_time if wall_time else 0,
+                "cache_hit_rate": cache.hits / lookups if lookups else 0,
+            }
+    finally:
+        cache.close()
+    return results
+
+
+def print_results(mode, results):
+    for run, result in results.items():
+        print(
+            f"{mode:>10} {run:>4}: {result['wall_time']:7.2f}s, "
+            f"{result['requests']:6d} requests, "
+            f"{result['requests_per_second']:8.1f} requests/s, "
+            f"{result['repos_per_second']:7.1f} repos/s, "
+            f"cache hit rate {result['cache_hit_rate']:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crawlers against a local GitHub stand-in"
+    )
+    parser.add_argument("--repos", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    synthetic = synthetic_repos(args.repos)
+    with MockGitHubServer(
+        synthetic, latency=args.latency, rate_limit=10**9, error_rate=args.error_rate
+    ) as mock_server, tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["GITHUB_API_URL"] = mock_server.url
+        for benchmark_mode in args.modes.split(","):
+            print_results(
+                benchmark_mode,
+                benchmark(
+                    benchmark_mode,
+                    mock_server,
+                    list(synthetic),
+                    tmp_dir,
+                    args.concurrency,
+                ),
+            )
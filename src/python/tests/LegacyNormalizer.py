@@ -0,0 +1,213 @@
+import argparse
+import os
+
+from src.python.entities.Action import Run, flatten
+from src.python.extractor.Utilities import (mvn_dict, normalize_command,
+                                            split_run)
+from src.python.extractor.WorkflowLoader import WorkflowLoader
+
+# The command normalization as it was before it was compiled into lookup
+# tables, kept as the reference the compiled version must match
+
+
+def clean_command(command: str) -> str:
+    for prefix in ["sudo ", "xargs ", "call ", "until "]:
+        if command.startswith(prefix):
+            command = command[len(prefix) :]
+
+    if command.endswith(";"):
+        command = command[:-1]
+
+    cleaned_tokens = []
+
+    for token in command.split():
+        if "-DskipTests" in token or not (
+            token.startswith("-") or token.startswith("$") or "=" in token
+        ):
+            cleaned_tokens.append(token)
+
+    return " ".join(cleaned_tokens)
+
+
+def split_special_cases(cmd):
+    special_cases = [("poetry run", None)]
+    for prefix, number in special_cases:
+        len_tokens = len(prefix.split())
+        if cmd.split()[:len_tokens] == prefix.split():
+            if number:
+                return [prefix, clean_command(cmd.split()[len_tokens:number])]
+            else:
+                return [prefix, clean_command(flatten(cmd.split()[len_tokens:]))]
+    if (
+        cmd.startswith("mvn")
+        or cmd.startswith("./mvnw")
+        or cmd.startswith("./build/mvn")
+    ):
+        no_tests = False
+        if "-DskipTests" in cmd:
+            no_tests = True
+            cmd = cmd.replace("-DskipTests", "")
+        mvn_cmds = ["mvn " + x for x in cmd.split()[1:]]
+        aggregated_cmds = set()
+        for mvn_cmd in mvn_cmds:
+            aggregated_cmds.add(mvn_cmd)
+            aggregated_cmds = aggregated_cmds.union(mvn_dict.get(mvn_cmd, set()))
+        if no_tests and "mvn test" in aggregated_cmds:
+            aggregated_cmds.remove("mvn test")
+        return list(aggregated_cmds)
+
+    return [cmd]
+
+
+def legacy_normalize_command(command):
+    filtered_run = []
+    for split_command in split_special_cases(clean_command(command)):
+        if not (
+            len(split_command) == 0
+            or split_command.startswith("#")
+            or any(
+                split_command.strip().split()[0] == prefix
+                for prefix in [
+                    "cd",
+                    "echo",
+                    "ls",
+                    "mkdir",
+                    "rm",
+                    "chmod",
+                    "grep",
+                    "rm",
+                    "touch",
+                    "[",
+                    "[[",
+                    "elif",
+                    "sleep",
+                    "printf",
+                    "(echo",
+                    ">&2 echo",
+                    "${{",
+                    "if",
+                    "mv",
+                    "cat",
+                    "tr",
+                    "for",
+                    "true",
+                    '"${{',
+                    "exit",
+                    "head",
+                    "cut",
+                    "tail",
+                    "wc",
+                    "which",
+                    "-",
+                    "unset",
+                    "pwd",
+                    "then",
+                    "EOF",
+                    "while",
+                    "case",
+                    "for",
+                    "import",
+                    ")",
+                    "sed",
+                    "cp",
+                    "tee",
+                    "find",
+                ]
+            )
+            or any(
+                forbidden_cmd == split_command
+                for forbidden_cmd in ["", "fi", "else", "done", "do", "}", "{"]
+            )
+        ):
+            filtered_run.append(split_command)
+    return filtered_run
+
+
+def legacy_run(run):
+    """
+    :return: the command and prefix the Run constructor used to derive
+    """
+    prefixes = [
+        ("python3", 2),
+        ("python", 2),
+        ("git", 2),
+        ("mvn", 2),
+        (".", 2),
+        ("docker", 2),
+        ("make", 2),
+        ("./gradlew", 2),
+        ("poetry", 2),
+        ("bash", 2),
+        ("conda", 2),
+        ("gh", 2),
+        ("coverage", 2),
+        ("twine", 2),
+        ("brew", 2),
+        ("ruff", 2),
+        ("npm", 2),
+        ("pre-commit", 2),
+        ("/usr/bin/python3", 2),
+        ("npm run", 3),
+        ("./mvnw", 2),
+        ("python3", 2),
+    ]
+    command = flatten(run.split()[:4])
+    prefixed_run = None
+    found_prefix = None
+    for prefix, number in prefixes:
+        len_prefix = len(prefix.split())
+        if flatten(command.split()[:len_prefix]) == prefix:
+            prefixed_run = flatten(command.split()[:number])
+            found_prefix = prefix
+    if prefixed_run:
+        return prefixed_run, found_prefix
+    return command.split()[0], found_prefix
+
+
+def differences(commands):
+    """
+    Compare the normalization of commands split from run blocks, and the Run
+    actions of the results, with the legacy normalization
+    :return: the commands normalized differently
+    """
+    different = []
+    for command in commands:
+        expected = legacy_normalize_command(command)
+        normalized = normalize_command(command)
+        if normalized != expected:
+            different.append((command, expected, normalized))
+            continue
+        for result in normalized:
+            run = Run(result)
+            if (run.run, run.prefix) != legacy_run(result):
+                different.append((result, legacy_run(result), (run.run, run.prefix)))
+    return different
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the command normalization with the legacy one on "
+        "every run block of the downloaded workflows"
+    )
+    parser.add_argument("--save-path", default="../output")
+    args = parser.parse_args()
+
+    loader = WorkflowLoader()
+    corpus_commands = set()
+    for root, _, files in os.walk(args.save_path):
+        for file in files:
+            if not file.endswith((".yml", ".yaml")):
+                continue
+            workflow = loader.load_file(os.path.join(root, file))
+            if workflow is None or not hasattr(workflow, "steps"):
+                continue
+            for _, _, _, step_run, _, shell in workflow.steps:
+                if step_run and type(step_run) is str and shell != "python":
+                    corpus_commands.update(split_run(step_run))
+
+    mismatches = differences(sorted(corpus_commands))
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+    print(
+        f"{len(mismatches)} of {len(corpus_commands)} commands normalized differently"
+    )
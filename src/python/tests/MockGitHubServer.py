@@ -0,0 +1,415 @@
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src.python.extractor.BlobStore import git_blob_sha
+from src.python.results.IssueServer import IssueTracker
+
+WORKFLOW_TEMPLATES = [
+    "name: Java CI\non: push\njobs:\n  build:\n    runs-on: ubuntu-latest\n"
+    "    steps:\n      - uses: actions/checkout@v4\n"
+    "      - uses: actions/setup-java@v4\n      - run: mvn -B package --file pom.xml\n",
+    "name: Python\non: push\njobs:\n  test:\n    runs-on: ubuntu-latest\n"
+    "    steps:\n      - uses: actions/checkout@v4\n"
+    "      - run: pip install -r requirements.txt\n      - run: python -m pytest\n",
+    "name: CodeQL\non: push\njobs:\n  analyze:\n    runs-on: ubuntu-latest\n"
+    "    steps:\n      - uses: actions/checkout@v4\n"
+    "      - uses: github/codeql-action/init@v3\n"
+    "      - uses: github/codeql-action/analyze@v3\n",
+    "name: Release\non:\n  release:\n    types: [published]\njobs:\n  deploy:\n"
+    "    runs-on: ubuntu-latest\n    steps:\n      - uses: actions/checkout@v4\n"
+    "      - run: mvn -B deploy -DskipTests\n",
+]
+
+POM_TEMPLATE = (
+    "<project>\n  <modelVersion>4.0.0</modelVersion>\n"
+    "  <artifactId>{artifact}</artifactId>\n</project>\n"
+)
+
+
+class SyntheticRepo:
+    def __init__(self, name, files, truncated=False, commits=0, created_at=None):
+        self.name = name
+        self.files = files
+        self.truncated = truncated
+        self.head = hashlib.sha1(f"head {name}".encode()).hexdigest()
+        now = datetime.now(timezone.utc)
+        self.created_at = created_at or now - timedelta(days=1000)
+        self.commit_dates = [now - timedelta(hours=7 * i) for i in range(commits)]
+
+    def directories(self):
+        directories = {""}
+        for path in self.files:
+            parts = path.split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                directories.add("/".join(parts[:i]))
+        return directories
+
+    def tree_sha(self, directory):
+        if directory == "":
+            return self.head
+        return hashlib.sha1(f"tree {self.name} {directory}".encode()).hexdigest()
+
+    def tree_entries(self, directory, recursive):
+        prefix = f"{directory}/" if directory else ""
+        entries = []
+        for sub_directory in sorted(self.directories() - {""}):
+            rest = sub_directory[len(prefix) :]
+            if sub_directory.startswith(prefix) and (recursive or "/" not in rest):
+                entries.append(
+                    {
+                        "path": rest,
+                        "type": "tree",
+                        "sha": self.tree_sha(sub_directory),
+                    }
+                )
+        for path, content in sorted(self.files.items()):
+            rest = path[len(prefix) :]
+            if path.startswith(prefix) and (recursive or "/" not in rest):
+                entries.append(
+                    {
+                        "path": rest,
+                        "type": "blob",
+                        "sha": git_blob_sha(content.encode()),
+                        "size": len(content),
+                    }
+                )
+        if recursive:
+            entries.sort(key=lambda entry: entry["path"])
+        return entries
+
+
+def synthetic_repos(count, seed=0, filler_files=20):
+    """
+    Generate repositories that look like the crawled corpus: most have one to
+    four workflows from a small set of templates, Java ones have a root pom.xml
+    and a few modules, some use gradle and a few have a truncated tree.
+    """
+    rng = random.Random(seed)
+    repos = dict()
+    for i in range(count):
+        name = f"owner{i % 97}/repo{i}"
+        files = dict()
+        for workflow in rng.sample(range(len(WORKFLOW_TEMPLATES)), rng.randint(1, 4)):
+            files[f".github/workflows/workflow{workflow}.yml"] = WORKFLOW_TEMPLATES[
+                workflow
+            ]
+        kind = rng.random()
+        if kind < 0.7:
+            files["pom.xml"] = POM_TEMPLATE.format(artifact=f"repo{i}")
+            for module in range(rng.randint(0, 4)):
+                files[f"module{module}/pom.xml"] = POM_TEMPLATE.format(
+                    artifact=f"module{module}"
+                )
+        elif kind < 0.8:
+            files["build.gradle"] = "plugins { id 'java' }\n"
+        for filler in range(filler_files):
+            files[f"src/main/java/pkg{filler % 5}/File{filler}.java"] = "class A {}\n"
+        repos[name] = SyntheticRepo(
+            name,
+            files,
+            truncated=rng.random() < 0.05,
+            commits=rng.randint(0, 250),
+        )
+    return repos
+
+
+class MockGitHubServer:
+    """
+    Local stand-in for the GitHub REST and GraphQL APIs serving synthetic
+    repositories, with configurable latency, rate-limit headers, injected
+    403/429 responses and ETag revalidation. Issues can be created, with
+    every issue_limit-th attempt rejected by a secondary rate limit.
+    """
+
+    def __init__(
+        self,
+        repos,
+        latency=0.0,
+        rate_limit=5000,
+        error_rate=0.0,
+        error_status=429,
+        seed=0,
+        issue_limit=None,
+    ):
+        self.repos = repos
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.issue_tracker = IssueTracker(issue_limit)
+        self.remaining = dict()
+        self.reset = int(time.time()) + 3600
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def issues(self):
+        return self.issue_tracker.issues
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this every
+            # keep-alive request waits for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                mock.handle(self, "GET")
+
+            def do_POST(self):
+                mock.handle(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, handler, method):
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(handler.path)
+        body = None
+        if method == "POST":
+            length = int(handler.headers.get("Content-Length", 0))
+            body = json.loads(handler.rfile.read(length) or b"{}")
+
+        endpoint, status, payload, extra_headers = self.route(
+            method, parsed.path, parse_qs(parsed.query), body
+        )
+        with self.lock:
+            self.requests[endpoint] += 1
+
+        token = handler.headers.get("Authorization", "anonymous")
+        content = (
+            payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        )
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        headers = {"Content-Type": "application/json", **extra_headers}
+
+        if endpoint != "raw":
+            with self.lock:
+                remaining = self.remaining.setdefault(token, self.rate_limit)
+                if handler.headers.get("If-None-Match") == etag and status == 200:
+                    # Not modified responses are free, like on GitHub
+                    status, content = 304, b""
+                elif remaining <= 0:
+                    status, content = 403, b'{"message": "API rate limit exceeded"}'
+                elif self.random.random() < self.error_rate:
+                    status, content = self.error_status, b'{"message": "slow down"}'
+                    headers["Retry-After"] = "1"
+                else:
+                    self.remaining[token] = remaining = remaining - 1
+            headers["x-ratelimit-limit"] = str(self.rate_limit)
+            headers["x-ratelimit-remaining"] = str(max(self.remaining[token], 0))
+            headers["x-ratelimit-reset"] = str(self.reset)
+        headers["ETag"] = etag
+
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def route(self, method, path, query, body):
+        """
+        :return: endpoint name, status code, payload and extra headers
+        """
+        not_found = {"message": "Not Found"}
+        if method == "POST" and path == "/graphql":
+            return "graphql", 200, self.graphql(body), dict()
+
+        match = re.fullmatch(r"/raw/([^/]+/[^/]+)/([^/]+)/(.+)", path)
+        if match:
+            repo = self.repos.get(match.group(1))
+            if repo is None or match.group(3) not in repo.files:
+                return "raw", 404, b"404: Not Found", dict()
+            return "raw", 200, repo.files[match.group(3)].encode(), dict()
+
+        match = re.fullmatch(r"/repos/([^/]+/[^/]+)(/.*)?", path)
+        repo = self.repos.get(match.group(1)) if match else None
+        if repo is None:
+            return "other", 404, not_found, dict()
+        rest = match.group(2) or ""
+
+        if rest == "":
+            return "repo", 200, self.repo_info(repo), dict()
+        if rest.startswith("/contents/"):
+            return ("contents",) + self.contents(repo, rest[len("/contents/") :])
+        if rest == "/git/refs/heads/main":
+            return "refs", 200, {"object": {"sha": repo.head, "type": "commit"}}, {}
+        if rest.startswith("/git/trees/"):
+            return ("trees",) + self.tree(repo, rest[len("/git/trees/") :], query)
+        if rest == "/tarball" or rest.startswith("/tarball/"):
+            headers = {"Content-Type": "application/x-gzip"}
+            return "tarball", 200, self.tarball(repo), headers
+        if rest == "/commits":
+            return ("commits",) + self.commits(repo, query, path)
+        if method == "POST" and rest == "/issues":
+            return ("issues",) + self.issue_tracker.create(repo.name, body)
+        return "other", 404, not_found, dict()
+
+    def repo_info(self, repo):
+        return {
+            "full_name": repo.name,
+            "default_branch": "main",
+            "created_at": repo.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "stargazers_count": len(repo.files),
+            "forks_count": len(repo.commit_dates) // 10,
+            "open_issues_count": 3,
+        }
+
+    def content_entry(self, repo, path):
+        return {
+            "name": path.split("/")[-1],
+            "path": path,
+            "sha": git_blob_sha(repo.files[path].encode()),
+            "type": "file",
+            "download_url": f"{self.url}/raw/{repo.name}/main/{path}",
+        }
+
+    def contents(self, repo, path):
+        if path in repo.files:
+            return 200, self.content_entry(repo, path), dict()
+        children = [
+            self.content_entry(repo, file_path)
+            for file_path in sorted(repo.files)
+            if file_path.startswith(path + "/")
+            and "/" not in file_path[len(path) + 1 :]
+        ]
+        if not children:
+            return 404, {"message": "Not Found"}, dict()
+        return 200, children, dict()
+
+    def tree(self, repo, sha, query):
+        recursive = "recursive" in query
+        directory = next(
+            (d for d in repo.directories() if repo.tree_sha(d) == sha), None
+        )
+        if directory is None:
+            return 404, {"message": "Not Found"}, dict()
+        entries = repo.tree_entries(directory, recursive)
+        # Only the full tree is too large to list recursively
+        truncated = recursive and repo.truncated and sha == repo.head
+        if truncated:
+            entries = entries[: len(entries) // 2]
+        return 200, {"sha": sha, "tree": entries, "truncated": truncated}, dict()
+
+    def commits(self, repo, query, path):
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        dates = repo.commit_dates
+        if "since" in query:
+            since = datetime.strptime(query["since"][0], "%Y-%m-%dT%H:%M:%SZ")
+            since = since.replace(tzinfo=timezone.utc)
+            dates = [date for date in dates if date >= since]
+        selected = dates[(page - 1) * per_page : page * per_page]
+        headers = dict()
+        if page * per_page < len(dates):
+            parameters = "&".join(
+                f"{name}={values[0]}"
+                for name, values in query.items()
+                if name != "page"
+            )
+            headers["Link"] = (
+                f'<{self.url}{path}?{parameters}&page={page + 1}>; rel="next"'
+            )
+        payload = [
+            {
+                "sha": hashlib.sha1(f"{repo.name} {date}".encode()).hexdigest(),
+                "commit": {"author": {"date": date.strftime("%Y-%m-%dT%H:%M:%SZ")}},
+            }
+            for date in selected
+        ]
+        return 200, payload, headers
+
+    def tarball(self, repo):
+        buffer = io.BytesIO()
+        prefix = f"{repo.name.replace('/', '-')}-{repo.head[:7]}"
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for directory in sorted(repo.directories()):
+                info = tarfile.TarInfo(f"{prefix}/{directory}".rstrip("/"))
+                info.type = tarfile.DIRTYPE
+                archive.addfile(info)
+            for path, content in sorted(repo.files.items()):
+                info = tarfile.TarInfo(f"{prefix}/{path}")
+                info.size = len(content.encode())
+                archive.addfile(info, io.BytesIO(content.encode()))
+        return buffer.getvalue()
+
+    def blob(self, repo, path):
+        if path not in repo.files:
+            return None
+        return {"text": repo.files[path], "isBinary": False, "isTruncated": False}
+
+    def graphql(self, body):
+        """
+        Answer the two query shapes GraphQLAutomationDownloader sends, based on
+        their variables: o<i>/n<i> name a repository, e<i>_<j> a blob expression.
+        """
+        variables = body.get("variables", dict())
+        data = dict()
+        i = 0
+        while f"o{i}" in variables:
+            repo = self.repos.get(f"{variables[f'o{i}']}/{variables[f'n{i}']}")
+            if repo is None:
+                data[f"r{i}"] = None
+            elif "workflows:" in body["query"]:
+                entries = [
+                    {
+                        "name": path.split("/")[-1],
+                        "path": path,
+                        "type": "blob",
+                        "object": self.blob(repo, path),
+                    }
+                    for path in sorted(repo.files)
+                    if path.startswith(".github/workflows/")
+                ]
+                data[f"r{i}"] = {
+                    "defaultBranchRef": {"name": "main", "target": {"oid": repo.head}},
+                    "workflows": {"entries": entries} if entries else None,
+                }
+            else:
+                data[f"r{i}"] = dict()
+                j = 0
+                while f"e{i}_{j}" in variables:
+                    path = variables[f"e{i}_{j}"].split(":", 1)[1]
+                    data[f"r{i}"][f"p{j}"] = self.blob(repo, path)
+                    j += 1
+            i += 1
+        return {"data": data}
@@ -1,10 +1,61 @@
+import copyreg
+import io
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
 import unittest
-from collections import defaultdict
-from unittest.mock import mock_open, patch
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from unittest.mock import AsyncMock, mock_open, patch
 
-from src.python.entities.Action import Invalid, Metadata, Run, Uses
-from src.python.extractor.Utilities import create_jobs_dict, process_commands
+import requests
+import yaml
+
+from src.python.entities.Action import Empty, Invalid, Metadata, Run, Uses
+from src.python.entities.RateLimitException import (RateLimitException,
+                                                    rate_limit_reset)
+from src.python.extractor.ArchiveDownloader import ArchiveAutomationDownloader
+from src.python.extractor.BlobStore import BlobStore, git_blob_sha, write_file
+from src.python.extractor.Corpus import pack_corpus
+from src.python.extractor.CrawlPlanner import CrawlPlanner, CrawlProgress
+from src.python.extractor.CrawlQueue import CrawlQueue, JobState
+from src.python.extractor.DeltaDownloader import (CrawlState,
+                                                  DeltaAutomationDownloader)
+from src.python.extractor.DownloadRouter import LanguageRouter
+from src.python.extractor.GitMirrorDownloader import (CatFile,
+                                                      GitMirrorDownloader)
+from src.python.extractor.GraphQLDownloader import GraphQLAutomationDownloader
+from src.python.extractor.HttpClient import HttpClient
+from src.python.extractor.RepositoryDownloader import AutomationDownloader
+from src.python.extractor.ResponseCache import (CachedResponse, ResponseCache,
+                                                migrate_pickle_cache, url_key)
+from src.python.extractor.TokenPool import TokenPool
+from src.python.extractor.TreeScanner import StreamingTree, filter_tree
+from src.python.extractor.Utilities import (CommandCache, bashlex_commands,
+                                            create_jobs_dict, download_files,
+                                            download_files_concurrently,
+                                            download_files_queued,
+                                            parse_commands, process_commands,
+                                            simple_commands, split_paths,
+                                            split_run)
 from src.python.extractor.WorkflowAnalyzer import AutomationExtractor
+from src.python.extractor.WorkflowLoader import (InvalidWorkflow,
+                                                 WorkflowLoader, load_yaml)
+from src.python.results.CommitActivity import CommitActivity
+from src.python.results.IssuePublisher import IssueLedger, IssuePublisher
+from src.python.results.IssueServer import IssueServer
+from src.python.tests.CrawlBenchmark import benchmark
+from src.python.tests.LegacyNormalizer import differences
+from src.python.tests.MockGitHubServer import MockGitHubServer, synthetic_repos
 
 
 class TestAutomationExtractor(unittest.TestCase):
@@ -52,9 +103,9 @@ class TestAutomationExtractor(unittest.TestCase):
                 run: pytest
         """,
     )
-    @patch("yaml.safe_load")
-    def test_analyze_workflow(self, mock_safe_load, mock_open):
-        mock_safe_load.return_value = {
+    @patch("src.python.extractor.WorkflowLoader.load_yaml")
+    def test_analyze_workflow(self, mock_load_yaml, mock_open):
+        mock_load_yaml.return_value = {
             "jobs": {
                 "test_job": {
                     "name": "Test Job",
@@ -96,6 +147,61 @@ class TestAutomationExtractor(unittest.TestCase):
         self.assertEqual(self.extractor.exceptions, 1)
 
 
+class TestActionFlyweights(unittest.TestCase):
+    def test_actions_are_shared(self):
+        self.assertIs(Run("mvn test -B"), Run("mvn test"))
+        self.assertIs(Uses("actions/checkout@v4"), Uses("actions/checkout@v3"))
+        self.assertIs(Empty(), Empty())
+        self.assertIs(pickle.loads(pickle.dumps(Run("mvn test"))), Run("mvn test"))
+        self.assertEqual(Run("npm run build --prod").run, "npm run build")
+        self.assertEqual(Run("npm run build").prefix, "npm run")
+        self.assertFalse(hasattr(Run("mvn test"), "__dict__"))
+        self.assertFalse(hasattr(Metadata("a", None, None, "b", None), "__dict__"))
+
+    def test_only_normalized_actions_are_kept(self):
+        Run("make lint")
+        kept = len(Run.by_key)
+        for i in range(100):
+            Run(f"make lint -j{i}")
+
+        self.assertEqual(len(Run.by_key), kept)
+        self.assertNotIn(
+            "make lint -j1",
+            [
+                key
+                for value in vars(Run).values()
+                if isinstance(value, dict)
+                for key in value
+            ],
+        )
+
+    def test_pickles_from_before_slots_load(self):
+        class LegacyPickler(pickle.Pickler):
+            # Pickles like before the actions and metadata had slots
+            def reducer_override(self, obj):
+                if isinstance(obj, Run):
+                    state = {
+                        "prefixes": Run.prefixes,
+                        "run": obj.run,
+                        "prefix": obj.prefix,
+                    }
+                elif isinstance(obj, Metadata):
+                    state = {name: getattr(obj, name) for name in Metadata.__slots__}
+                else:
+                    return NotImplemented
+                return copyreg.__newobj__, (type(obj),), state
+
+        metadata = Metadata("build", "Build", "Test", "ci.yml", "CI")
+        file = io.BytesIO()
+        LegacyPickler(file).dump({"owner/repo": [(Run("python -m pytest"), metadata)]})
+        [(run, loaded)] = pickle.loads(file.getvalue())["owner/repo"]
+
+        self.assertEqual(run, Run("python -m pytest"))
+        self.assertEqual(hash(run), hash(Run("python -m pytest")))
+        self.assertEqual(run.prefix, "python")
+        self.assertEqual(str(loaded), str(metadata))
+
+
 class TestCreateJobsDict(unittest.TestCase):
     @patch(
         "builtins.open",
@@ -181,3 +287,1314 @@ class TestSplitting(unittest.TestCase):
         cmds = "poetry run mvn clean"
         correct = ["poetry run", "mvn clean"]
         self.assertEqual(correct, process_commands(cmds))
+
+
+class FakeDownloader:
+    def __init__(self, results):
+        self.results = results
+        self.num_requests = 0
+        self.num_not_modified = 0
+        self.rate_limit_remaining = "unknown"
+        self.rate_limit_total = 5000
+        self.downloaded = []
+
+    def prepare(self, repos):
+        pass
+
+    def download_files(self, repo):
+        self.downloaded.append(repo)
+        self.num_requests += 1
+        result = self.results[repo]
+        if isinstance(result, list):
+            # A sequence of results for consecutive attempts
+            result = result.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class TestCompiledNormalizer(unittest.TestCase):
+    def test_matches_legacy_normalization(self):
+        heads = (
+            "mvn ./mvnw ./build/mvn mvnw poetry npm python3 python /usr/bin/python3 "
+            '. echo cd [[ ) fi } # (echo "${{ pre-commit git ruff tox - make'
+        ).split()
+        middles = [
+            "",
+            "run",
+            "run pytest",
+            "-B verify",
+            "clean install -DskipTests",
+            "-DskipTests=true package",
+            "test -Dx=1",
+            "$HOME/bin",
+            "-m pytest -x",
+            "install -r requirements.txt",
+            "compile;",
+            "run build --prod",
+            "a b c d e",
+        ]
+        commands = [
+            f"{prefix}{head} {middle}".rstrip() + ending
+            for prefix in ["", "sudo ", "xargs ", "sudo xargs ", "call ", "until "]
+            for head in heads
+            for middle in middles
+            for ending in ["", ";", " ;;"]
+        ]
+        for repo in synthetic_repos(20).values():
+            for content in repo.files.values():
+                for line in content.splitlines():
+                    if "run:" in line:
+                        commands.extend(split_run(line.split("run:", 1)[1]))
+
+        self.assertEqual(differences(commands), [])
+
+
+class TestSplitRun(unittest.TestCase):
+    def test_simple_blocks_skip_bashlex(self):
+        blocks = [
+            "pip install -r requirements.txt",
+            "mvn -B package --file pom.xml\n\n./gradlew build --info\n",
+            "FOO=bar make -j4   all\nnpm ci",
+            "export PATH=/usr/local/bin:$PATH",
+            "if true; then make; fi",
+            "time make",
+            "cat a | grep b && echo 'done'",
+        ]
+        simple = [block for block in blocks if simple_commands(block) is not None]
+        self.assertEqual(len(simple), 3)
+        for block in simple:
+            self.assertEqual(simple_commands(block), bashlex_commands(block))
+
+        paths = Counter(split_paths)
+        with patch("src.python.extractor.Utilities.bashlex.parse") as mock_parse:
+            for block in simple:
+                split_run(block)
+        mock_parse.assert_not_called()
+        self.assertEqual((split_paths - paths)["simple"], 3)
+
+    @patch("src.python.extractor.Utilities.BASHLEX_TIMEOUT", 0.05)
+    def test_slow_and_large_scripts_use_the_regular_expression(self):
+        script = "if true; then mvn test && pip install x; fi"
+        expected = ["if true; then mvn test", "pip install x; fi"]
+        paths = Counter(split_paths)
+        with patch(
+            "src.python.extractor.Utilities.bashlex.parse",
+            side_effect=lambda script: time.sleep(5),
+        ):
+            self.assertEqual(split_run(script), expected)
+        with patch("src.python.extractor.Utilities.MAX_BASHLEX_SIZE", 10):
+            self.assertEqual(split_run(script), expected)
+        self.assertEqual((split_paths - paths)["timeout"], 1)
+        self.assertEqual((split_paths - paths)["oversized"], 1)
+
+
+class TestCommandCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "commands.sqlite")
+        self.run = "pip install -r requirements.txt\npython -m pytest\n"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_memoizes_in_memory_and_on_disk(self):
+        cache = CommandCache(self.cache_path, max_size=1)
+        first = cache.process(self.run)
+        first.append("changed by the caller")
+        self.assertEqual(cache.process(self.run), parse_commands(self.run))
+        cache.process("mvn -B package --file pom.xml")
+        cache.close()
+        self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (1, 0, 2))
+
+        # Another run, or worker process, reads the results of the first
+        cache = CommandCache(self.cache_path)
+        with patch("src.python.extractor.Utilities.parse_commands") as mock_parse:
+            self.assertEqual(cache.process(self.run), parse_commands(self.run))
+        cache.close()
+        mock_parse.assert_not_called()
+        self.assertEqual(cache.disk_hits, 1)
+
+    def test_other_rules_version_is_not_used(self):
+        cache = CommandCache(self.cache_path, version="old")
+        cache.process(self.run)
+        cache.close()
+
+        cache = CommandCache(self.cache_path)
+        cache.process(self.run)
+        cache.close()
+        self.assertEqual((cache.disk_hits, cache.misses), (0, 1))
+
+
+class TestConcurrentDownload(unittest.TestCase):
+    def test_download_files_concurrently(self):
+        downloader = FakeDownloader({"a/pom": (2, 1), "b/nopom": (0, 3)})
+        no_poms = download_files_concurrently(
+            ["a/pom\n", "b/nopom"], [downloader], concurrency=4
+        )
+
+        self.assertEqual(no_poms, {"b/nopom"})
+        self.assertCountEqual(downloader.downloaded, ["a/pom", "b/nopom"])
+
+    def test_runs_as_many_threads_as_concurrency(self):
+        repos = [f"owner/repo{i}" for i in range(64)]
+        downloader = FakeDownloader({repo: (1, 1) for repo in repos})
+        # Every download waits until all 64 are running at the same time
+        barrier = threading.Barrier(64, timeout=10)
+        download = downloader.download_files
+
+        def download_together(repo):
+            barrier.wait()
+            return download(repo)
+
+        downloader.download_files = download_together
+        download_files_concurrently(repos, [downloader], concurrency=64)
+
+        self.assertCountEqual(downloader.downloaded, repos)
+
+    def test_rate_limit_stops_crawl(self):
+        downloader = FakeDownloader(
+            {"a/limited": RateLimitException("limited"), "b/skipped": (1, 1)}
+        )
+        download_files_concurrently(["a/limited", "b/skipped"], [downloader], 1)
+
+        self.assertEqual(downloader.downloaded, ["a/limited"])
+
+
+class TestLanguageRouter(unittest.TestCase):
+    def test_repos_go_to_their_language_only(self):
+        java = FakeDownloader({"a/java": (2, 1), "c/both": (1, 1)})
+        python = FakeDownloader({"b/python": (0, 2), "c/both": (0, 1)})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, repos in [
+                ("java", "a/java\nc/both\n"),
+                ("py", "b/python\nc/both"),
+            ]:
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write(repos)
+            router = LanguageRouter.from_files(
+                {"java": java, "python": python},
+                {
+                    "java": os.path.join(tmp_dir, "java"),
+                    "python": os.path.join(tmp_dir, "py"),
+                },
+            )
+
+        no_poms = download_files_concurrently(
+            ["a/java", "b/python", "c/both", "d/unknown"], [router], concurrency=2
+        )
+
+        self.assertCountEqual(java.downloaded, ["a/java", "c/both"])
+        self.assertCountEqual(python.downloaded, ["b/python", "c/both"])
+        self.assertEqual(router.num_requests, 4)
+        self.assertEqual(router.num_unknown, 1)
+        self.assertEqual(no_poms, {"b/python", "c/both", "d/unknown"})
+
+
+def make_response(url, status_code=200, content=b"{}", headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_put_and_get(self):
+        url = "https://api.github.com/repos/owner/repo"
+        response = make_response(
+            url,
+            content=b'{"default_branch": "main"}',
+            headers={"ETag": '"abc"', "Set-Cookie": "dropped"},
+        )
+        self.cache.put(url, response)
+
+        cached = self.cache.get(url)
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.json(), {"default_branch": "main"})
+        self.assertEqual(cached.headers["etag"], '"abc"')
+        self.assertNotIn("Set-Cookie", cached.headers)
+        self.assertIsNone(self.cache.get(url + "/other"))
+
+    def test_migrate_both_layouts(self):
+        new_url = "https://api.github.com/repos/owner/new"
+        old_url = "https://api.github.com/repos/owner/old"
+        with open(
+            os.path.join(self.tmp_dir.name, url_key(new_url) + ".pkl"), "wb"
+        ) as f:
+            pickle.dump(make_response(new_url, content=b"new"), f)
+        with open(
+            os.path.join(self.tmp_dir.name, old_url.replace("/", "*") + ".pkl"), "wb"
+        ) as f:
+            pickle.dump(make_response(old_url, 404, b"old"), f)
+
+        self.assertEqual(migrate_pickle_cache(self.tmp_dir.name, self.cache), 2)
+        self.assertEqual(self.cache.get(new_url).content, b"new")
+        self.assertEqual(self.cache.get(old_url).status_code, 404)
+
+    def test_evicts_least_recently_used_beyond_max_size(self):
+        cache = ResponseCache(self.tmp_dir.name, "small.sqlite", max_size=3000)
+        urls = [f"https://api.github.com/repos/owner/repo{i}" for i in range(4)]
+        for url in urls[:3]:
+            cache.put(url, make_response(url, content=os.urandom(900)))
+        cache.get(urls[0])
+        cache.put(urls[3], make_response(urls[3], content=os.urandom(900)))
+
+        self.assertIn(urls[0], cache)
+        self.assertNotIn(urls[1], cache)
+        self.assertIn(urls[3], cache)
+        self.assertLessEqual(cache.size, 3000)
+        cache.close()
+
+    def test_lookup_does_not_block_other_writers(self):
+        url = "https://api.github.com/repos/owner/repo"
+        self.cache.put(url, make_response(url))
+        self.cache.get(url)
+
+        other = sqlite3.connect(self.cache.path, timeout=0)
+        other.execute("BEGIN IMMEDIATE")
+        other.rollback()
+        other.close()
+
+    def test_expired_entries_are_marked_and_collected(self):
+        repo_url = "https://api.github.com/repos/owner/repo"
+        tree_url = f"https://api.github.com/repos/owner/repo/git/trees/{'a' * 40}"
+        stored_at = time.time() - 2 * 24 * 60 * 60
+        for url in [repo_url, tree_url]:
+            self.cache.put_cached(
+                url_key(url),
+                CachedResponse.from_response(make_response(url), url),
+                stored_at,
+            )
+
+        self.assertTrue(self.cache.get(repo_url).expired)
+        self.assertFalse(self.cache.get(tree_url).expired)
+        self.assertEqual(self.cache.gc(), 1)
+        self.assertNotIn(repo_url, self.cache)
+
+    def test_hit_rate_persists_across_runs(self):
+        url = "https://api.github.com/repos/owner/repo"
+        self.cache.put(url, make_response(url))
+        self.cache.get(url)
+        self.cache.get(url + "/missing")
+        self.cache.close()
+
+        self.cache = ResponseCache(self.tmp_dir.name)
+        self.cache.get(url)
+        _, hits, misses = self.cache.stats()
+        self.assertEqual((hits, misses), (2, 1))
+
+
+class TestRevalidation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name)
+        self.url = "https://api.github.com/repos/owner/repo"
+        self.cache.put(
+            self.url, make_response(self.url, content=b"old", headers={"ETag": '"v1"'})
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    @patch("src.python.extractor.RepositoryDownloader.http_client.get")
+    def test_cached_response_served_without_refresh(self, mock_get):
+        downloader = AutomationDownloader(self.tmp_dir.name, cache=self.cache)
+
+        self.assertEqual(downloader.send_request(self.url).content, b"old")
+        mock_get.assert_not_called()
+
+    @patch("src.python.extractor.RepositoryDownloader.http_client.get")
+    def test_not_modified_keeps_cached_response(self, mock_get):
+        mock_get.return_value = make_response(self.url, 304, b"")
+        downloader = AutomationDownloader(
+            self.tmp_dir.name, cache=self.cache, refresh=True
+        )
+
+        self.assertEqual(downloader.send_request(self.url).content, b"old")
+        self.assertEqual(downloader.send_request(self.url).content, b"old")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        self.assertEqual(downloader.num_not_modified, 1)
+
+    @patch("src.python.extractor.RepositoryDownloader.http_client.get")
+    def test_expired_response_is_revalidated(self, mock_get):
+        mock_get.return_value = make_response(self.url, 304, b"")
+        self.cache.put_cached(
+            url_key(self.url),
+            CachedResponse(self.url, 200, {"etag": '"v1"'}, b"old"),
+            time.time() - 2 * 24 * 60 * 60,
+        )
+        downloader = AutomationDownloader(self.tmp_dir.name, cache=self.cache)
+
+        self.assertEqual(downloader.send_request(self.url).content, b"old")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertFalse(self.cache.get(self.url).expired)
+
+    @patch("src.python.extractor.RepositoryDownloader.http_client.get")
+    def test_modified_replaces_cached_response(self, mock_get):
+        mock_get.return_value = make_response(self.url, content=b"new")
+        downloader = AutomationDownloader(
+            self.tmp_dir.name, cache=self.cache, refresh=True
+        )
+
+        self.assertEqual(downloader.send_request(self.url).content, b"new")
+        self.assertEqual(self.cache.get(self.url).content, b"new")
+
+
+class TestGraphQLDownloader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name)
+        self.downloader = GraphQLAutomationDownloader(
+            os.path.join(self.tmp_dir.name, "output"), verbose=False, cache=self.cache
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def blob(self, text):
+        return {"text": text, "isBinary": False, "isTruncated": False}
+
+    def test_batch_discovery_writes_rest_layout(self):
+        workflows = {
+            "defaultBranchRef": {"name": "main", "target": {"oid": "abc"}},
+            "workflows": {
+                "entries": [
+                    {
+                        "name": "ci.yml",
+                        "path": ".github/workflows/ci.yml",
+                        "type": "blob",
+                        "object": self.blob("on: push"),
+                    },
+                    {
+                        "name": "README.md",
+                        "path": ".github/workflows/README.md",
+                        "type": "blob",
+                        "object": self.blob("readme"),
+                    },
+                ]
+            },
+        }
+        responses = [
+            {"data": {"r0": workflows, "r1": None}},
+            {"data": {"r0": {"p0": self.blob("<project/>")}}},
+        ]
+        pom_files = [{"path": "module/pom.xml"}]
+        self.downloader.prepare(["owner/repo", "owner/missing"])
+
+        with patch.object(
+            self.downloader, "send_graphql", side_effect=responses
+        ), patch.object(
+            self.downloader, "search_tree_for_pom_files", return_value=pom_files
+        ), patch.object(
+            AutomationDownloader, "download_files", return_value=(0, 0)
+        ) as rest_download:
+            self.assertEqual(self.downloader.download_files("owner/repo"), (1, 1))
+            self.assertEqual(self.downloader.download_files("owner/missing"), (0, 0))
+
+        repo_path = os.path.join(self.tmp_dir.name, "output", "owner", "repo")
+        with open(os.path.join(repo_path, "ci.yml")) as f:
+            self.assertEqual(f.read(), "on: push")
+        with open(os.path.join(repo_path, "module", "pom.xml")) as f:
+            self.assertEqual(f.read(), "<project/>")
+        self.assertFalse(os.path.exists(os.path.join(repo_path, "README.md")))
+        rest_download.assert_called_once_with("owner/missing")
+
+    def test_batches_are_discovered_concurrently(self):
+        repos = ["owner/a", "owner/b", "owner/c"]
+        self.downloader.batch_size = 2
+        self.downloader.prepare(repos)
+        # Both queries have to be in flight at the same time to get an answer
+        barrier = threading.Barrier(2, timeout=10)
+        queries = []
+
+        def send_graphql(query, variables):
+            queries.append(variables)
+            barrier.wait()
+            return {"data": dict()}
+
+        with patch.object(self.downloader, "send_graphql", side_effect=send_graphql):
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                discovered = list(executor.map(self.downloader.discover, repos))
+
+        self.assertEqual(discovered, [None, None, None])
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(self.downloader.in_discovery, dict())
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name)
+        self.blob_store = BlobStore(os.path.join(self.tmp_dir.name, "blobs"))
+        self.downloader = AutomationDownloader(
+            os.path.join(self.tmp_dir.name, "output"),
+            cache=self.cache,
+            blob_store=self.blob_store,
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_git_blob_sha(self):
+        # Same SHA as `git hash-object` on a file containing "hello\n"
+        self.assertEqual(
+            git_blob_sha(b"hello\n"), "ce013625030ba8dba906f756967f9e9ca394464a"
+        )
+
+    def test_recrawl_without_store_does_not_change_blobs(self):
+        output = os.path.join(self.tmp_dir.name, "output")
+        first, second = os.path.join(output, "a", "x.yml"), os.path.join(
+            output, "b", "x.yml"
+        )
+        write_file(first, b"on: push", self.blob_store)
+        write_file(second, b"on: push", self.blob_store)
+        write_file(first, b"CHANGED")
+
+        with open(first, "rb") as f:
+            self.assertEqual(f.read(), b"CHANGED")
+        with open(second, "rb") as f:
+            self.assertEqual(f.read(), b"on: push")
+        with open(self.blob_store.path(git_blob_sha(b"on: push")), "rb") as f:
+            self.assertEqual(f.read(), b"on: push")
+
+    def test_identical_blob_downloaded_once(self):
+        content = b"on: push\n"
+        sha = git_blob_sha(content)
+        with patch.object(
+            self.downloader,
+            "send_request",
+            return_value=make_response("url", content=content),
+        ) as send_request:
+            self.downloader.download_file("url", "a/one/ci.yml", sha=sha)
+            self.downloader.download_file("url", "b/two/ci.yml", sha=sha)
+
+        self.assertEqual(send_request.call_count, 1)
+        first = os.path.join(self.tmp_dir.name, "output", "a/one/ci.yml")
+        second = os.path.join(self.tmp_dir.name, "output", "b/two/ci.yml")
+        with open(second, "rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertTrue(os.path.samefile(first, second))
+
+    def test_extractor_parses_identical_workflows_once(self):
+        extractor = AutomationExtractor(self.tmp_dir.name)
+        for repo in ["a/one", "b/two"]:
+            path = os.path.join(self.tmp_dir.name, repo.replace("/", "_") + ".yml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("jobs:\n  build:\n    steps:\n      - run: mvn test\n")
+            with patch(
+                "src.python.extractor.WorkflowLoader.load_yaml", wraps=load_yaml
+            ) as mock_load_yaml:
+                extractor.analyze_workflow(repo, path)
+            self.assertEqual(mock_load_yaml.call_count, 1 if repo == "a/one" else 0)
+
+        self.assertEqual(
+            set(extractor.automations_dict[Run("mvn test")]), {"a/one", "b/two"}
+        )
+
+
+class TestCrawlQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue = CrawlQueue(os.path.join(self.tmp_dir.name, "queue.sqlite"))
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp_dir.cleanup()
+
+    def test_resumes_pending_repos_only(self):
+        self.queue.add(["a/done", "b/pending", "c/failed"])
+        self.queue.mark("a/done", JobState.DOWNLOADED, 1, 1)
+        self.queue.mark("c/failed", JobState.FAILED, error="boom")
+        self.queue.add(["a/done", "d/new"])
+
+        self.assertEqual(self.queue.pending(), ["b/pending", "d/new"])
+        self.assertEqual(self.queue.state("a/done"), JobState.DOWNLOADED)
+
+    @patch("src.python.extractor.Utilities.asyncio.sleep", new_callable=AsyncMock)
+    def test_waits_for_rate_limit_reset_and_continues(self, mock_sleep):
+        downloader = FakeDownloader(
+            {
+                "a/pom": [
+                    RateLimitException("limited", reset=time.time() + 30),
+                    (1, 1),
+                ],
+                "b/nopom": (0, 2),
+                "c/broken": KeyError("x"),
+            }
+        )
+        self.queue.add(["a/pom", "b/nopom", "c/broken"])
+
+        no_poms = download_files_queued(self.queue, [downloader])
+
+        mock_sleep.assert_awaited_once()
+        self.assertGreater(mock_sleep.await_args.args[0], 25)
+        self.assertEqual(no_poms, {"b/nopom"})
+        self.assertEqual(self.queue.state("a/pom"), JobState.DOWNLOADED)
+        self.assertEqual(self.queue.state("c/broken"), JobState.FAILED)
+        self.assertEqual(self.queue.totals(), (3, 1, 3))
+        self.assertEqual(self.queue.pending(), [])
+
+    @patch("src.python.extractor.Utilities.asyncio.sleep", new_callable=AsyncMock)
+    def test_gives_up_on_repeated_rate_limits(self, mock_sleep):
+        limited = RateLimitException("limited", reset=time.time() + 30)
+        downloader = FakeDownloader({"a/blocked": [limited] * 5 + [(1, 1)]})
+        self.queue.add(["a/blocked"])
+
+        download_files_queued(self.queue, [downloader])
+
+        self.assertEqual(mock_sleep.await_count, 4)
+        self.assertEqual(self.queue.state("a/blocked"), JobState.FAILED)
+
+
+class TokenStandInHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the GitHub API where token "spent" has no budget left and
+    /blocked is forbidden to every token
+    """
+
+    budgets = {"token spent": 0, "token fresh": 100}
+    blocked = "/blocked"
+    seen_tokens = []
+
+    def do_GET(self):
+        authorization = self.headers.get("Authorization")
+        self.seen_tokens.append(authorization)
+        remaining = self.budgets[authorization]
+        self.send_response(200 if remaining > 0 and self.path != self.blocked else 403)
+        self.send_header("x-ratelimit-limit", "5000")
+        self.send_header("x-ratelimit-remaining", str(max(remaining - 1, 0)))
+        self.send_header("x-ratelimit-reset", str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(b"{}")
+        if remaining > 0:
+            self.budgets[authorization] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTokenPool(unittest.TestCase):
+    def test_acquire_prefers_most_remaining(self):
+        pool = TokenPool(["a", "b"])
+        pool.update("a", {"x-ratelimit-remaining": "10"})
+        pool.update("b", {"x-ratelimit-remaining": "20"})
+
+        self.assertEqual(pool.acquire(), "b")
+        self.assertEqual(pool.remaining(), 29)
+
+    def test_exhausted_pool_raises_with_reset(self):
+        pool = TokenPool(["a"])
+        pool.exhaust("a", time.time() + 100)
+
+        with self.assertRaises(RateLimitException) as context:
+            pool.acquire()
+        self.assertGreater(context.exception.reset, time.time())
+
+    def test_reset_from_retry_after_date(self):
+        reset = time.time() + 120
+        date = formatdate(reset, usegmt=True)
+
+        self.assertAlmostEqual(rate_limit_reset({"retry-after": date}), reset, delta=1)
+        self.assertEqual(
+            rate_limit_reset({"retry-after": "soon", "x-ratelimit-reset": "42"}), 42
+        )
+
+    def test_routes_around_spent_token(self):
+        server = HTTPServer(("127.0.0.1", 0), TokenStandInHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        tmp_dir = tempfile.TemporaryDirectory()
+        cache = ResponseCache(tmp_dir.name)
+        try:
+            pool = TokenPool(["spent", "fresh"])
+            # Both budgets are unknown, so the first request goes to the spent token
+            downloader = AutomationDownloader(
+                tmp_dir.name, cache=cache, token_pool=pool
+            )
+            url = f"http://127.0.0.1:{server.server_port}"
+            for i in range(3):
+                self.assertEqual(downloader.send_request(f"{url}/{i}").status_code, 200)
+
+            self.assertEqual(downloader.num_requests, 3)
+            self.assertEqual(TokenStandInHandler.seen_tokens.count("token spent"), 1)
+            self.assertEqual(pool.state("spent").remaining, 0)
+
+            # Forbidden despite budget left, so not a rate limit to wait out
+            self.assertEqual(downloader.send_request(f"{url}/blocked").status_code, 403)
+        finally:
+            server.shutdown()
+            server.server_close()
+            cache.close()
+            tmp_dir.cleanup()
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Answers /flaky with a 503 first, /slow after a delay and every POST with a
+    503, counting requests
+    """
+
+    hits = defaultdict(int)
+    authorizations = set()
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        self.authorizations.add(self.headers.get("Authorization"))
+        if self.path == "/flaky" and self.hits[self.path] == 1:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+        else:
+            if self.path == "/slow":
+                time.sleep(0.3)
+            self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def do_POST(self):
+        self.hits[self.path] += 1
+        self.send_response(503)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"no")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        FlakyHandler.hits.clear()
+        FlakyHandler.authorizations.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.client = HttpClient(backoff=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_with_retry_after(self):
+        response = self.client.get(f"{self.url}/flaky")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FlakyHandler.hits["/flaky"], 2)
+        self.assertEqual(self.client.num_retries, 1)
+
+    def test_does_not_resend_post(self):
+        response = self.client.post(f"{self.url}/issues", json={"title": "x"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(FlakyHandler.hits["/issues"], 1)
+        self.assertEqual(self.client.num_retries, 0)
+
+    def test_coalesces_concurrent_requests(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(
+                executor.map(lambda _: self.client.get(f"{self.url}/slow"), range(4))
+            )
+
+        self.assertTrue(all(response.content == b"ok" for response in responses))
+        self.assertEqual(FlakyHandler.hits["/slow"], 4 - self.client.num_coalesced)
+        self.assertGreater(self.client.num_coalesced, 0)
+
+    def test_does_not_coalesce_requests_of_other_tokens(self):
+        tokens = ["token a", "token b"] * 2
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(
+                executor.map(
+                    lambda token: self.client.get(
+                        f"{self.url}/slow", headers={"Authorization": token}
+                    ),
+                    tokens,
+                )
+            )
+
+        self.assertLessEqual({"token a", "token b"}, FlakyHandler.authorizations)
+        self.assertEqual(FlakyHandler.hits["/slow"], 4 - self.client.num_coalesced)
+
+
+def read_tree(path):
+    files = dict()
+    for root, _, names in os.walk(path):
+        for name in names:
+            file_path = os.path.join(root, name)
+            with open(file_path, "rb") as f:
+                files[os.path.relpath(file_path, path)] = f.read()
+    return files
+
+
+class TestMockGitHubServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repos = synthetic_repos(8)
+        self.server = MockGitHubServer(self.repos, rate_limit=10**6).start()
+        self.env = patch.dict(os.environ, {"GITHUB_API_URL": self.server.url})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.server.stop()
+        self.tmp_dir.cleanup()
+
+    def crawl(self, downloader_class, name):
+        save_path = os.path.join(self.tmp_dir.name, name)
+        downloader = downloader_class(
+            save_path,
+            verbose=False,
+            cache=ResponseCache(os.path.join(self.tmp_dir.name, name + "_requests")),
+            token_pool=TokenPool(["token"]),
+        )
+        downloader.prepare(list(self.repos))
+        for repo in self.repos:
+            downloader.download_files(repo)
+        downloader.cache.close()
+        return read_tree(save_path)
+
+    def test_rest_and_graphql_crawls_match(self):
+        rest = self.crawl(AutomationDownloader, "rest")
+        graphql = self.crawl(GraphQLAutomationDownloader, "graphql")
+
+        self.assertTrue(any(path.endswith("pom.xml") for path in rest))
+        self.assertEqual(rest, graphql)
+        self.assertGreater(self.server.requests["graphql"], 0)
+
+    def test_archive_crawl_matches_rest_crawl(self):
+        rest = self.crawl(AutomationDownloader, "rest")
+        archive = self.crawl(ArchiveAutomationDownloader, "archive")
+
+        self.assertEqual(rest, archive)
+        self.assertEqual(self.server.requests["tarball"], len(self.repos))
+        self.assertEqual(self.server.requests["raw"], len(rest))
+
+        # A warm run takes the files of the unchanged heads from the cache
+        self.assertEqual(self.crawl(ArchiveAutomationDownloader, "archive"), rest)
+        self.assertEqual(self.server.requests["tarball"], len(self.repos))
+
+    def test_truncated_tree_is_searched_per_sub_tree(self):
+        repo = self.repos["owner0/repo0"]
+        repo.truncated = True
+        downloader = AutomationDownloader(
+            os.path.join(self.tmp_dir.name, "truncated"),
+            verbose=False,
+            cache=ResponseCache(self.tmp_dir.name),
+            token_pool=TokenPool(["token"]),
+        )
+
+        pom_files = downloader.search_for_pom_files(repo.name)
+        downloader.cache.close()
+
+        self.assertEqual(
+            sorted(pom_file["path"] for pom_file in pom_files),
+            sorted(path for path in repo.files if path.endswith("pom.xml")),
+        )
+
+    def test_delta_crawl_downloads_changed_files_only(self):
+        state = CrawlState(os.path.join(self.tmp_dir.name, "state.sqlite"))
+        save_path = os.path.join(self.tmp_dir.name, "delta")
+
+        def crawl():
+            downloader = DeltaAutomationDownloader(
+                save_path,
+                state=state,
+                verbose=False,
+                cache=ResponseCache(self.tmp_dir.name),
+                token_pool=TokenPool(["token"]),
+            )
+            for repo in self.repos:
+                downloader.download_files(repo)
+            downloader.cache.close()
+            with open(downloader.write_manifest()) as f:
+                return json.load(f)
+
+        self.assertEqual(set(crawl()["repos"]), set(self.repos))
+        self.assertEqual(crawl()["repos"], {})
+
+        repo = next(repo for repo in self.repos.values() if "pom.xml" in repo.files)
+        workflow = next(path for path in repo.files if path.startswith(".github"))
+        repo.files[workflow] += "# changed\n"
+        del repo.files["pom.xml"]
+        repo.head = "0" * 40
+        raw_before = self.server.requests["raw"]
+        manifest = crawl()
+        state.close()
+
+        self.assertEqual(list(manifest["repos"]), [repo.name])
+        changes = manifest["repos"][repo.name]
+        self.assertEqual(changes["modified"], [os.path.join(repo.name, workflow[18:])])
+        self.assertEqual(changes["removed"], [os.path.join(repo.name, "pom.xml")])
+        self.assertEqual(self.server.requests["raw"] - raw_before, 1)
+        self.assertFalse(os.path.exists(os.path.join(save_path, repo.name, "pom.xml")))
+
+    def test_delta_crawl_keeps_files_when_head_lookup_fails(self):
+        state = CrawlState(os.path.join(self.tmp_dir.name, "state.sqlite"))
+        save_path = os.path.join(self.tmp_dir.name, "delta")
+        downloader = DeltaAutomationDownloader(
+            save_path,
+            state=state,
+            verbose=False,
+            cache=ResponseCache(self.tmp_dir.name),
+            token_pool=TokenPool(["token"]),
+        )
+        repo = next(repo for repo in self.repos.values() if "pom.xml" in repo.files)
+        counts = downloader.download_files(repo.name)
+        files_before = read_tree(save_path)
+        head_before = state.head(save_path, repo.name)
+        downloader.changes.clear()
+
+        send_request = downloader.send_request
+        repo_url = f"{downloader.api_url}/repos/{repo.name}"
+        with patch.object(
+            downloader,
+            "send_request",
+            side_effect=lambda url, *args, **kwargs: (
+                make_response(url, 503)
+                if url == repo_url
+                else send_request(url, *args, **kwargs)
+            ),
+        ):
+            self.assertEqual(downloader.download_files(repo.name), counts)
+        downloader.cache.close()
+
+        self.assertEqual(read_tree(save_path), files_before)
+        self.assertEqual(state.head(save_path, repo.name), head_before)
+        self.assertNotIn(repo.name, downloader.changes)
+        state.close()
+
+    def test_plan_matches_crawl(self):
+        cache = ResponseCache(self.tmp_dir.name)
+        planner = CrawlPlanner(cache)
+        cold_plans = planner.plan(list(self.repos))
+        downloader = AutomationDownloader(
+            os.path.join(self.tmp_dir.name, "planned"),
+            verbose=False,
+            cache=cache,
+            token_pool=TokenPool(["token"]),
+        )
+        progress = CrawlProgress(len(self.repos), interval=0)
+        with patch("builtins.print") as mock_print:
+            download_files(list(self.repos), [downloader], progress)
+        warm_plans = planner.plan(list(self.repos))
+
+        # Without the contents of a pom.xml, its contents call and download remain
+        repo = next(repo for repo in self.repos.values() if "pom.xml" in repo.files)
+        cache.connection.execute(
+            "DELETE FROM responses WHERE key = ?",
+            (url_key(f"{planner.api_url}/repos/{repo.name}/contents/pom.xml"),),
+        )
+        [pom_plan] = planner.plan([repo.name])
+        cache.close()
+        self.assertEqual(pom_plan.remaining, 2)
+        self.assertEqual(pom_plan.estimated, 0)
+
+        self.assertTrue(all(plan.cached == 0 for plan in cold_plans))
+        self.assertGreater(sum(plan.estimated for plan in cold_plans), 0)
+        self.assertEqual(sum(plan.requests for plan in warm_plans), 0)
+        self.assertEqual(
+            sum(plan.cached for plan in warm_plans), downloader.num_requests
+        )
+        self.assertTrue(
+            any("Progress: 8/8" in str(call) for call in mock_print.call_args_list)
+        )
+
+    def test_commit_activity_covers_all_pages(self):
+        activity = CommitActivity(requests.get, since=datetime(2000, 1, 1))
+        commits_per_month = activity.collect(list(self.repos))
+        for name, repo in self.repos.items():
+            dates = [date.replace(tzinfo=None) for date in repo.commit_dates]
+            if not dates:
+                self.assertEqual(commits_per_month[name], 0)
+                continue
+            months = max((datetime.utcnow() - min(dates)).days / 30, 1)
+            self.assertAlmostEqual(commits_per_month[name], len(dates) / months)
+        # One request per 100 commits, instead of only the first 30 commits
+        self.assertEqual(
+            self.server.requests["commits"],
+            sum(
+                max(-(-len(repo.commit_dates) // 100), 1)
+                for repo in self.repos.values()
+            ),
+        )
+
+        capped = CommitActivity(requests.get, since=datetime(2000, 1, 1), max_pages=1)
+        name = max(self.repos, key=lambda name: len(self.repos[name].commit_dates))
+        self.assertEqual(len(capped.commit_dates(name)), 100)
+
+    def test_benchmark_warm_run_is_served_from_cache(self):
+        results = benchmark("serial", self.server, list(self.repos), self.tmp_dir.name)
+
+        self.assertGreater(results["cold"]["requests"], 0)
+        self.assertEqual(results["warm"]["requests"], 0)
+        self.assertEqual(results["warm"]["cache_hit_rate"], 1)
+
+
+class TestTreeScanner(unittest.TestCase):
+    def setUp(self):
+        self.tree = {
+            "sha": "abc",
+            "url": "https://api.github.com/repos/owner/repo/git/trees/abc",
+            "tree": [
+                {"path": "module", "type": "tree", "sha": "1"},
+                {"path": "module/pom.xml", "type": "blob", "sha": "2", "size": 10},
+                {"path": "pom.xml", "type": "blob", "sha": "3", "size": 12},
+                {"path": "src/Main.java", "type": "blob", "sha": "4", "size": 1},
+            ],
+            "truncated": True,
+        }
+        body = json.dumps(self.tree, indent=1).encode()
+        # Chunks that split entries, keys and literals
+        self.chunks = [body[i : i + 7] for i in range(0, len(body), 7)]
+
+    def test_streams_entries_and_keys(self):
+        tree = StreamingTree(self.chunks)
+
+        self.assertEqual(list(tree.entries()), self.tree["tree"])
+        self.assertEqual(tree.sha, "abc")
+        self.assertTrue(tree.truncated)
+
+    def test_filter_keeps_pom_files_and_stops_at_gradle(self):
+        self.assertEqual(
+            [entry["path"] for entry in filter_tree(self.chunks)["tree"]],
+            ["module/pom.xml", "pom.xml"],
+        )
+
+        self.tree["tree"].insert(1, {"path": "build.gradle", "type": "blob"})
+        body = json.dumps(self.tree).encode()
+        # The rest of the body is never read
+        cut = body[: body.index(b"build.gradle") + 40]
+
+        self.assertEqual(filter_tree([cut])["tree"][0]["path"], "build.gradle")
+
+
+def make_git_repo(path, files):
+    os.makedirs(path)
+    for file_path, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(path, file_path)), exist_ok=True)
+        with open(os.path.join(path, file_path), "w") as f:
+            f.write(content)
+    git = ["git", "-C", path, "-c", "user.name=test", "-c", "user.email=test@test"]
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-qm", "initial"], check=True)
+
+
+class TestGitMirrorDownloader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.mirrors = os.path.join(self.tmp_dir.name, "mirrors")
+        self.save_path = os.path.join(self.tmp_dir.name, "output")
+        self.downloader = GitMirrorDownloader(
+            self.save_path, self.mirrors, verbose=False
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reads_files_from_bare_clone(self):
+        source = os.path.join(self.tmp_dir.name, "source")
+        make_git_repo(
+            source,
+            {
+                ".github/workflows/ci.yml": "name: CI\n",
+                ".github/workflows/README.md": "docs\n",
+                "pom.xml": "<project/>\n",
+                "module/pom.xml": "<project>module</project>\n",
+            },
+        )
+        subprocess.run(
+            ["git", "clone", "-q", "--bare", source, f"{self.mirrors}/owner/repo.git"],
+            check=True,
+        )
+
+        self.assertEqual(self.downloader.download_files("owner/repo"), (2, 1))
+        self.assertEqual(
+            read_tree(self.save_path),
+            {
+                os.path.join("owner", "repo", "ci.yml"): b"name: CI\n",
+                os.path.join("owner", "repo", "pom.xml"): b"<project/>\n",
+                os.path.join("owner", "repo", "module", "pom.xml"): (
+                    b"<project>module</project>\n"
+                ),
+            },
+        )
+
+    def test_gradle_and_missing_repos_are_skipped(self):
+        make_git_repo(
+            os.path.join(self.mirrors, "owner", "gradle"),
+            {"build.gradle": "", ".github/workflows/ci.yml": "name: CI\n"},
+        )
+
+        self.assertEqual(self.downloader.download_files("owner/gradle"), (0, 0))
+        with patch("builtins.print"):
+            self.assertEqual(self.downloader.download_files("owner/missing"), (0, 0))
+
+    def test_missing_blob_is_skipped(self):
+        repo_path = os.path.join(self.mirrors, "owner", "repo")
+        make_git_repo(repo_path, {"pom.xml": "<project/>\n"})
+        git_dir = os.path.join(repo_path, ".git")
+
+        with CatFile(git_dir) as cat_file:
+            self.assertIsNone(cat_file.read("0" * 40))
+            with patch("builtins.print"):
+                blobs = self.downloader.read_blobs(
+                    "owner/repo", cat_file, [("ci.yml", "0" * 40)]
+                )
+        self.assertEqual(blobs, [])
+        self.assertTrue(cat_file.process.stdout.closed)
+
+    def test_exited_cat_file_is_restarted(self):
+        repo_path = os.path.join(self.mirrors, "owner", "repo")
+        make_git_repo(repo_path, {"pom.xml": "<project/>\n"})
+        sha = git_blob_sha(b"<project/>\n")
+
+        with CatFile(os.path.join(repo_path, ".git")) as cat_file:
+            cat_file.process.kill()
+            cat_file.process.wait()
+            self.assertEqual(cat_file.read(sha), b"<project/>\n")
+
+        with CatFile(os.path.join(repo_path, ".git")) as cat_file:
+            # Exits again right after the restart
+            with patch.object(cat_file, "header", return_value=b""):
+                with self.assertRaises(RuntimeError):
+                    cat_file.read(sha)
+
+
+def metadata(extractor):
+    return {
+        (str(automation), repo): sorted(map(str, metadata))
+        for automation, repos in extractor.automations_dict.items()
+        for repo, metadata in repos.items()
+    }
+
+
+class TestCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.tmp_dir.name, "output")
+        files = {
+            "owner/a/ci.yml": "jobs:\n  build:\n    steps:\n"
+            "      - uses: actions/checkout@v4\n      - run: mvn test\n",
+            "owner/a/pom.xml": "<project/>\n",
+            "owner/a/module/pom.xml": "<project/>\n",
+            "owner/b/lint.yaml": "jobs:\n  lint:\n    steps:\n      - run: ruff .\n",
+            "owner/b/broken.yml": "jobs: [\n",
+        }
+        for path, content in files.items():
+            os.makedirs(
+                os.path.dirname(os.path.join(self.save_path, path)), exist_ok=True
+            )
+            with open(os.path.join(self.save_path, path), "w") as f:
+                f.write(content)
+        os.makedirs(os.path.join(self.save_path, "owner", "empty"))
+        self.repo_list = os.path.join(self.tmp_dir.name, "repos.txt")
+        with open(self.repo_list, "w") as f:
+            f.write("owner/a\nowner/b\nowner/empty\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_corpus_analysis_matches_directory_analysis(self):
+        expected = AutomationExtractor(self.save_path)
+        with patch("builtins.print"):
+            total = expected.analyze_all_files(self.repo_list, None)
+
+        for extension in [".tar.gz", ".zip", ".jsonl"]:
+            corpus = os.path.join(self.tmp_dir.name, "corpus" + extension)
+            self.assertEqual(pack_corpus(self.save_path, corpus), 5)
+            extractor = AutomationExtractor(None)
+            with patch("builtins.print"):
+                self.assertEqual(extractor.analyze_corpus(corpus), total)
+            self.assertEqual(dict(extractor.repos_dict), dict(expected.repos_dict))
+            self.assertEqual(metadata(extractor), metadata(expected))
+            self.assertEqual(extractor.exceptions, 1)
+
+    def test_corpus_of_language_directories_is_stripped(self):
+        expected = AutomationExtractor(self.save_path)
+        with patch("builtins.print"):
+            expected.analyze_all_files(self.repo_list, None)
+        languages = os.path.join(self.tmp_dir.name, "languages")
+        shutil.copytree(self.save_path, os.path.join(languages, "java"))
+
+        for extension in [".tar.gz", ".zip", ".jsonl"]:
+            corpus = os.path.join(self.tmp_dir.name, "languages" + extension)
+            pack_corpus(languages, corpus)
+            extractor = AutomationExtractor(None)
+            with patch("builtins.print"):
+                extractor.analyze_corpus(corpus, strip=1)
+            self.assertEqual(dict(extractor.repos_dict), dict(expected.repos_dict))
+            self.assertEqual(metadata(extractor), metadata(expected))
+
+    def test_parallel_analysis_matches_serial_analysis(self):
+        def results(extractor):
+            return [
+                (
+                    str(automation),
+                    [
+                        (repo, list(map(str, metadata)))
+                        for repo, metadata in repos.items()
+                    ],
+                )
+                for automation, repos in extractor.automations_dict.items()
+            ], [
+                (repo, list(map(str, automations)))
+                for repo, automations in extractor.repos_dict.items()
+            ]
+
+        workflow_cache = os.path.join(self.tmp_dir.name, "workflows.sqlite")
+        command_cache = os.path.join(self.tmp_dir.name, "commands.sqlite")
+        serial = AutomationExtractor(self.save_path)
+        parallel = AutomationExtractor(
+            self.save_path, WorkflowLoader(workflow_cache), CommandCache(command_cache)
+        )
+        with patch("builtins.print"):
+            serial.analyze_all_files(self.repo_list, self.repo_list)
+            parallel.analyze_all_files(self.repo_list, self.repo_list, processes=3)
+        parallel.workflow_loader.close()
+        parallel.command_cache.close()
+        self.assertEqual(results(parallel), results(serial))
+        self.assertEqual(parallel.exceptions, serial.exceptions)
+
+        # The parent wrote what the workers parsed to the caches
+        rerun = AutomationExtractor(
+            self.save_path, WorkflowLoader(workflow_cache), CommandCache(command_cache)
+        )
+        with patch("builtins.print"):
+            rerun.analyze_all_files(self.repo_list, self.repo_list)
+        self.assertEqual(rerun.workflow_loader.num_parsed, 0)
+        self.assertEqual(rerun.command_cache.misses, 0)
+        self.assertEqual(results(rerun), results(serial))
+        rerun.workflow_loader.close()
+        rerun.command_cache.close()
+
+
+class TestWorkflowLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "workflows.sqlite")
+        self.content = (
+            "name: CI\non: push\njobs:\n  build:\n    name: Build\n    steps:\n"
+            "      - uses: actions/checkout@v4\n"
+            "      - name: Test\n        run: mvn test\n        shell: bash\n"
+            "  deploy:\n    uses: ./.github/workflows/deploy.yml\n"
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_loaders_normalize_alike(self):
+        loaders = [yaml.SafeLoader] + (
+            [yaml.CSafeLoader] if hasattr(yaml, "CSafeLoader") else []
+        )
+        for loader in loaders:
+            workflow = WorkflowLoader(loader=loader).load(self.content)
+            self.assertEqual(workflow.name, "CI")
+            self.assertEqual(workflow.jobs, ["build", "deploy"])
+            self.assertEqual(
+                workflow.steps,
+                [
+                    ("build", "Build", None, None, "actions/checkout@v4", None),
+                    ("build", "Build", "Test", "mvn test", None, "bash"),
+                ],
+            )
+        self.assertIs(WorkflowLoader().load("jobs: [\n"), InvalidWorkflow)
+        self.assertIs(WorkflowLoader().load("- not a workflow\n"), InvalidWorkflow)
+
+    def test_persistent_cache_skips_yaml(self):
+        loader = WorkflowLoader(self.cache_path)
+        loader.load(self.content)
+        loader.close()
+
+        loader = WorkflowLoader(self.cache_path)
+        with patch("src.python.extractor.WorkflowLoader.load_yaml") as mock_load_yaml:
+            workflow = loader.load(self.content.encode("utf-8"))
+        loader.close()
+        mock_load_yaml.assert_not_called()
+        self.assertEqual((loader.num_parsed, loader.num_cached), (0, 1))
+        self.assertEqual(workflow.steps[1][3], "mvn test")
+
+    def test_invalid_workflow_is_cached(self):
+        loader = WorkflowLoader(self.cache_path)
+        loader.load("jobs: [\n")
+        loader.close()
+
+        loader = WorkflowLoader(self.cache_path)
+        self.assertIs(loader.load("jobs: [\n"), InvalidWorkflow)
+        self.assertEqual(loader.num_cached, 1)
+        loader.close()
+
+
+class TestIssuePublisher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repos = synthetic_repos(5)
+        self.server = MockGitHubServer(self.repos, issue_limit=3).start()
+        self.env = patch.dict(os.environ, {"GITHUB_API_URL": self.server.url})
+        self.env.start()
+        self.ledger_path = os.path.join(self.tmp_dir.name, "ledger.sqlite")
+
+    def tearDown(self):
+        self.env.stop()
+        self.server.stop()
+        self.tmp_dir.cleanup()
+
+    def publish(self):
+        ledger = IssueLedger(self.ledger_path)
+        publisher = IssuePublisher(ledger, min_interval=0)
+        with patch("builtins.print"):
+            publisher.publish_all(
+                [(repo, "Automation analysis", "Report") for repo in self.repos]
+            )
+        ledger.close()
+        return publisher
+
+    @patch("src.python.results.IssuePublisher.time.sleep")
+    def test_backs_off_and_publishes_once(self, mock_sleep):
+        publisher = self.publish()
+        self.assertEqual(publisher.num_published, 5)
+        self.assertEqual(publisher.failed, dict())
+        # The third and sixth creates are rejected with a Retry-After
+        self.assertEqual(publisher.num_backoffs, 2)
+        self.assertGreaterEqual(mock_sleep.call_count, 2)
+        self.assertTrue(all(len(self.server.issues[repo]) == 1 for repo in self.repos))
+
+        # A rerun finds every repository in the ledger
+        rerun = self.publish()
+        self.assertEqual((rerun.num_published, rerun.num_skipped), (0, 5))
+        self.assertEqual(self.server.requests["issues"], 7)
+
+    @patch("src.python.results.IssuePublisher.time.sleep")
+    def test_dry_run_publishes_to_stand_in(self, mock_sleep):
+        with IssueServer(issue_limit=2) as issue_server:
+            with patch.dict(os.environ, {"GITHUB_API_URL": issue_server.url}):
+                publisher = self.publish()
+        self.assertEqual(publisher.num_published, 5)
+        # The stand-in rejects every second create like a secondary rate limit
+        self.assertEqual(publisher.num_backoffs, 4)
+        self.assertEqual(sorted(issue_server.issues), sorted(self.repos))
+        self.assertEqual(self.server.requests["issues"], 0)
+
+    def test_paces_creates_within_limits(self):
+        publisher = IssuePublisher(None, min_interval=0.5, limits=[(2, 60)])
+        with patch("src.python.results.IssuePublisher.time.sleep") as mock_sleep:
+            for _ in range(3):
+                publisher.wait_for_slot()
+        # The second waits for the interval, the third for the window of 60s
+        waits = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(len(waits), 2)
+        self.assertAlmostEqual(waits[0], 0.5, places=1)
+        self.assertGreater(waits[1], 59)